@@ -120,7 +120,7 @@ def cmd_search(args):
 
 def cmd_info(args):
     """显示书籍信息命令"""
-    from novel_downloader import get_api_manager
+    from novel_downloader import get_api_manager, Catalog
     
     book_id = args.book_id
     if not book_id:
@@ -150,13 +150,7 @@ def cmd_info(args):
     
     # 获取章节列表
     chapters_data = api.get_chapter_list(book_id)
-    chapter_count = 0
-    if chapters_data:
-        if isinstance(chapters_data, dict):
-            all_ids = chapters_data.get("allItemIds", [])
-            chapter_count = len(all_ids)
-        elif isinstance(chapters_data, list):
-            chapter_count = len(chapters_data)
+    chapter_count = len(Catalog.parse(chapters_data)) if chapters_data else 0
     
     # 显示信息
     print("\n" + "=" * 50)
@@ -180,7 +174,7 @@ def cmd_info(args):
 
 def cmd_download(args):
     """下载书籍命令"""
-    from novel_downloader import Run
+    from novel_downloader import Run, OUTPUT_FORMATS, parse_formats
     from platform_utils import detect_platform
     import os
     
@@ -212,15 +206,23 @@ def cmd_download(args):
     # 确保目录存在
     os.makedirs(save_path, exist_ok=True)
     
-    # 确定格式
-    file_format = args.format or 'txt'
-    if file_format not in ['txt', 'epub']:
-        print(f"警告: 不支持的格式 '{file_format}'，使用默认格式 txt")
-        file_format = 'txt'
+    # 确定格式（可用逗号分隔多个格式，一次下载同时生成）
+    requested = [f.strip().lower() for f in (args.format or 'txt').split(',') if f.strip()]
+    for fmt in requested:
+        if fmt not in OUTPUT_FORMATS:
+            print(f"警告: 不支持的格式 '{fmt}'，已忽略")
+    formats = parse_formats(requested)
+    file_format = ','.join(formats)
     
     print(f"开始下载书籍: {book_id}")
     print(f"保存路径: {save_path}")
     print(f"文件格式: {file_format}")
+    if args.engine:
+        print(f"下载引擎: {args.engine}")
+    if args.multi_node:
+        print("多节点分片: 已启用")
+    if args.update:
+        print("增量更新: 只下载新增章节")
     print("-" * 50)
     
     # 进度回调
@@ -235,7 +237,10 @@ def cmd_download(args):
         book_id=book_id,
         save_path=save_path,
         file_format=file_format,
-        gui_callback=progress_callback
+        gui_callback=progress_callback,
+        engine=args.engine,
+        multi_node=True if args.multi_node else None,
+        update=args.update
     )
     
     if success:
@@ -246,6 +251,33 @@ def cmd_download(args):
         return 1
 
 
+def cmd_state(args):
+    """临时状态目录占用与清理命令"""
+    from novel_downloader import get_state_store
+    import time
+
+    store = get_state_store()
+    if args.gc:
+        budget_bytes = int(args.budget_mb * 1024 * 1024) if args.budget_mb is not None else None
+        result = store.gc(budget_bytes=budget_bytes)
+        print(f"已清理 {len(result['removed'])} 本书的临时状态，释放 {result['freed_bytes'] / 1024 / 1024:.1f} MB")
+
+    usage = store.usage()
+    print(f"临时状态目录: {usage['directory']}")
+    print(f"占用: {usage['total_bytes'] / 1024 / 1024:.1f} MB / 预算 {usage['budget_bytes'] / 1024 / 1024:.0f} MB，"
+          f"保留 {usage['max_age_days']:g} 天")
+    rows = [
+        [b['book_id'], f"{b['bytes'] / 1024 / 1024:.2f} MB", b['files'],
+         time.strftime('%Y-%m-%d %H:%M', time.localtime(b['last_modified'])) if b['last_modified'] else '-',
+         '下载中' if b['active'] else '']
+        for b in usage['books']
+    ]
+    if rows:
+        print()
+        print(format_table(['书籍ID', '大小', '文件数', '最后修改', '状态'], rows))
+    return 0
+
+
 def cmd_status(args):
     """显示平台状态命令"""
     report = get_feature_status_report()
@@ -265,7 +297,11 @@ def create_parser() -> argparse.ArgumentParser:
   %(prog)s info 12345                 查看书籍信息
   %(prog)s download 12345             下载书籍
   %(prog)s download 12345 -f epub     下载为 EPUB 格式
+  %(prog)s download 12345 -f txt,epub 一次下载同时生成 TXT 和 EPUB
+  %(prog)s download 12345 -e async    使用异步引擎下载
+  %(prog)s download 12345 -u          增量更新（只下载新增章节）
   %(prog)s status                     显示平台状态
+  %(prog)s state --gc                 清理临时下载状态
         """
     )
     
@@ -288,10 +324,24 @@ def create_parser() -> argparse.ArgumentParser:
     download_parser = subparsers.add_parser('download', help='下载书籍')
     download_parser.add_argument('book_id', help='书籍ID或URL')
     download_parser.add_argument('-p', '--path', help='保存路径')
-    download_parser.add_argument('-f', '--format', choices=['txt', 'epub'],
-                                default='txt', help='输出格式 (默认: txt)')
+    download_parser.add_argument('-f', '--format', default='txt',
+                                help='输出格式 txt/epub，多个用逗号分隔如 txt,epub (默认: txt)')
+    download_parser.add_argument('-e', '--engine', choices=['thread', 'async'],
+                                default=None, help='章节下载引擎 (默认: 读取配置 download_engine)')
+    download_parser.add_argument('-m', '--multi-node', action='store_true',
+                                help='将章节分片到所有可用节点并行下载')
+    download_parser.add_argument('-u', '--update', action='store_true',
+                                help='增量更新：只下载上次下载后新增或变化的章节')
     download_parser.set_defaults(func=cmd_download)
     
+    # state 命令
+    state_parser = subparsers.add_parser('state', help='查看/清理临时下载状态')
+    state_parser.add_argument('--gc', action='store_true',
+                             help='按磁盘预算与保留天数清理（正在下载的书籍不受影响）')
+    state_parser.add_argument('--budget-mb', type=float, default=None,
+                             help='本次清理使用的磁盘预算 (默认: 读取配置 state_budget_mb)')
+    state_parser.set_defaults(func=cmd_state)
+    
     # status 命令
     status_parser = subparsers.add_parser('status', help='显示平台状态')
     status_parser.set_defaults(func=cmd_status)
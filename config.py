@@ -126,6 +126,32 @@ def load_config() -> Dict:
         "api_rate_limit": config_params.get("api_rate_limit", 20),
         "rate_limit_window": config_params.get("rate_limit_window", 1.0),
         "async_batch_size": config_params.get("async_batch_size", 50),
+        "download_engine": config_params.get("download_engine", "thread"),
+        "adaptive_concurrency": config_params.get("adaptive_concurrency", True),
+        "concurrency_min": config_params.get("concurrency_min", 2),
+        "concurrency_max": config_params.get("concurrency_max", 40),
+        "multi_node_download": config_params.get("multi_node_download", False),
+        "hedge_requests": config_params.get("hedge_requests", False),
+        "hedge_budget": config_params.get("hedge_budget", 0.05),
+        "hedge_min_delay": config_params.get("hedge_min_delay", 0.5),
+        "race_full_download": config_params.get("race_full_download", True),
+        "race_chapter_workers": config_params.get("race_chapter_workers", 2),
+        "full_download_concurrency": config_params.get("full_download_concurrency", 2),
+        "chapter_cache_enabled": config_params.get("chapter_cache_enabled", True),
+        "chapter_cache_dir": config_params.get("chapter_cache_dir", ""),
+        "chapter_cache_max_mb": config_params.get("chapter_cache_max_mb", 512),
+        "journal_compress": config_params.get("journal_compress", False),
+        "journal_fsync_interval": config_params.get("journal_fsync_interval", 1.0),
+        "state_budget_mb": config_params.get("state_budget_mb", 1024),
+        "state_max_age_days": config_params.get("state_max_age_days", 7),
+        "epub_chapters_per_file": config_params.get("epub_chapters_per_file", 1),
+        "epub_compress_level": config_params.get("epub_compress_level", 6),
+        "process_pool_workers": config_params.get("process_pool_workers", 0),
+        "process_batch_size": config_params.get("process_batch_size", 64),
+        "watchlist_enabled": config_params.get("watchlist_enabled", True),
+        "watchlist_interval_minutes": config_params.get("watchlist_interval_minutes", 60),
+        "watchlist_requests_per_minute": config_params.get("watchlist_requests_per_minute", 30),
+        "watchlist_node_requests_per_minute": config_params.get("watchlist_node_requests_per_minute", 12),
         "endpoints": endpoints if isinstance(endpoints, dict) else {}
     }
 
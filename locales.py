@@ -96,7 +96,6 @@ MESSAGES = {
         "dl_chapter_list_resp": "[DEBUG] 章节列表响应: {}",
         "dl_chapter_list_error": "获取章节列表异常: {}",
         "dl_content_error": "获取章节内容异常: {}",
-        "dl_save_status_fail": "保存下载状态失败: {}",
         "dl_cover_fail": "下载封面失败: {}",
         "dl_cover_add_fail": "添加封面失败: {}",
         "dl_search_fail": "搜索失败: {}",
@@ -255,7 +254,6 @@ MESSAGES = {
         "dl_chapter_list_resp": "[DEBUG] Chapter list response: {}",
         "dl_chapter_list_error": "Get chapter list error: {}",
         "dl_content_error": "Get chapter content error: {}",
-        "dl_save_status_fail": "Save status failed: {}",
         "dl_cover_fail": "Download cover failed: {}",
         "dl_cover_add_fail": "Add cover failed: {}",
         "dl_search_fail": "Search failed: {}",
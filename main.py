@@ -9,6 +9,7 @@ import sys
 import subprocess
 import time
 import threading
+import multiprocessing
 import requests
 import secrets
 import socket
@@ -342,4 +343,6 @@ def main():
         open_web_interface(port, access_token)
 
 if __name__ == '__main__':
+    # 打包后的程序在 Windows 上以 spawn 方式启动章节处理子进程，需要此调用
+    multiprocessing.freeze_support()
     main()
@@ -13,11 +13,29 @@ import threading
 import signal
 import sys
 import inspect
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import atexit
+import tempfile
+import hashlib
+import queue
+import io
+import codecs
+import mmap
+import sqlite3
+import zlib
+import base64
+import shutil
+from array import array
+import html
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import asyncio
+from contextlib import asynccontextmanager, contextmanager
 from tqdm import tqdm
-from typing import Optional, Dict, List, Union
-from ebooklib import epub
+from typing import Optional, Dict, List, Tuple, Union
 from config import CONFIG, print_lock, get_headers
 import aiohttp
 from requests.adapters import HTTPAdapter
@@ -65,6 +83,1301 @@ class TokenBucket:
         await self.acquire()
 
 
+class AdaptiveConcurrencyController:
+    """AIMD 自适应并发控制器，同步线程与异步协程共用
+
+    - 加性增：连续成功达到当前并发数，且错误率与 p50 延迟正常时，并发 +1
+    - 乘性减：遇到 429/5xx/超时时，并发乘以 decrease_factor（冷却期内只减一次）
+    """
+
+    # 拥塞信号：限流、服务端错误、超时/连接失败
+    THROTTLED = 'throttled'
+    SERVER_ERROR = 'server_error'
+    TIMEOUT = 'timeout'
+
+    def __init__(self, initial: int, min_limit: int = 1, max_limit: int = 64,
+                 decrease_factor: float = 0.7, latency_tolerance: float = 1.5,
+                 max_error_rate: float = 0.05, decrease_cooldown: float = 1.0):
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.max_error_rate = max_error_rate
+        self.decrease_cooldown = decrease_cooldown
+
+        self._limit = float(min(self.max_limit, max(self.min_limit, int(initial))))
+        self._in_flight = 0
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._baseline_p50: Optional[float] = None
+        self._latencies = deque(maxlen=64)
+        self._outcomes = deque(maxlen=64)  # 1 表示拥塞失败，0 表示成功
+        self._cond = threading.Condition()
+        self._waiters = deque()  # 同步等待者按到达顺序排队
+        self._async_waiters = deque()
+
+    @classmethod
+    def from_config(cls) -> Optional['AdaptiveConcurrencyController']:
+        """按配置创建控制器，未启用自适应并发时返回 None"""
+        if not CONFIG.get("adaptive_concurrency", True):
+            return None
+        initial = int(CONFIG.get("max_workers", 10) or 10)
+        return cls(
+            initial=initial,
+            min_limit=int(CONFIG.get("concurrency_min", 2) or 2),
+            max_limit=int(CONFIG.get("concurrency_max", initial * 4) or initial * 4),
+        )
+
+    @property
+    def limit(self) -> int:
+        """当前有效并发上限"""
+        return max(self.min_limit, int(self._limit))
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self):
+        """同步获取一个并发名额（阻塞）
+
+        按先来先得排队：刚释放名额的线程不能插队到等待者前面，
+        否则早提交的章节可能一直拿不到名额，拖住按顺序写出的文件。
+        """
+        with self._cond:
+            if not self._waiters and self._in_flight < self.limit:
+                self._in_flight += 1
+                return
+            ticket = object()
+            self._waiters.append(ticket)
+            try:
+                while self._waiters[0] is not ticket or self._in_flight >= self.limit:
+                    self._cond.wait(timeout=1.0)
+                self._in_flight += 1
+            finally:
+                self._waiters.remove(ticket)
+                if self._waiters and self._in_flight < self.limit:
+                    self._cond.notify_all()
+
+    async def acquire_async(self):
+        """异步获取一个并发名额"""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                if self._in_flight < self.limit:
+                    self._in_flight += 1
+                    return
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            try:
+                await asyncio.wait_for(waiter, timeout=1.0)
+            except asyncio.TimeoutError:
+                pass
+
+    def release(self):
+        """释放并发名额"""
+        with self._cond:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._wake_locked()
+
+    def _wake_locked(self):
+        free = self.limit - self._in_flight
+        if free <= 0:
+            return
+        if self._waiters:
+            # 只有队首能拿到名额，唤醒全部以免唤醒的恰好不是队首
+            self._cond.notify_all()
+        while free > 0 and self._async_waiters:
+            loop, waiter = self._async_waiters.popleft()
+            if waiter.done():
+                continue
+            loop.call_soon_threadsafe(_resolve_waiter, waiter)
+            free -= 1
+
+    def record_success(self, latency: float):
+        """记录一次成功请求及其延迟（秒）"""
+        with self._cond:
+            self._latencies.append(latency)
+            self._outcomes.append(0)
+            self._successes += 1
+            if self._successes >= self.limit and self._is_healthy_locked():
+                self._successes = 0
+                if self._limit < self.max_limit:
+                    self._limit = min(self.max_limit, self._limit + 1)
+                    self._wake_locked()
+
+    def record_failure(self, kind: str):
+        """记录一次拥塞信号（429/5xx/超时），触发乘性减"""
+        with self._cond:
+            self._outcomes.append(1)
+            self._successes = 0
+            now = time.monotonic()
+            if now - self._last_decrease >= self.decrease_cooldown:
+                self._last_decrease = now
+                self._limit = max(float(self.min_limit), self._limit * self.decrease_factor)
+
+    def record_status(self, status_code: int, latency: float):
+        """按 HTTP 状态码记录结果；非拥塞类错误（如 404）不影响并发"""
+        if status_code == 429:
+            self.record_failure(self.THROTTLED)
+        elif status_code >= 500:
+            self.record_failure(self.SERVER_ERROR)
+        elif status_code == 200:
+            self.record_success(latency)
+
+    def _is_healthy_locked(self) -> bool:
+        if self._outcomes and sum(self._outcomes) / len(self._outcomes) > self.max_error_rate:
+            return False
+        if len(self._latencies) < 8:
+            return True
+        p50 = sorted(self._latencies)[len(self._latencies) // 2]
+        if self._baseline_p50 is None:
+            self._baseline_p50 = p50
+        else:
+            # 基线取历史最优 p50，并缓慢上浮以适应网络整体变化
+            self._baseline_p50 = min(p50, self._baseline_p50 * 1.01)
+        return p50 <= self._baseline_p50 * self.latency_tolerance
+
+    def snapshot(self) -> Dict:
+        """当前状态快照，用于状态展示"""
+        with self._cond:
+            p50 = sorted(self._latencies)[len(self._latencies) // 2] if self._latencies else None
+            return {
+                'limit': self.limit,
+                'in_flight': self._in_flight,
+                'p50_ms': int(p50 * 1000) if p50 is not None else None,
+                'error_rate': round(sum(self._outcomes) / len(self._outcomes), 3) if self._outcomes else 0.0,
+            }
+
+
+def _resolve_waiter(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class HedgingPolicy:
+    """对冲请求策略：请求耗时超过动态阈值（运行时 p95）时发出一次重复请求
+
+    对冲有独立预算：累计对冲数不超过 budget_ratio × 主请求数 + burst，
+    保证额外负载只占百分之几。
+    """
+
+    def __init__(self, budget_ratio: float = 0.05, min_delay: float = 0.5,
+                 quantile: float = 0.95, burst: int = 2, min_samples: int = 20):
+        self.budget_ratio = budget_ratio
+        self.min_delay = min_delay
+        self.quantile = quantile
+        self.burst = burst
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=256)
+        self._threshold: Optional[float] = None
+        self._since_refresh = 0
+        self._primary_count = 0
+        self._hedge_count = 0
+        self._hedge_wins = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> Optional['HedgingPolicy']:
+        """按配置创建策略，未启用对冲时返回 None"""
+        if not CONFIG.get("hedge_requests", False):
+            return None
+        return cls(
+            budget_ratio=float(CONFIG.get("hedge_budget", 0.05) or 0.05),
+            min_delay=float(CONFIG.get("hedge_min_delay", 0.5) or 0.5),
+        )
+
+    def record(self, latency: float):
+        """记录一次主请求的完整耗时（无论是否被对冲抢先）"""
+        with self._lock:
+            self._latencies.append(latency)
+            self._since_refresh += 1
+            if self._since_refresh >= 16 or self._threshold is None:
+                self._since_refresh = 0
+                if len(self._latencies) >= self.min_samples:
+                    ordered = sorted(self._latencies)
+                    self._threshold = ordered[min(len(ordered) - 1, int(len(ordered) * self.quantile))]
+
+    def hedge_delay(self) -> float:
+        """主请求发出后多久触发对冲；样本不足时用请求超时的十分之一"""
+        threshold = self._threshold
+        if threshold is None:
+            threshold = (CONFIG.get("request_timeout", 30) or 30) / 10.0
+        return max(self.min_delay, threshold)
+
+    def count_primary(self):
+        with self._lock:
+            self._primary_count += 1
+
+    def try_acquire(self) -> bool:
+        """申请一次对冲预算"""
+        with self._lock:
+            if self._hedge_count < self._primary_count * self.budget_ratio + self.burst:
+                self._hedge_count += 1
+                return True
+            return False
+
+    def record_win(self):
+        with self._lock:
+            self._hedge_wins += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'primary': self._primary_count,
+                'hedged': self._hedge_count,
+                'hedge_wins': self._hedge_wins,
+                'threshold_ms': int(self._threshold * 1000) if self._threshold else None,
+            }
+
+
+class NodeHealthRegistry:
+    """节点运行时健康度登记表
+
+    根据真实的章节/详情/整本请求结果，为每个节点维护 EWMA 延迟、成功率与 429 比例，
+    并为每个节点配置熔断器（closed → open → half_open → closed）。
+    统计结果持久化到临时目录，重启后继续沿用。
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, path: Optional[str] = None, alpha: float = 0.2,
+                 failure_threshold: int = 5, open_cooldown: float = 15.0,
+                 max_cooldown: float = 300.0, save_interval: float = 30.0):
+        self.path = path
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.open_cooldown = open_cooldown
+        self.max_cooldown = max_cooldown
+        self.save_interval = save_interval
+        self._nodes: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_save = 0.0
+        self._load()
+
+    @staticmethod
+    def _new_entry() -> Dict:
+        return {
+            'latency': None,        # EWMA 延迟（秒）
+            'success_rate': 1.0,    # EWMA 成功率
+            'throttle_rate': 0.0,   # EWMA 429 比例
+            'samples': 0,
+            'state': NodeHealthRegistry.CLOSED,
+            'consecutive_failures': 0,
+            'opened_at': 0.0,
+            'cooldown': 0.0,
+            'trial_in_flight': False,
+            'bulk_ttfb': None,        # 整本下载首字节耗时 EWMA（秒）
+            'bulk_throughput': None,  # 整本下载吞吐 EWMA（字节/秒）
+        }
+
+    def _entry(self, node: str) -> Dict:
+        entry = self._nodes.get(node)
+        if entry is None:
+            entry = self._new_entry()
+            self._nodes[node] = entry
+        return entry
+
+    def seed(self, node: str, latency_ms: Optional[int], available: bool):
+        """用启动探测结果为尚无真实样本的节点提供初值"""
+        node = (node or "").strip().rstrip('/')
+        if not node:
+            return
+        with self._lock:
+            entry = self._entry(node)
+            if entry['samples'] == 0:
+                if latency_ms:
+                    entry['latency'] = latency_ms / 1000.0
+                entry['success_rate'] = 1.0 if available else 0.0
+
+    def record(self, node: str, ok: bool, latency: Optional[float] = None, throttled: bool = False):
+        """记录一次真实请求结果
+
+        Args:
+            node: 节点 base_url
+            ok: 请求是否成功（拿到有效数据）
+            latency: 请求耗时（秒），仅成功时计入延迟
+            throttled: 是否被限流（HTTP 429）
+        """
+        if not node:
+            return
+        a = self.alpha
+        with self._lock:
+            entry = self._entry(node)
+            entry['samples'] += 1
+            entry['success_rate'] = (1 - a) * entry['success_rate'] + a * (1.0 if ok else 0.0)
+            entry['throttle_rate'] = (1 - a) * entry['throttle_rate'] + a * (1.0 if throttled else 0.0)
+            if ok and latency is not None:
+                entry['latency'] = latency if entry['latency'] is None else (1 - a) * entry['latency'] + a * latency
+
+            if ok:
+                entry['consecutive_failures'] = 0
+                if entry['state'] != self.CLOSED:
+                    entry['state'] = self.CLOSED
+                    entry['cooldown'] = 0.0
+                entry['trial_in_flight'] = False
+            else:
+                entry['consecutive_failures'] += 1
+                if entry['state'] == self.HALF_OPEN:
+                    self._open_locked(entry, escalate=True)
+                elif entry['state'] == self.CLOSED and (
+                    entry['consecutive_failures'] >= self.failure_threshold
+                    or (entry['samples'] >= 10 and entry['success_rate'] < 0.3)
+                ):
+                    self._open_locked(entry, escalate=False)
+            self._dirty = True
+        self._maybe_save()
+
+    def _open_locked(self, entry: Dict, escalate: bool):
+        if escalate and entry['cooldown']:
+            entry['cooldown'] = min(self.max_cooldown, entry['cooldown'] * 2)
+        else:
+            entry['cooldown'] = self.open_cooldown
+        entry['state'] = self.OPEN
+        entry['opened_at'] = time.time()
+        entry['trial_in_flight'] = False
+
+    def allow(self, node: str) -> bool:
+        """熔断器是否放行该节点的请求；冷却结束后进入半开状态，只放行一个试探请求"""
+        with self._lock:
+            entry = self._nodes.get(node)
+            if entry is None or entry['state'] == self.CLOSED:
+                return True
+            if entry['state'] == self.OPEN:
+                if time.time() - entry['opened_at'] < entry['cooldown']:
+                    return False
+                entry['state'] = self.HALF_OPEN
+                entry['trial_in_flight'] = False
+            if entry['trial_in_flight']:
+                return False
+            entry['trial_in_flight'] = True
+            return True
+
+    def is_open(self, node: str) -> bool:
+        """节点是否处于熔断（不消耗半开试探名额）"""
+        with self._lock:
+            entry = self._nodes.get(node)
+            if entry is None or entry['state'] != self.OPEN:
+                return False
+            return time.time() - entry['opened_at'] < entry['cooldown']
+
+    def latency(self, node: str, default: float = 0.3) -> float:
+        with self._lock:
+            entry = self._nodes.get(node)
+            if entry is None or entry['latency'] is None:
+                return default
+            return max(0.001, entry['latency'])
+
+    def sample_count(self, node: str) -> int:
+        with self._lock:
+            entry = self._nodes.get(node)
+            return entry['samples'] if entry else 0
+
+    def success_rate(self, node: str) -> float:
+        with self._lock:
+            entry = self._nodes.get(node)
+            return entry['success_rate'] if entry else 1.0
+
+    def score(self, node: str) -> float:
+        """综合代价，越小越好：延迟 / 成功率，并按限流比例加罚"""
+        with self._lock:
+            entry = self._nodes.get(node)
+            if entry is None:
+                return 0.3
+            latency = entry['latency'] if entry['latency'] is not None else 0.3
+            return latency / max(entry['success_rate'], 0.05) * (1 + 2 * entry['throttle_rate'])
+
+    def rank(self, nodes: List[str]) -> List[str]:
+        """按健康度排序，熔断中的节点排在最后"""
+        return sorted(nodes, key=lambda n: (self.is_open(n), self.score(n)))
+
+    def best_node(self, nodes: List[str]) -> Optional[str]:
+        """选出未熔断且代价最低的节点"""
+        candidates = [n for n in nodes if not self.is_open(n)]
+        if not candidates:
+            return None
+        return min(candidates, key=self.score)
+
+    def record_bulk(self, node: str, ttfb: float, throughput: Optional[float]):
+        """记录一次成功的整本下载的首字节耗时与吞吐，供下载规划估算代价"""
+        a = self.alpha
+        with self._lock:
+            entry = self._entry(node)
+            entry['bulk_ttfb'] = ttfb if entry['bulk_ttfb'] is None else (1 - a) * entry['bulk_ttfb'] + a * ttfb
+            if throughput:
+                previous = entry['bulk_throughput']
+                entry['bulk_throughput'] = throughput if previous is None else (1 - a) * previous + a * throughput
+            self._dirty = True
+        self._maybe_save()
+
+    def bulk_estimate(self, node: str) -> Tuple[Optional[float], Optional[float]]:
+        """返回节点整本下载的 (首字节耗时, 吞吐)，没有样本时为 None"""
+        with self._lock:
+            entry = self._nodes.get(node)
+            if entry is None:
+                return None, None
+            return entry['bulk_ttfb'], entry['bulk_throughput']
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """各节点健康度快照（用于接口展示）"""
+        with self._lock:
+            result = {}
+            for node, entry in self._nodes.items():
+                result[node] = {
+                    'state': entry['state'],
+                    'latency_ms': int(entry['latency'] * 1000) if entry['latency'] is not None else None,
+                    'success_rate': round(entry['success_rate'], 3),
+                    'throttle_rate': round(entry['throttle_rate'], 3),
+                    'samples': entry['samples'],
+                }
+            return result
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                for node, saved in data.get('nodes', {}).items():
+                    if isinstance(saved, dict):
+                        entry = self._new_entry()
+                        entry.update({k: saved[k] for k in entry if k in saved})
+                        entry['trial_in_flight'] = False
+                        self._nodes[node] = entry
+        except Exception:
+            pass
+
+    def _maybe_save(self):
+        if self._dirty and time.monotonic() - self._last_save >= self.save_interval:
+            self.save()
+
+    def save(self):
+        """写入持久化文件"""
+        if not self.path:
+            return
+        with self._lock:
+            data = {'version': 1, 'nodes': {n: dict(e) for n, e in self._nodes.items()}}
+            self._dirty = False
+            self._last_save = time.monotonic()
+        try:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            pass
+
+
+_NODE_HEALTH_FILE = os.path.join(tempfile.gettempdir(), 'fanqie_novel_downloader_node_health.json')
+_node_health_registry: Optional[NodeHealthRegistry] = None
+_node_health_lock = threading.Lock()
+
+
+def get_node_health_registry() -> NodeHealthRegistry:
+    """获取节点健康度登记表单例（退出时自动保存）"""
+    global _node_health_registry
+    if _node_health_registry is None:
+        with _node_health_lock:
+            if _node_health_registry is None:
+                _node_health_registry = NodeHealthRegistry(_NODE_HEALTH_FILE)
+                atexit.register(_node_health_registry.save)
+    return _node_health_registry
+
+
+class EndpointSelector:
+    """单节点章节接口排序器
+
+    每个节点可通过多个接口获取单章（/api/chapter、/api/content、/api/ios/content、/api/raw_full），
+    各节点上可用的接口并不相同。这里按节点记录每个接口的成功率与延迟，
+    优先使用表现最好的接口；连续失败的接口进入冷却期（冷却时间逐次翻倍），
+    冷却期内不再尝试，避免每章都先打一次坏接口。
+    """
+
+    # (名称, endpoints 配置键, 默认路径)，顺序即未有样本时的默认优先级
+    ENDPOINTS = (
+        ('chapter', 'chapter', '/api/chapter'),
+        ('content', 'content', '/api/content'),
+        ('ios_content', 'ios_content', '/api/ios/content'),
+        ('raw_full', 'raw_full', '/api/raw_full'),
+    )
+
+    def __init__(self, alpha: float = 0.2, failure_threshold: int = 3,
+                 cooldown: float = 30.0, max_cooldown: float = 600.0):
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._stats: Dict[Tuple[str, str], Dict] = {}
+        self._lock = threading.Lock()
+
+    def ranked(self, node: str) -> List[str]:
+        """返回该节点的接口尝试顺序
+
+        冷却中的接口排除在外（全部冷却时仍按代价返回全部接口）；
+        有样本的接口按 延迟/成功率 排序，未尝试过的接口按默认优先级排在其后。
+        """
+        now = time.monotonic()
+        names = [name for name, _key, _path in self.ENDPOINTS]
+        with self._lock:
+            def sort_key(item):
+                index, name = item
+                stats = self._stats.get((node, name))
+                if stats is None:
+                    return (1, 0.0, index)
+                latency = stats['latency'] if stats['latency'] is not None else 1.0
+                return (0, latency / max(stats['success_rate'], 0.05), index)
+
+            ordered = [name for _i, name in sorted(enumerate(names), key=sort_key)]
+            active = [
+                name for name in ordered
+                if now >= self._stats.get((node, name), {}).get('skip_until', 0.0)
+            ]
+        return active or ordered
+
+    def record(self, node: str, name: str, ok: bool, latency: Optional[float] = None):
+        """记录一次接口请求结果"""
+        a = self.alpha
+        with self._lock:
+            stats = self._stats.get((node, name))
+            if stats is None:
+                stats = {'latency': None, 'success_rate': 1.0, 'failures': 0,
+                         'skip_until': 0.0, 'cooldown': 0.0}
+                self._stats[(node, name)] = stats
+            stats['success_rate'] = (1 - a) * stats['success_rate'] + a * (1.0 if ok else 0.0)
+            if ok:
+                if latency is not None:
+                    stats['latency'] = latency if stats['latency'] is None else (1 - a) * stats['latency'] + a * latency
+                stats['failures'] = 0
+                stats['cooldown'] = 0.0
+                return
+            stats['failures'] += 1
+            if stats['failures'] >= self.failure_threshold:
+                # 冷却结束后的试探再次失败时冷却时间翻倍
+                stats['cooldown'] = min(self.max_cooldown, stats['cooldown'] * 2) if stats['cooldown'] else self.cooldown
+                stats['skip_until'] = time.monotonic() + stats['cooldown']
+                stats['failures'] = self.failure_threshold - 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict]]:
+        """按节点汇总的接口统计（用于接口展示）"""
+        now = time.monotonic()
+        result: Dict[str, Dict[str, Dict]] = {}
+        with self._lock:
+            for (node, name), stats in self._stats.items():
+                result.setdefault(node, {})[name] = {
+                    'latency_ms': int(stats['latency'] * 1000) if stats['latency'] is not None else None,
+                    'success_rate': round(stats['success_rate'], 3),
+                    'cooling_down': now < stats['skip_until'],
+                }
+        return result
+
+
+class ChapterCache:
+    """持久化章节缓存（跨运行、跨书籍共享）
+
+    以 item_id 为键把章节原始正文压缩后存入 SQLite，按最近访问时间做容量淘汰。
+    重复下载同一本书、换格式重新导出或批量任务重跑时直接从本地读取，不再请求网络。
+    所有方法线程安全，数据库异常时静默降级为未命中。
+    """
+
+    EVICT_TARGET = 0.9  # 超出容量时淘汰到上限的 90%，避免每次写入都触发淘汰
+
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024, compress_level: int = 6):
+        self.path = path
+        self.max_bytes = max(0, int(max_bytes))
+        self.compress_level = compress_level
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chapters ("
+            "item_id TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chapters_accessed ON chapters(accessed)")
+        self._conn.commit()
+        row = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM chapters").fetchone()
+        self._total_bytes = int(row[0] or 0)
+
+    def _encode(self, content: str) -> bytes:
+        return zlib.compress(content.encode('utf-8'), self.compress_level)
+
+    @staticmethod
+    def _decode(blob: bytes) -> Optional[str]:
+        try:
+            return zlib.decompress(blob).decode('utf-8')
+        except (zlib.error, UnicodeDecodeError):
+            return None
+
+    def get(self, item_id: str) -> Optional[str]:
+        """读取单章正文，未命中返回 None"""
+        return self.get_many([item_id]).get(str(item_id))
+
+    def get_many(self, item_ids: List[str]) -> Dict[str, str]:
+        """批量读取章节正文，返回命中的 {item_id: content}"""
+        ids = [str(i) for i in item_ids if i]
+        if not ids:
+            return {}
+        result: Dict[str, str] = {}
+        now = time.time()
+        try:
+            with self._lock:
+                # SQLite 单条语句的参数个数有限，分批查询
+                for i in range(0, len(ids), 500):
+                    batch = ids[i:i + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._conn.execute(
+                        f"SELECT item_id, data FROM chapters WHERE item_id IN ({placeholders})", batch
+                    ).fetchall()
+                    for item_id, blob in rows:
+                        content = self._decode(blob)
+                        if content:
+                            result[item_id] = content
+                if result:
+                    self._conn.executemany("UPDATE chapters SET accessed = ? WHERE item_id = ?",
+                                           [(now, item_id) for item_id in result])
+                    self._conn.commit()
+        except sqlite3.Error:
+            return result
+        return result
+
+    def put(self, item_id: str, content: str):
+        """写入单章正文"""
+        self.put_many({item_id: content})
+
+    def put_many(self, items: Dict[str, str]):
+        """批量写入章节正文，写入后按容量淘汰最久未访问的章节"""
+        rows = []
+        now = time.time()
+        for item_id, content in items.items():
+            if item_id and isinstance(content, str) and content.strip():
+                blob = self._encode(content)
+                rows.append((str(item_id), blob, len(blob), now))
+        if not rows:
+            return
+        try:
+            with self._lock:
+                # 覆盖写入时先扣除旧条目的大小
+                replaced = 0
+                for i in range(0, len(rows), 500):
+                    batch = [row[0] for row in rows[i:i + 500]]
+                    placeholders = ",".join("?" * len(batch))
+                    replaced += int(self._conn.execute(
+                        f"SELECT COALESCE(SUM(size), 0) FROM chapters WHERE item_id IN ({placeholders})", batch
+                    ).fetchone()[0] or 0)
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO chapters (item_id, data, size, accessed) VALUES (?, ?, ?, ?)", rows
+                )
+                self._total_bytes += sum(row[2] for row in rows) - replaced
+                if self.max_bytes and self._total_bytes > self.max_bytes:
+                    self._evict_locked()
+                self._conn.commit()
+        except sqlite3.Error:
+            pass
+
+    def _evict_locked(self):
+        """按最近访问时间从旧到新淘汰，直到总大小降到 EVICT_TARGET 以下"""
+        target = int(self.max_bytes * self.EVICT_TARGET)
+        excess = self._total_bytes - target
+        victims = []
+        for item_id, size in self._conn.execute("SELECT item_id, size FROM chapters ORDER BY accessed"):
+            if excess <= 0:
+                break
+            victims.append((item_id,))
+            excess -= size
+        self._conn.executemany("DELETE FROM chapters WHERE item_id = ?", victims)
+        self._total_bytes = int(self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM chapters").fetchone()[0] or 0)
+
+    def discard(self, item_ids: List[str]):
+        """删除指定章节（章节内容有更新时使用）"""
+        ids = [(str(i),) for i in item_ids if i]
+        if not ids:
+            return
+        try:
+            with self._lock:
+                self._conn.executemany("DELETE FROM chapters WHERE item_id = ?", ids)
+                self._total_bytes = int(self._conn.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM chapters").fetchone()[0] or 0)
+                self._conn.commit()
+        except sqlite3.Error:
+            pass
+
+    def stats(self) -> Dict:
+        """缓存条目数与占用大小"""
+        try:
+            with self._lock:
+                count = self._conn.execute("SELECT COUNT(*) FROM chapters").fetchone()[0]
+        except sqlite3.Error:
+            count = None
+        return {'path': self.path, 'chapters': count, 'bytes': self._total_bytes, 'max_bytes': self.max_bytes}
+
+    def clear(self):
+        """清空缓存"""
+        try:
+            with self._lock:
+                self._conn.execute("DELETE FROM chapters")
+                self._conn.commit()
+                self._total_bytes = 0
+        except sqlite3.Error:
+            pass
+
+    def close(self):
+        try:
+            with self._lock:
+                self._conn.close()
+        except sqlite3.Error:
+            pass
+
+
+_CHAPTER_CACHE_FILE = 'fanqie_novel_downloader_chapters.db'
+
+
+def _get_persistent_dir() -> str:
+    """跨运行保留的数据目录（章节缓存、下载清单），由配置 chapter_cache_dir 指定，为空时使用系统临时目录"""
+    return os.path.expanduser(str(CONFIG.get("chapter_cache_dir") or "").strip()) or tempfile.gettempdir()
+
+_chapter_cache: Optional[ChapterCache] = None
+_chapter_cache_failed = False
+_chapter_cache_lock = threading.Lock()
+
+
+def get_chapter_cache() -> Optional[ChapterCache]:
+    """获取章节缓存单例，未启用或无法打开数据库时返回 None
+
+    位置由配置 chapter_cache_dir 指定（为空时使用系统临时目录），
+    容量由 chapter_cache_max_mb 指定。
+    """
+    global _chapter_cache, _chapter_cache_failed
+    if _chapter_cache is None and not _chapter_cache_failed:
+        with _chapter_cache_lock:
+            if _chapter_cache is None and not _chapter_cache_failed:
+                if not CONFIG.get("chapter_cache_enabled", True):
+                    _chapter_cache_failed = True
+                    return None
+                directory = _get_persistent_dir()
+                max_mb = float(CONFIG.get("chapter_cache_max_mb", 512) or 0)
+                try:
+                    _chapter_cache = ChapterCache(os.path.join(directory, _CHAPTER_CACHE_FILE),
+                                                  max_bytes=int(max_mb * 1024 * 1024))
+                    atexit.register(_chapter_cache.close)
+                except (sqlite3.Error, OSError) as e:
+                    _chapter_cache_failed = True
+                    with print_lock:
+                        print(f"章节缓存不可用: {e}")
+    return _chapter_cache
+
+
+def _bulk_chapter_content(value) -> Optional[str]:
+    """取出批量整本响应中单章的正文，值可能是字符串或包含 content/text 等字段的字典"""
+    content = None
+    if isinstance(value, str):
+        content = value
+    elif isinstance(value, dict):
+        content = (
+            value.get("content")
+            or value.get("text")
+            or value.get("raw")
+            or value.get("raw_text")
+            or ""
+        )
+    if isinstance(content, str) and content.strip():
+        return content
+    return None
+
+
+class BulkJsonStreamParser:
+    """整本批量 JSON 响应的增量解析器
+
+    响应形如 {"code": 200, "data": {"<item_id>": "<content>", ...}}。解析器逐块接收字节，
+    每当 data 中的一个成员完整到达就立即产出 (key, value)，已产出的部分随即从缓冲区丢弃，
+    内存占用与单章大小相当。其他顶层成员保存在 top 中（data 不是对象时也保存在这里）。
+    单个值由 json.JSONDecoder.raw_decode 解析；值尚不完整时等缓冲区增长一倍再重试，
+    保证超长值（如整本文本放在一个字符串里）的解析总代价仍是线性的。
+    """
+
+    _WHITESPACE = ' \t\r\n'
+
+    def __init__(self):
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+        self._json = json.JSONDecoder()
+        self._buf = ''
+        self._pos = 0
+        self._retry_at = 0
+        self._state = 'start'
+        self._key = None
+        self.top: Dict = {}
+        self.failed = False
+        self.done = False
+
+    def feed(self, chunk: bytes, final: bool = False) -> List[Tuple[str, object]]:
+        """输入一块数据，返回本次完整解析出的 data 成员列表"""
+        text = self._text_decoder.decode(chunk, final)
+        if self.failed:
+            return []
+        if self._pos:
+            self._buf = self._buf[self._pos:]
+            self._retry_at = max(0, self._retry_at - self._pos)
+            self._pos = 0
+        self._buf += text
+        members: List[Tuple[str, object]] = []
+        try:
+            self._parse(members, final)
+        except ValueError:
+            self.failed = True
+        return members
+
+    def close(self) -> List[Tuple[str, object]]:
+        """输入结束，返回剩余成员；JSON 不完整时 failed 置位"""
+        members = self.feed(b'', final=True)
+        if not self.done:
+            self.failed = True
+        return members
+
+    def _decode_value(self, pos: int, final: bool):
+        """从 pos 解析一个 JSON 值，数据不完整时返回 (None, None)"""
+        buf = self._buf
+        if not final and len(buf) < self._retry_at:
+            return None, None
+        try:
+            value, end = self._json.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            self._retry_at = len(buf) + max(len(buf) - pos, 65536)
+            return None, None
+        if end >= len(buf) and not final:
+            # 数字等值可能被截断在块边界上，必须看到后面的分隔符才算完整
+            self._retry_at = len(buf) + 1
+            return None, None
+        self._retry_at = 0
+        return value, end
+
+    def _parse(self, members: List[Tuple[str, object]], final: bool):
+        buf = self._buf
+        length = len(buf)
+        while True:
+            pos = self._pos
+            while pos < length and buf[pos] in self._WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos >= length:
+                return
+            ch = buf[pos]
+            state = self._state
+
+            if state == 'start':
+                if ch != '{':
+                    raise ValueError("bulk payload is not a JSON object")
+                self._state = 'top_key'
+                self._pos = pos + 1
+            elif state in ('top_key', 'data_key'):
+                if ch == '}':
+                    self._close_object(state)
+                    self._pos = pos + 1
+                    continue
+                if ch != '"':
+                    raise ValueError("expected object key")
+                key, end = self._decode_value(pos, final)
+                if end is None:
+                    return
+                self._key = key
+                self._state = 'top_colon' if state == 'top_key' else 'data_colon'
+                self._pos = end
+            elif state in ('top_colon', 'data_colon'):
+                if ch != ':':
+                    raise ValueError("expected ':'")
+                self._state = 'top_value' if state == 'top_colon' else 'data_value'
+                self._pos = pos + 1
+            elif state == 'top_value' and self._key == 'data' and ch == '{':
+                self._state = 'data_key'
+                self._pos = pos + 1
+            elif state in ('top_value', 'data_value'):
+                value, end = self._decode_value(pos, final)
+                if end is None:
+                    return
+                if state == 'top_value':
+                    self.top[self._key] = value
+                    self._state = 'top_sep'
+                else:
+                    members.append((self._key, value))
+                    self._state = 'data_sep'
+                self._pos = end
+            elif state in ('top_sep', 'data_sep'):
+                if ch == ',':
+                    self._state = 'top_key' if state == 'top_sep' else 'data_key'
+                elif ch == '}':
+                    self._close_object(state)
+                else:
+                    raise ValueError("expected ',' or '}'")
+                self._pos = pos + 1
+            else:
+                # 顶层对象结束后只允许空白
+                raise ValueError("unexpected data after JSON object")
+
+    def _close_object(self, state: str):
+        if state.startswith('data'):
+            self._state = 'top_sep'
+        else:
+            self._state = 'end'
+            self.done = True
+
+
+class _BulkMapCollector:
+    """把增量解析出的 data 成员整理为 {item_id: content}
+
+    与 _extract_bulk_map 的判定一致：前 5 个键均为数字才视为批量章节映射，
+    否则把成员原样保存在 other 中，交给文本模式提取。
+    原始正文分批写入章节缓存，供之后的下载直接复用。
+    """
+
+    CACHE_BATCH = 200
+
+    def __init__(self, chapter_transform=None):
+        self.chapter_transform = chapter_transform
+        self.bulk: Dict[str, str] = {}
+        self.other: Dict = {}
+        self.is_bulk = True
+        self._keys_seen = 0
+        self._cache = get_chapter_cache()
+        self._cache_pending: Dict[str, str] = {}
+
+    def add(self, key: str, value):
+        if self._keys_seen < 5 and self.is_bulk and not str(key).isdigit():
+            self.is_bulk = False
+            self.bulk = {}
+            self._cache_pending = {}
+        self._keys_seen += 1
+        if not self.is_bulk:
+            self.other[key] = value
+            return
+        content = _bulk_chapter_content(value)
+        if content is not None:
+            self.bulk[str(key)] = self.chapter_transform(content) if self.chapter_transform else content
+            if self._cache is not None:
+                self._cache_pending[str(key)] = content
+                if len(self._cache_pending) >= self.CACHE_BATCH:
+                    self.flush_cache()
+
+    def flush_cache(self):
+        """把尚未写入的原始正文写入章节缓存"""
+        if self._cache is not None and self._cache_pending:
+            self._cache.put_many(self._cache_pending)
+        self._cache_pending = {}
+
+
+def _extract_bulk_map(payload, chapter_transform=None) -> Optional[Dict[str, str]]:
+    """从整本批量响应中提取 {item_id: content}，前 5 个键不全是数字时返回 None"""
+    if not isinstance(payload, dict):
+        return None
+    nested = payload.get('data')
+    if not isinstance(nested, dict):
+        return None
+
+    keys = list(nested.keys())
+    if not keys:
+        return None
+
+    sample = keys[:min(5, len(keys))]
+    if not all(str(k).isdigit() for k in sample):
+        return None
+
+    collector = _BulkMapCollector(chapter_transform)
+    for k, v in nested.items():
+        collector.add(str(k), v)
+    collector.flush_cache()
+
+    return collector.bulk or None
+
+
+def _extract_full_text(payload) -> Optional[str]:
+    """从整本响应中提取文本模式的整本内容"""
+    if isinstance(payload, str):
+        return payload
+    if isinstance(payload, dict):
+        nested = payload.get('data')
+        if isinstance(nested, str):
+            return nested
+        if isinstance(nested, dict):
+            for key in ("content", "text", "raw", "raw_text", "full_text"):
+                val = nested.get(key)
+                if isinstance(val, str):
+                    return val
+        for key in ("content", "text", "raw", "raw_text", "full_text"):
+            val = payload.get(key)
+            if isinstance(val, str):
+                return val
+    return None
+
+
+class _BulkPayloadReader:
+    """整本响应体读取器
+
+    JSON 响应边接收边增量解析（见 BulkJsonStreamParser），文本响应在接收完毕后
+    通过 mmap 直接从落盘文件解码，避免在内存中保留多份原始数据。
+    """
+
+    def __init__(self, content_type: str = '', encoding: Optional[str] = None, chapter_transform=None):
+        self.content_type = (content_type or '').lower()
+        self.encoding = encoding or 'utf-8'
+        self.chapter_transform = chapter_transform
+        self.is_json_like: Optional[bool] = None
+        self._parser: Optional[BulkJsonStreamParser] = None
+        self._collector = _BulkMapCollector(chapter_transform)
+
+    def feed(self, chunk: bytes):
+        if not chunk:
+            return
+        if self.is_json_like is None:
+            self.is_json_like = 'application/json' in self.content_type or chunk[:1] in (b'{', b'[')
+            if self.is_json_like:
+                self._parser = BulkJsonStreamParser()
+        if self._parser is not None and not self._parser.failed:
+            for key, value in self._parser.feed(chunk):
+                self._collector.add(key, value)
+
+    def finish(self, path: str) -> Tuple[Optional[Union[str, Dict[str, str]]], bool]:
+        """结束读取，返回 (整本内容, 是否值得重试)
+
+        JSON 无法解析时返回 (None, True)；内容有效但不足以构成整本时返回 (None, False)。
+        """
+        if self.is_json_like:
+            for key, value in self._parser.close():
+                self._collector.add(key, value)
+            self._collector.flush_cache()
+            if not self._parser.failed:
+                if self._collector.is_bulk and self._collector.bulk:
+                    return self._collector.bulk, False
+                payload = dict(self._parser.top)
+                if self._collector.other:
+                    payload['data'] = self._collector.other
+            else:
+                # 非标准结构（如顶层为数组）时回退为整体解析落盘文件
+                try:
+                    with open(path, 'rb') as f:
+                        payload = json.load(io.TextIOWrapper(f, encoding='utf-8', errors='ignore'))
+                except Exception:
+                    payload = None
+                if not payload:
+                    return None, True
+                bulk_map = _extract_bulk_map(payload, self.chapter_transform)
+                if bulk_map:
+                    return bulk_map, False
+            text = _extract_full_text(payload)
+            return (text, False) if text and len(text) > 1000 else (None, False)
+
+        # 文本模式：直接从内存映射解码，避免 bytearray → bytes → str 的多次复制
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            text = str(mapped, self.encoding, 'replace')
+        return (text, False) if len(text) > 1000 else (None, False)
+
+
+# ===================== 章节目录 =====================
+
+class CatalogEntry:
+    """目录中的一章，支持 ch['id'] / ch.get('index') 形式的访问，可替代原先的章节字典"""
+
+    __slots__ = ('id', 'title', 'index')
+
+    def __init__(self, item_id: str, title: str, index: int):
+        self.id = item_id
+        self.title = title
+        self.index = index
+
+    def __getitem__(self, key: str):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def to_dict(self) -> Dict:
+        return {'id': self.id, 'title': self.title, 'index': self.index}
+
+    def __repr__(self):
+        return f"CatalogEntry({self.id!r}, {self.title!r}, {self.index})"
+
+
+def _default_chapter_title(number: int) -> str:
+    return f"第{number}章"
+
+
+class Catalog:
+    """章节目录
+
+    item_id 全为十进制数字时存于 64 位无符号整数数组，否则存为字符串列表；标题经 sys.intern 驻留；
+    索引连续时只记录起点。按位置、索引与 item_id 查找均为 O(1)（后两者的映射在首次查找时建立）。
+    遍历或下标访问时才生成 CatalogEntry，整本书不为每章常驻字典。
+    """
+
+    __slots__ = ('_ids', '_titles', '_base', '_indices', '_id_positions', '_index_positions')
+
+    def __init__(self, ids: List[str], titles: List[str], indices: Optional[List[int]] = None):
+        """
+        Args:
+            ids: 各章 item_id（按目录顺序）
+            titles: 各章标题
+            indices: 各章在完整目录中的索引，为空时为 0..n-1
+        """
+        self._ids = self._pack_ids(ids)
+        self._titles = [sys.intern(title) if type(title) is str else title for title in titles]
+        self._base = 0
+        self._indices = None
+        if indices is not None:
+            indices = list(indices)
+            base = indices[0] if indices else 0
+            if indices != list(range(base, base + len(indices))):
+                self._indices = array('q', indices)
+            else:
+                self._base = base
+        self._id_positions: Optional[Dict] = None
+        self._index_positions: Optional[Dict[int, int]] = None
+
+    @staticmethod
+    def _pack_ids(ids):
+        if isinstance(ids, array):
+            return ids
+        ids = [str(item_id) for item_id in ids]
+        # 只有无前导零的十进制数字才能无损地转为整数再转回
+        if all(item_id.isascii() and item_id.isdigit() and (item_id[0] != '0' or item_id == '0')
+               and len(item_id) <= 20 for item_id in ids):
+            try:
+                return array('Q', map(int, ids))
+            except OverflowError:
+                pass
+        return ids
+
+    @classmethod
+    def parse(cls, payload, default_title=None) -> 'Catalog':
+        """解析目录接口的章节数据
+
+        支持 directory 接口的 lists 与 book 接口的两种结构
+        （{'allItemIds', 'chapterListWithVolume'} 或章节列表），无法识别时返回空目录。
+
+        Args:
+            payload: 接口返回的章节数据
+            default_title: 缺少标题时的标题生成函数，参数为从 1 开始的章节序号，默认“第N章”
+        """
+        default_title = default_title or _default_chapter_title
+        ids, titles, indices = [], [], []
+        if isinstance(payload, dict):
+            chapter_list = payload.get("chapterListWithVolume", [])
+            if chapter_list:
+                idx = 0
+                for volume in chapter_list:
+                    if isinstance(volume, list):
+                        for ch in volume:
+                            if isinstance(ch, dict):
+                                item_id = ch.get("itemId") or ch.get("item_id")
+                                if item_id:
+                                    ids.append(item_id)
+                                    titles.append(ch["title"] if "title" in ch else default_title(idx + 1))
+                                    indices.append(idx)
+                                    idx += 1
+            else:
+                for idx, item_id in enumerate(payload.get("allItemIds", [])):
+                    ids.append(item_id)
+                    titles.append(default_title(idx + 1))
+                    indices.append(idx)
+        elif isinstance(payload, list):
+            for idx, ch in enumerate(payload):
+                if isinstance(ch, dict):
+                    item_id = ch.get("item_id") or ch.get("chapter_id")
+                    if item_id:
+                        ids.append(item_id)
+                        titles.append(ch["title"] if "title" in ch else default_title(idx + 1))
+                        indices.append(idx)
+        return cls(ids, titles, indices)
+
+    @classmethod
+    def of(cls, chapters) -> 'Catalog':
+        """由章节列表（CatalogEntry 或 {'id', 'title', 'index'} 字典）构建目录，已是目录时原样返回"""
+        if isinstance(chapters, Catalog):
+            return chapters
+        ids, titles, indices = [], [], []
+        for i, ch in enumerate(chapters):
+            ids.append(ch.get('id', ch.get('item_id', '')))
+            titles.append(ch.get('title', ''))
+            indices.append(ch.get('index', i))
+        return cls(ids, titles, indices)
+
+    def _index_at(self, pos: int) -> int:
+        return self._indices[pos] if self._indices is not None else self._base + pos
+
+    def _entry(self, pos: int) -> CatalogEntry:
+        return CatalogEntry(str(self._ids[pos]), self._titles[pos], self._index_at(pos))
+
+    def __len__(self) -> int:
+        return len(self._titles)
+
+    def __iter__(self):
+        if self._indices is not None:
+            indices = self._indices
+        else:
+            indices = range(self._base, self._base + len(self._titles))
+        for item_id, title, index in zip(self._ids, self._titles, indices):
+            yield CatalogEntry(str(item_id), title, index)
+
+    def __getitem__(self, key):
+        """整数下标返回该位置的章节，切片返回子目录"""
+        if isinstance(key, slice):
+            return Catalog(self._ids[key], self._titles[key], self.indices[key])
+        return self._entry(range(len(self))[key])
+
+    @property
+    def indices(self):
+        """各章索引（按目录顺序），索引连续时为 range"""
+        if self._indices is not None:
+            return self._indices
+        return range(self._base, self._base + len(self._titles))
+
+    def position_of_index(self, index: int) -> Optional[int]:
+        if self._indices is None:
+            pos = index - self._base
+            return pos if 0 <= pos < len(self._titles) else None
+        if self._index_positions is None:
+            self._index_positions = {}
+            for pos, value in enumerate(self._indices):
+                self._index_positions.setdefault(value, pos)
+        return self._index_positions.get(index)
+
+    def by_index(self, index: int) -> Optional[CatalogEntry]:
+        """按章节索引取章节，不存在时返回 None"""
+        pos = self.position_of_index(index)
+        return self._entry(pos) if pos is not None else None
+
+    def index_of(self, item_id) -> Optional[int]:
+        """按 item_id 取章节索引，不存在时返回 None"""
+        if self._id_positions is None:
+            self._id_positions = {}
+            for pos, value in enumerate(self._ids):
+                self._id_positions.setdefault(value, pos)
+        key = str(item_id)
+        if isinstance(self._ids, array):
+            if not (key.isascii() and key.isdigit()) or str(int(key)) != key:
+                return None
+            key = int(key)
+        pos = self._id_positions.get(key)
+        return self._index_at(pos) if pos is not None else None
+
+    def select(self, indices) -> 'Catalog':
+        """按目录顺序保留索引在 indices 中的章节"""
+        indices = set(indices)
+        positions = [pos for pos, index in enumerate(self.indices) if index in indices]
+        return Catalog([self._ids[pos] for pos in positions], [self._titles[pos] for pos in positions],
+                       [self._index_at(pos) for pos in positions])
+
+    def to_list(self) -> List[Dict]:
+        """转为 [{'id', 'title', 'index'}, ...]，用于 JSON 输出"""
+        return [ch.to_dict() for ch in self]
+
+
 class APIManager:
     """番茄小说官方API统一管理器 - https://qkfqapi.vv9v.cn/docs
     支持同步和异步两种调用方式
@@ -89,8 +1402,106 @@ class APIManager:
         self._tls = threading.local()
         self._async_session: Optional[aiohttp.ClientSession] = None
         self.semaphore = None
-        # 使用令牌桶替代全局锁，允许真正的并发
+        # 使用令牌桶替代全局锁，允许真正的并发（按节点独立限速）
         self.rate_limiter: Optional[TokenBucket] = None
+        self._node_rate_limiters: Dict[str, TokenBucket] = {}
+        # 自适应并发控制（同步/异步章节请求共用，按节点独立），未启用时为空
+        self._node_concurrency: Dict[str, AdaptiveConcurrencyController] = {}
+        self._node_lock = threading.Lock()
+        # 对冲请求策略（可选），未启用时为 None
+        self.hedging: Optional[HedgingPolicy] = HedgingPolicy.from_config()
+        self._primary_executor: Optional[ThreadPoolExecutor] = None
+        self._hedge_executor: Optional[ThreadPoolExecutor] = None
+        self._hedge_slots: Optional[threading.BoundedSemaphore] = None
+        # 节点运行时健康度与熔断器
+        self.health: NodeHealthRegistry = get_node_health_registry()
+        # 各节点章节接口的排序与冷却
+        self.endpoint_selector = EndpointSelector()
+        # 持久化章节缓存，未启用时为 None
+        self.chapter_cache: Optional[ChapterCache] = get_chapter_cache()
+
+    def route_node(self) -> str:
+        """为未指定节点的请求选择节点
+
+        当前 base_url 未熔断时始终使用它（尊重手动/自动选择的结果）；
+        熔断后改用健康度最好的其他节点，全部熔断时仍回退到 base_url。
+        """
+        if not self.health.is_open(self.base_url):
+            return self.base_url
+        best = self.health.best_node([n for n in self.get_chapter_nodes() if n != self.base_url])
+        return best or self.base_url
+
+    def _record_health(self, base_url: str, start: float, ok: bool, status_code: Optional[int] = None):
+        """把一次请求结果反馈给健康度登记表"""
+        self.health.record(base_url, ok, time.monotonic() - start if ok else None, throttled=status_code == 429)
+
+    @property
+    def concurrency(self) -> Optional['AdaptiveConcurrencyController']:
+        """当前 base_url 节点的并发控制器"""
+        return self.get_concurrency(self.base_url)
+
+    def get_concurrency(self, base_url: str) -> Optional['AdaptiveConcurrencyController']:
+        """获取指定节点的并发控制器（懒创建），未启用自适应并发时返回 None"""
+        controller = self._node_concurrency.get(base_url)
+        if controller is None:
+            with self._node_lock:
+                controller = self._node_concurrency.get(base_url)
+                if controller is None:
+                    controller = AdaptiveConcurrencyController.from_config()
+                    if controller is None:
+                        return None
+                    self._node_concurrency[base_url] = controller
+        return controller
+
+    def effective_concurrency(self) -> int:
+        """所有已使用节点的有效并发之和（用于状态展示）"""
+        with self._node_lock:
+            controllers = list(self._node_concurrency.values())
+        return sum(c.limit for c in controllers)
+
+    def chapter_worker_limit(self, nodes: List[str]) -> int:
+        """章节下载线程数：启用自适应并发时取各节点并发上限之和，否则按 max_workers，受 connection_pool_size 限制
+
+        实际在途请求数仍由各节点控制器限制。
+        """
+        workers = 0
+        for node in nodes:
+            concurrency = self.get_concurrency(node)
+            workers += concurrency.max_limit if concurrency else CONFIG.get("max_workers", 5)
+        return max(1, min(workers, int(CONFIG.get("connection_pool_size", 100) or 100)))
+
+    def _get_rate_limiter(self, base_url: str) -> Optional[TokenBucket]:
+        """获取指定节点的令牌桶（需在异步会话创建后调用）"""
+        if not base_url or base_url == self.base_url:
+            return self.rate_limiter
+        limiter = self._node_rate_limiters.get(base_url)
+        if limiter is None:
+            limiter = TokenBucket(rate=CONFIG.get("api_rate_limit", 20), capacity=CONFIG.get("max_workers", 10))
+            self._node_rate_limiters[base_url] = limiter
+        return limiter
+
+    def get_chapter_nodes(self) -> List[str]:
+        """获取可用于章节下载的节点列表（当前节点优先，跳过探测不可用的节点）"""
+        try:
+            from web_app import PROBED_NODES_CACHE
+        except ImportError:
+            PROBED_NODES_CACHE = {}
+
+        nodes: List[str] = []
+        candidates = [self.base_url]
+        for source in CONFIG.get("api_sources", []) or []:
+            if isinstance(source, dict):
+                candidates.append(source.get("base_url", "") or source.get("api_base_url", ""))
+            elif isinstance(source, str):
+                candidates.append(source)
+        for base in candidates:
+            base = (base or "").strip().rstrip('/')
+            if not base or base in nodes:
+                continue
+            if base in PROBED_NODES_CACHE and not PROBED_NODES_CACHE[base].get('available', False):
+                continue
+            nodes.append(base)
+        return nodes
 
     def _get_session(self) -> requests.Session:
         """获取同步HTTP会话"""
@@ -100,7 +1511,8 @@ class APIManager:
             retries = Retry(
                 total=CONFIG.get("max_retries", 3),
                 backoff_factor=0.3,
-                status_forcelist=(429, 500, 502, 503, 504),
+                # 429 不在此透明重试，交给自适应并发控制器在第一次限流时立即降低并发
+                status_forcelist=(500, 502, 503, 504),
                 allowed_methods=("GET", "POST"),
                 raise_on_status=False,
             )
@@ -121,9 +1533,13 @@ class APIManager:
         """获取异步HTTP会话"""
         if self._async_session is None or self._async_session.closed:
             timeout = aiohttp.ClientTimeout(total=CONFIG["request_timeout"], connect=5, sock_read=15)
+            per_host = CONFIG.get("max_workers", 10) * 2
+            if self.concurrency:
+                # 自适应并发可能升到 concurrency_max，连接池需留足余量
+                per_host = max(per_host, self.concurrency.max_limit)
             connector = aiohttp.TCPConnector(
                 limit=CONFIG.get("connection_pool_size", 100),
-                limit_per_host=CONFIG.get("max_workers", 10) * 2,  # 每个主机的连接数
+                limit_per_host=per_host,  # 每个主机的连接数
                 ttl_dns_cache=300,
                 enable_cleanup_closed=True,
                 force_close=False,
@@ -136,6 +1552,7 @@ class APIManager:
                 trust_env=True
             )
             self.semaphore = asyncio.Semaphore(CONFIG.get("max_workers", 10))
+            self._node_rate_limiters = {}
             # 初始化令牌桶：每秒允许 api_rate_limit 个请求，突发容量为 max_workers
             rate = CONFIG.get("api_rate_limit", 20)
             capacity = CONFIG.get("max_workers", 10)
@@ -164,13 +1581,20 @@ class APIManager:
                 print(t("dl_search_error", str(e)))
             return None
     
-    def get_book_detail(self, book_id: str) -> Optional[Dict]:
-        """获取书籍详情，返回 dict 或 None，如果书籍下架会返回 {'_error': 'BOOK_REMOVE'}"""
+    def get_book_detail(self, book_id: str, base_url: Optional[str] = None) -> Optional[Dict]:
+        """获取书籍详情，返回 dict 或 None，如果书籍下架会返回 {'_error': 'BOOK_REMOVE'}
+
+        Args:
+            base_url: 指定节点，为空时使用当前节点
+        """
+        base_url = base_url or self.base_url
+        start = time.monotonic()
         try:
-            url = f"{self.base_url}{self.endpoints['detail']}"
+            url = f"{base_url}{self.endpoints['detail']}"
             params = {"book_id": book_id}
             response = self._get_session().get(url, params=params, headers=get_headers(), timeout=CONFIG["request_timeout"])
-            
+            self._record_health(base_url, start, response.status_code == 200, response.status_code)
+
             if response.status_code == 200:
                 data = response.json()
                 if data.get("code") == 200 and "data" in data:
@@ -189,20 +1613,28 @@ class APIManager:
                             return inner_data
                     return level1_data
             return None
+        except requests.exceptions.RequestException as e:
+            self._record_health(base_url, start, False)
+            with print_lock:
+                print(t("dl_detail_error", str(e)))
+            return None
         except Exception as e:
             with print_lock:
                 print(t("dl_detail_error", str(e)))
             return None
     
-    def get_directory(self, book_id: str) -> Optional[List[Dict]]:
+    def get_directory(self, book_id: str, base_url: Optional[str] = None) -> Optional[List[Dict]]:
         """获取简化目录（更快，标题与整本下载内容一致）
-        GET /api/directory - 参数: fq_id
+        GET /api/directory - 参数: fq_id，base_url 为空时使用当前节点
         """
+        base_url = base_url or self.base_url
+        start = time.monotonic()
         try:
-            url = f"{self.base_url}/api/directory"
+            url = f"{base_url}/api/directory"
             params = {"fq_id": book_id}
             response = self._get_session().get(url, params=params, headers=get_headers(), timeout=CONFIG["request_timeout"])
-            
+            self._record_health(base_url, start, response.status_code == 200, response.status_code)
+
             if response.status_code == 200:
                 data = response.json()
                 if data.get("code") == 200 and "data" in data:
@@ -210,6 +1642,9 @@ class APIManager:
                     if lists:
                         return lists
             return None
+        except requests.exceptions.RequestException:
+            self._record_health(base_url, start, False)
+            return None
         except Exception:
             return None
     
@@ -239,105 +1674,376 @@ class APIManager:
                 print(t("dl_chapter_list_error", str(e)))
             return None
     
-    def get_chapter_content(self, item_id: str) -> Optional[Dict]:
+    def get_catalog(self, book_id: str) -> Optional[Catalog]:
+        """获取章节目录：优先使用 directory 接口（更快且标题与整本下载一致），失败时回退到 book 接口"""
+        directory_data = self.get_directory(book_id)
+        catalog = Catalog.parse(directory_data) if directory_data else None
+        if not catalog:
+            chapters_data = self.get_chapter_list(book_id)
+            catalog = Catalog.parse(chapters_data) if chapters_data else None
+        return catalog or None
+
+    def get_chapter_content(self, item_id: str, base_url: Optional[str] = None,
+                            endpoint_offset: int = 0) -> Optional[Dict]:
         """获取章节内容(同步)
-        优先使用 /api/chapter 简化接口，失败时回退到 /api/content
+        按该节点上各章节接口的实测表现依次尝试（见 EndpointSelector），拿到正文即返回
+
+        Args:
+            item_id: 章节ID
+            base_url: 指定节点，为空时按健康度路由（见 route_node）
+            endpoint_offset: 从排序后的第几个接口开始尝试（同节点对冲请求用 1 错开主请求）
         """
-        try:
-            # 优先尝试简化的 /api/chapter 接口（更稳定）
-            chapter_endpoint = self.endpoints.get('chapter', '/api/chapter')
-            url = f"{self.base_url}{chapter_endpoint}"
-            params = {"item_id": item_id}
-            response = self._get_session().get(url, params=params, headers=get_headers(), timeout=CONFIG["request_timeout"])
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("code") == 200 and "data" in data:
-                    return data["data"]
-            
-            # 回退到 /api/content 接口
-            url = f"{self.base_url}{self.endpoints['content']}"
-            params = {"tab": "小说", "item_id": item_id}
-            response = self._get_session().get(url, params=params, headers=get_headers(), timeout=CONFIG["request_timeout"])
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("code") == 200 and "data" in data:
-                    return data["data"]
+        cached = self._cached_chapter(item_id)
+        if cached:
+            return cached
+        if base_url is None:
+            base_url = self.route_node()
+        elif not self.health.allow(base_url):
+            # 指定节点已熔断，直接失败让调用方切换节点，避免逐章耗尽重试
             return None
+        max_retries = max(1, int(CONFIG.get("max_retries", 3) or 1))
+        concurrency = self.get_concurrency(base_url)
+        if concurrency:
+            concurrency.acquire()
+        start = time.monotonic()
+        ok = False
+        last_status = None
+        fallback = None
+        try:
+            for name in self._ranked_chapter_endpoints(base_url, endpoint_offset):
+                url, params = self._chapter_request(base_url, name, item_id)
+                try:
+                    for attempt in range(max_retries):
+                        request_start = time.monotonic()
+                        response = self._timed_get(url, params, concurrency)
+                        last_status = response.status_code
+                        if response.status_code != 429:
+                            break
+                        # 会话不重试 429，与异步路径一致在此退避后重试同一接口
+                        time.sleep(min(2 ** attempt, 10))
+                except requests.exceptions.RequestException:
+                    # 超时、连接/SSL 错误、响应中断都记为该接口失败，继续尝试下一个接口
+                    self.endpoint_selector.record(base_url, name, False)
+                    continue
+                if response.status_code == 429:
+                    # 限流属于节点问题，不计入接口统计
+                    continue
+
+                data = None
+                if response.status_code == 200:
+                    try:
+                        data = self._extract_chapter_data(name, response.json())
+                    except ValueError:
+                        data = None
+                if data and data.get("content"):
+                    self.endpoint_selector.record(base_url, name, True, time.monotonic() - request_start)
+                    self._store_chapter(item_id, data)
+                    ok = True
+                    return data
+                self.endpoint_selector.record(base_url, name, False)
+                if data is not None and fallback is None:
+                    fallback = data
+            return fallback
         except Exception as e:
             with print_lock:
                 print(t("dl_content_error", str(e)))
             return None
+        finally:
+            if concurrency:
+                concurrency.release()
+            self._record_health(base_url, start, ok, last_status)
+
+    def _cached_chapter(self, item_id: str) -> Optional[Dict]:
+        """从本地章节缓存读取，命中时返回与接口一致的 {'content': ...}"""
+        if self.chapter_cache is None:
+            return None
+        content = self.chapter_cache.get(item_id)
+        return {"content": content} if content else None
+
+    def _store_chapter(self, item_id: str, data: Dict):
+        """把接口返回的章节正文写入本地章节缓存"""
+        if self.chapter_cache is not None and isinstance(data.get("content"), str):
+            self.chapter_cache.put(item_id, data["content"])
+
+    def _ranked_chapter_endpoints(self, base_url: str, offset: int = 0) -> List[str]:
+        """节点上章节接口的尝试顺序，offset 把前几个接口轮转到末尾"""
+        names = self.endpoint_selector.ranked(base_url)
+        if offset and len(names) > 1:
+            offset %= len(names)
+            names = names[offset:] + names[:offset]
+        return names
+
+    def _chapter_request(self, base_url: str, name: str, item_id: str) -> Tuple[str, Dict]:
+        """构造章节接口的 URL 与参数"""
+        for endpoint_name, key, default in EndpointSelector.ENDPOINTS:
+            if endpoint_name == name:
+                url = f"{base_url}{self.endpoints.get(key, default)}"
+                break
+        else:
+            raise ValueError(f"unknown chapter endpoint: {name}")
+        if name == 'content':
+            return url, {"tab": "小说", "item_id": item_id}
+        return url, {"item_id": item_id}
+
+    @staticmethod
+    def _extract_chapter_data(name: str, payload) -> Optional[Dict]:
+        """从章节接口响应中取出章节数据，raw_full 接口的正文可能再嵌套一层 data"""
+        if not isinstance(payload, dict) or payload.get("code") != 200 or "data" not in payload:
+            return None
+        data = payload["data"]
+        if not isinstance(data, dict):
+            return None
+        if name == 'raw_full' and not data.get("content"):
+            nested = data.get("data")
+            if isinstance(nested, dict) and nested.get("content"):
+                return nested
+        return data
+
+    def _timed_get(self, url: str, params: Dict,
+                   concurrency: Optional['AdaptiveConcurrencyController'] = None) -> requests.Response:
+        """发起章节请求并把状态码/延迟/超时反馈给并发控制器"""
+        start = time.monotonic()
+        try:
+            response = self._get_session().get(url, params=params, headers=get_headers(), timeout=CONFIG["request_timeout"])
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+            if concurrency:
+                concurrency.record_failure(AdaptiveConcurrencyController.TIMEOUT)
+            raise
+        if concurrency:
+            concurrency.record_status(response.status_code, time.monotonic() - start)
+        return response
 
 
-    async def get_chapter_content_async(self, item_id: str) -> Optional[Dict]:
+    @asynccontextmanager
+    async def _async_slot(self, base_url: str):
+        """异步并发名额：启用自适应并发时由节点控制器分配，否则使用固定信号量
+
+        令牌桶速率随当前并发上限等比例缩放，避免固定速率成为瓶颈。
+        """
+        concurrency = self.get_concurrency(base_url)
+        if not concurrency:
+            async with self.semaphore:
+                yield
+            return
+        await concurrency.acquire_async()
+        try:
+            rate_limiter = self._get_rate_limiter(base_url)
+            if rate_limiter:
+                base_rate = CONFIG.get("api_rate_limit", 20)
+                base_workers = max(1, int(CONFIG.get("max_workers", 10) or 10))
+                rate_limiter.rate = base_rate * concurrency.limit / base_workers
+                rate_limiter.capacity = concurrency.limit
+            yield
+        finally:
+            concurrency.release()
+
+    async def get_chapter_content_async(self, item_id: str, base_url: Optional[str] = None,
+                                        endpoint_offset: int = 0) -> Optional[Dict]:
         """获取章节内容(异步)
-        优先使用 /api/chapter 简化接口，失败时回退到 /api/content
+        按该节点上各章节接口的实测表现依次尝试（见 EndpointSelector），拿到正文即返回
         使用令牌桶算法实现真正的并发速率限制
-        """
-        max_retries = CONFIG.get("max_retries", 3)
-        session = await self._get_async_session()
+
+        Args:
+            item_id: 章节ID
+            base_url: 指定节点，为空时按健康度路由（见 route_node）
+            endpoint_offset: 从排序后的第几个接口开始尝试（同节点对冲请求用 1 错开主请求）
+        """
+        cached = self._cached_chapter(item_id)
+        if cached:
+            return cached
+        if base_url is None:
+            base_url = self.route_node()
+        elif not self.health.allow(base_url):
+            return None
+        outcome = {'status': None}
+        start = time.monotonic()
+        try:
+            data = await self._get_chapter_content_async(item_id, base_url, outcome, endpoint_offset)
+        except asyncio.CancelledError:
+            # 被取消（如对冲落败）不代表节点失败，不计入健康度；
+            # 取消异常不会被接口重试循环捕获，接口统计同样不会记录
+            raise
+        except Exception:
+            self._record_health(base_url, start, False, outcome['status'])
+            raise
+        self._record_health(base_url, start, bool(data and data.get("content")), outcome['status'])
+        return data
+
+    async def _get_chapter_content_async(self, item_id: str, base_url: str, outcome: Dict,
+                                         endpoint_offset: int = 0) -> Optional[Dict]:
+        """get_chapter_content_async 的请求实现，outcome['status'] 记录最后一次 HTTP 状态码"""
+        max_retries = CONFIG.get("max_retries", 3)
+        session = await self._get_async_session()
+        concurrency = self.get_concurrency(base_url)
+        fallback = None
 
         # 使用令牌桶进行速率限制，允许真正的并发
-        async with self.semaphore:
-            if self.rate_limiter:
-                await self.rate_limiter.acquire()
+        async with self._async_slot(base_url):
+            rate_limiter = self._get_rate_limiter(base_url)
+            if rate_limiter:
+                await rate_limiter.acquire()
 
-            # 优先尝试简化的 /api/chapter 接口
-            chapter_endpoint = self.endpoints.get('chapter', '/api/chapter')
-            url = f"{self.base_url}{chapter_endpoint}"
-            params = {"item_id": item_id}
+            for name in self._ranked_chapter_endpoints(base_url, endpoint_offset):
+                url, params = self._chapter_request(base_url, name, item_id)
+                throttled = False
 
-            for attempt in range(max_retries):
-                try:
-                    async with session.get(url, params=params) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            if data.get("code") == 200 and "data" in data:
-                                return data["data"]
-                        elif response.status == 429:
-                            await asyncio.sleep(min(2 ** attempt, 10))
+                for attempt in range(max_retries):
+                    throttled = False
+                    try:
+                        start = time.monotonic()
+                        async with session.get(url, params=params) as response:
+                            outcome['status'] = response.status
+                            if concurrency:
+                                concurrency.record_status(response.status, time.monotonic() - start)
+                            if response.status == 200:
+                                try:
+                                    data = self._extract_chapter_data(name, await response.json(content_type=None))
+                                except ValueError:
+                                    data = None
+                                if data and data.get("content"):
+                                    self.endpoint_selector.record(base_url, name, True, time.monotonic() - start)
+                                    self._store_chapter(item_id, data)
+                                    return data
+                                if data is not None and fallback is None:
+                                    fallback = data
+                            elif response.status == 429:
+                                throttled = True
+                                await asyncio.sleep(min(2 ** attempt, 10))
+                                continue
+                            break  # 其他错误，尝试下一个接口
+                    except asyncio.TimeoutError:
+                        if concurrency:
+                            concurrency.record_failure(AdaptiveConcurrencyController.TIMEOUT)
+                        if attempt < max_retries - 1:
+                            await asyncio.sleep(CONFIG.get("retry_delay", 2) * (attempt + 1))
                             continue
-                        break  # 其他错误，尝试备用接口
-                except asyncio.TimeoutError:
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(CONFIG.get("retry_delay", 2) * (attempt + 1))
-                        continue
-                    break
-                except Exception:
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(0.3)
-                        continue
-                    break
+                        break
+                    except Exception:
+                        if attempt < max_retries - 1:
+                            await asyncio.sleep(0.3)
+                            continue
+                        break
 
-            # 回退到 /api/content 接口
-            url = f"{self.base_url}{self.endpoints['content']}"
-            params = {"tab": "小说", "item_id": item_id}
+                # 限流属于节点问题，不计入接口统计
+                if not throttled:
+                    self.endpoint_selector.record(base_url, name, False)
+
+            return fallback
+
+    def _pick_hedge_node(self, base_url: str) -> str:
+        """选择对冲请求的目标节点：优先健康度最好的其他节点，只有一个节点时重复请求同一节点"""
+        best = self.health.best_node([n for n in self.get_chapter_nodes() if n != base_url])
+        return best or base_url
+
+    def _get_hedge_executors(self) -> Tuple[ThreadPoolExecutor, ThreadPoolExecutor]:
+        """同步对冲使用的线程池：(主请求池, 对冲池)
+
+        主请求池与章节下载线程数一致（见 chapter_worker_limit），对冲池按对冲预算确定大小：
+        对冲预算占主请求的比例加上突发额度，对冲请求不会占用超出预算的线程。
+        """
+        if self._hedge_executor is None:
+            workers = self.chapter_worker_limit(self.get_chapter_nodes())
+            hedges = self.hedging.burst + max(1, int(round(workers * self.hedging.budget_ratio)))
+            with self._node_lock:
+                if self._hedge_executor is None:
+                    self._primary_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="primary")
+                    self._hedge_slots = threading.BoundedSemaphore(hedges)
+                    self._hedge_executor = ThreadPoolExecutor(max_workers=hedges, thread_name_prefix="hedge")
+        return self._primary_executor, self._hedge_executor
+
+    def get_chapter_content_hedged(self, item_id: str, base_url: Optional[str] = None) -> Optional[Dict]:
+        """获取章节内容(同步，带对冲)
+
+        主请求超过对冲阈值仍未返回时，在预算允许的情况下向另一节点发出重复请求，
+        先返回有效内容的一方胜出。未启用对冲时等同于 get_chapter_content。
+        """
+        hedging = self.hedging
+        if hedging is None:
+            return self.get_chapter_content(item_id, base_url)
+        cached = self._cached_chapter(item_id)
+        if cached:
+            return cached
+
+        # 未指定节点时主请求仍交给 get_chapter_content 按健康度路由（见 route_node），
+        # 对冲节点相对于路由结果选择
+        primary_node = base_url or self.route_node()
+        primary_executor, hedge_executor = self._get_hedge_executors()
+        hedging.count_primary()
+        start = time.monotonic()
+        primary = primary_executor.submit(self.get_chapter_content, item_id, base_url)
+        primary.add_done_callback(lambda f: None if f.cancelled() else hedging.record(time.monotonic() - start))
+
+        try:
+            return primary.result(timeout=hedging.hedge_delay())
+        except FuturesTimeoutError:
+            pass
 
-            for attempt in range(max_retries):
+        # 对冲线程已占满时不再排队对冲，直接等待主请求
+        if not self._hedge_slots.acquire(blocking=False):
+            return primary.result()
+        if not hedging.try_acquire():
+            self._hedge_slots.release()
+            return primary.result()
+
+        hedge_node = self._pick_hedge_node(primary_node)
+        # 同节点对冲时从排名第二的接口开始，避免重复请求同一个慢接口
+        hedge = hedge_executor.submit(self.get_chapter_content, item_id, hedge_node,
+                                      1 if hedge_node == primary_node else 0)
+        hedge.add_done_callback(lambda _f: self._hedge_slots.release())
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
                 try:
-                    async with session.get(url, params=params) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            if data.get("code") == 200 and "data" in data:
-                                return data["data"]
-                        elif response.status == 429:
-                            await asyncio.sleep(min(2 ** attempt, 10))
-                            continue
-                        return None
-                except asyncio.TimeoutError:
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(CONFIG.get("retry_delay", 2) * (attempt + 1))
-                        continue
-                    return None
+                    data = future.result()
                 except Exception:
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(0.3)
-                        continue
-                    return None
+                    data = None
+                if data and data.get('content'):
+                    if future is hedge:
+                        hedging.record_win()
+                    return data
+        return None
 
+    async def get_chapter_content_hedged_async(self, item_id: str, base_url: Optional[str] = None) -> Optional[Dict]:
+        """获取章节内容(异步，带对冲)，落败的请求会被取消"""
+        hedging = self.hedging
+        if hedging is None:
+            return await self.get_chapter_content_async(item_id, base_url)
+        cached = self._cached_chapter(item_id)
+        if cached:
+            return cached
+
+        primary_node = base_url or self.route_node()
+        hedging.count_primary()
+        start = time.monotonic()
+        primary = asyncio.ensure_future(self.get_chapter_content_async(item_id, base_url))
+        # 被取消的主请求耗时被截断，计入会拉低对冲阈值
+        primary.add_done_callback(lambda f: None if f.cancelled() else hedging.record(time.monotonic() - start))
+
+        done, _ = await asyncio.wait({primary}, timeout=hedging.hedge_delay())
+        if done or not hedging.try_acquire():
+            return await primary
+
+        hedge_node = self._pick_hedge_node(primary_node)
+        hedge = asyncio.ensure_future(self.get_chapter_content_async(
+            item_id, hedge_node, 1 if hedge_node == primary_node else 0))
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        data = task.result()
+                    except Exception:
+                        data = None
+                    if data and data.get('content'):
+                        if task is hedge:
+                            hedging.record_win()
+                        return data
             return None
+        finally:
+            for task in pending:
+                task.cancel()
 
     # ===================== 新增API方法 =====================
 
@@ -584,78 +2290,81 @@ class APIManager:
 
     # ===================== 新增API方法结束 =====================
 
-    def get_full_content(self, book_id: str) -> Optional[Union[str, Dict[str, str]]]:
-        """获取整本小说内容，支持多节点自动切换
+    def _race_full_download_nodes(self, nodes: List[str], fan_out: int, try_node,
+                                  external_cancelled, progress_callback=None):
+        """同时向最多 fan_out 个节点发起整本下载，取第一个有效结果并中止其余请求
 
-        返回：
-        - dict: 批量模式返回的 {item_id: content}（最可靠，可与目录按 item_id 精准对齐）
-        - str: 文本模式返回的整本内容（兼容旧接口/节点）
+        某个节点失败后立即补上排在后面的节点，保持在途数量不超过 fan_out。
+        进度回调只上报当前接收最多的那个响应。
         """
-        max_retries = max(1, int(CONFIG.get("max_retries", 3) or 3))
-        api_sources = CONFIG.get("api_sources", [])
+        stop = threading.Event()
+        progress_lock = threading.Lock()
+        received_by_node: Dict[str, Tuple[int, Optional[int]]] = {}
 
-        def _extract_bulk_map(payload) -> Optional[Dict[str, str]]:
-            if not isinstance(payload, dict):
-                return None
-            nested = payload.get('data')
-            if not isinstance(nested, dict):
-                return None
+        def is_cancelled() -> bool:
+            return stop.is_set() or external_cancelled()
 
-            keys = list(nested.keys())
-            if not keys:
+        def make_progress(node: str):
+            if not progress_callback:
                 return None
 
-            sample = keys[:min(5, len(keys))]
-            if not all(str(k).isdigit() for k in sample):
+            def node_progress(received: int, total: Optional[int]):
+                with progress_lock:
+                    received_by_node[node] = (received, total)
+                    best = max(received_by_node.values(), key=lambda item: item[0])
+                progress_callback(*best)
+            return node_progress
+
+        def run_safely(node: str):
+            try:
+                return try_node(node, is_cancelled, make_progress(node))
+            except Exception:
                 return None
+            finally:
+                with progress_lock:
+                    received_by_node.pop(node, None)
 
-            result: Dict[str, str] = {}
-            for k, v in nested.items():
-                item_id = str(k)
-                content = None
-                if isinstance(v, str):
-                    content = v
-                elif isinstance(v, dict):
-                    content = (
-                        v.get("content")
-                        or v.get("text")
-                        or v.get("raw")
-                        or v.get("raw_text")
-                        or ""
-                    )
-                if isinstance(content, str) and content.strip():
-                    result[item_id] = content
-
-            return result or None
-
-        def _extract_text(payload) -> Optional[str]:
-            if isinstance(payload, str):
-                return payload
-            if isinstance(payload, dict):
-                nested = payload.get('data')
-                if isinstance(nested, str):
-                    return nested
-                if isinstance(nested, dict):
-                    for key in ("content", "text", "raw", "raw_text", "full_text"):
-                        val = nested.get(key)
-                        if isinstance(val, str):
-                            return val
-                for key in ("content", "text", "raw", "raw_text", "full_text"):
-                    val = payload.get(key)
-                    if isinstance(val, str):
-                        return val
+        with print_lock:
+            print(f"[DEBUG] 并发整本下载，同时尝试 {min(fan_out, len(nodes))} 个节点")
+        # 使用守护线程：落败的请求可能阻塞在读取上，不应拖住进程退出
+        results = queue.Queue()
+        pending_nodes = deque(nodes)
+        running = 0
+        try:
+            while pending_nodes or running:
+                while pending_nodes and running < fan_out and not is_cancelled():
+                    node = pending_nodes.popleft()
+                    threading.Thread(
+                        target=lambda n=node: results.put(run_safely(n)),
+                        name="full-download", daemon=True,
+                    ).start()
+                    running += 1
+                if not running:
+                    break
+                result = results.get()
+                running -= 1
+                if result:
+                    return result
             return None
+        finally:
+            stop.set()
 
-        endpoint = self.endpoints.get('content')
-        if not endpoint:
-            return None
+    def full_download_nodes(self, verbose: bool = True) -> List[str]:
+        """支持整本下载的候选节点，按运行时健康度排序
+
+        优先当前 base_url，跳过配置为不支持整本下载、启动探测失败以及熔断中的节点。
+        """
+        api_sources = CONFIG.get("api_sources", [])
 
         # 尝试导入节点缓存（web_app模块可能未加载）
         try:
-            from web_app import PROBED_NODES_CACHE
+            from web_app import PROBED_NODES_CACHE, get_full_download_nodes
         except ImportError:
             PROBED_NODES_CACHE = {}
 
+            def get_full_download_nodes() -> list:
+                return []
+
         def _is_node_available(url: str) -> bool:
             """检查节点是否可用（启动时探测通过）"""
             url = (url or "").strip().rstrip('/')
@@ -690,16 +2399,66 @@ class APIManager:
             if base and base not in urls_to_try:
                 # 跳过不支持整本下载的节点
                 if not supports_full:
-                    with print_lock:
-                        print(f"[DEBUG] 跳过不支持整本下载的节点: {base}")
+                    if verbose:
+                        with print_lock:
+                            print(f"[DEBUG] 跳过不支持整本下载的节点: {base}")
                     continue
                 # 跳过启动时探测失败的节点
                 if not _is_node_available(base):
-                    with print_lock:
-                        print(f"[DEBUG] 跳过不可用节点: {base}")
+                    if verbose:
+                        with print_lock:
+                            print(f"[DEBUG] 跳过不可用节点: {base}")
                     continue
                 urls_to_try.append(base)
 
+        # 启动探测确认支持整本下载、但未出现在配置中的节点
+        for base in get_full_download_nodes():
+            base = (base or "").strip().rstrip('/')
+            if base and base not in urls_to_try:
+                urls_to_try.append(base)
+
+        # 按运行时健康度排序，跳过熔断中的节点
+        open_nodes = [u for u in urls_to_try if self.health.is_open(u)]
+        if open_nodes and verbose:
+            with print_lock:
+                print(f"[DEBUG] 跳过熔断中的节点: {', '.join(open_nodes)}")
+        return self.health.rank([u for u in urls_to_try if u not in open_nodes])
+
+    def get_full_content(self, book_id: str, cancel_event: Optional[threading.Event] = None,
+                         progress_callback=None, chapter_transform=None) -> Optional[Union[str, Dict[str, str]]]:
+        """获取整本小说内容，支持多节点自动切换
+
+        Args:
+            book_id: 书籍ID
+            cancel_event: 取消标志，置位后在下一个数据块或下一次尝试前放弃下载并返回 None
+            progress_callback: 接收进度回调 progress_callback(received_bytes, total_bytes)，
+                total_bytes 未知时为 None；每次新的响应从 0 开始计数
+            chapter_transform: 批量模式下对每章正文的处理函数（如 process_chapter_content），
+                在下载过程中逐章调用，返回的字典中保存处理后的正文
+
+        响应体落盘到状态目录：批量 JSON 边下载边增量解析（见 BulkJsonStreamParser），
+        文本模式下载完成后通过 mmap 直接解码，不在内存中保留多份原始数据。
+        连接中断时按 HTTP Range 续传；接收完整的内容按 book_id 保留，直到 clear_status 清除。
+
+        返回：
+        - dict: 批量模式返回的 {item_id: content}（最可靠，可与目录按 item_id 精准对齐）
+        - str: 文本模式返回的整本内容（兼容旧接口/节点）
+        """
+        max_retries = max(1, int(CONFIG.get("max_retries", 3) or 3))
+
+        endpoint = self.endpoints.get('content')
+        if not endpoint:
+            return None
+
+        # 上次已完整接收但后续处理中断的整本下载，直接复用
+        cached = load_completed_bulk(book_id, chapter_transform)
+        if cached:
+            with print_lock:
+                print(f"[DEBUG] 使用已完成的整本下载文件: {book_id}")
+            return cached
+
+        urls_to_try = self.full_download_nodes()
+
         if not urls_to_try:
             with print_lock:
                 print("[DEBUG] 没有可用的支持整本下载的节点")
@@ -714,7 +2473,6 @@ class APIManager:
         headers = get_headers()
         headers['Connection'] = 'close'
 
-        session = self._get_session()
         connect_timeout = 10
         read_timeout = max(120, int((CONFIG.get("request_timeout", 30) or 30) * 10))
         timeout = (connect_timeout, read_timeout)
@@ -726,90 +2484,149 @@ class APIManager:
             requests.exceptions.ContentDecodingError,
         )
 
-        for base_url in urls_to_try:
+        def _try_node(base_url: str, is_cancelled, node_progress) -> Optional[Union[str, Dict[str, str]]]:
+            """在单个节点上依次尝试各下载模式，返回有效内容或 None
+
+            响应体落盘到按书籍/节点/模式区分的文件，连接中断后若节点支持 Range，
+            重试时从已接收的字节处续传，已落盘部分重新喂给解析器即可。
+            """
             url = f"{base_url}{endpoint}"
+            # 多节点赛跑时每个节点在各自线程中下载，按线程取各自的会话
+            session = self._get_session()
 
             for mode in download_modes:
+                part_path = _get_bulk_part_path(book_id, base_url, mode['tab'])
                 for attempt in range(max_retries):
+                    if is_cancelled():
+                        return None
+                    offset = _bulk_resume_offset(part_path)
+                    part_meta = _read_bulk_meta(part_path) if offset else {}
+                    request_headers = headers
+                    if offset:
+                        request_headers = dict(headers)
+                        request_headers['Range'] = f"bytes={offset}-"
+                        if part_meta.get('validator'):
+                            request_headers['If-Range'] = part_meta['validator']
+                    request_start = time.monotonic()
+                    first_byte_at = None
                     try:
                         with print_lock:
                             print(
                                 f"[DEBUG] 尝试节点 {base_url}, 模式 tab={mode.get('tab')} "
                                 f"({attempt + 1}/{max_retries})"
+                                + (f"，从 {offset} 字节处续传" if offset else "")
                             )
 
                         with session.get(
                             url,
                             params=mode,
-                            headers=headers,
+                            headers=request_headers,
                             timeout=timeout,
                             stream=True,
                         ) as response:
                             status_code = response.status_code
-                            resp_headers = dict(response.headers)
-                            resp_encoding = response.encoding
+                            # 416：续传位置已在末尾，说明上次其实已经接收完整
+                            already_complete = status_code == 416 and offset > 0
+                            resumed = already_complete or (
+                                status_code == 206 and offset > 0
+                                and _content_range_start(response.headers.get('Content-Range')) == offset
+                            )
 
                             if status_code == 400:
                                 # 该节点不支持此模式，尝试下一个模式
                                 break
-                            if status_code != 200:
-                                # 429/5xx 交给会话重试；这里额外做少量退避
+                            if status_code == 206 and not resumed:
+                                # 返回的区间与本地文件对不上，丢弃后从头下载
+                                _discard_bulk_file(part_path)
+                                continue
+                            if status_code != 200 and not resumed:
+                                # 5xx 已由会话重试，429 不由会话重试；这里额外做少量退避
                                 if status_code in (429, 500, 502, 503, 504) and attempt < max_retries - 1:
                                     time.sleep(min(2 ** attempt, 10))
                                     continue
+                                if status_code == 429 or status_code >= 500:
+                                    self.health.record(base_url, False, throttled=status_code == 429)
                                 break
 
-                            raw_buf = bytearray()
-                            for chunk in response.iter_content(chunk_size=131072):
-                                if chunk:
-                                    raw_buf.extend(chunk)
-                            raw_content = bytes(raw_buf)
-
-                        if len(raw_content) < 1000:
-                            break
-
-                        content_type = (resp_headers.get('content-type') or '').lower()
-                        is_json_like = 'application/json' in content_type or raw_content[:1] in (b'{', b'[')
-
-                        if is_json_like:
-                            try:
-                                data = json.loads(raw_content.decode('utf-8', errors='ignore'))
-                            except Exception:
-                                data = None
-
-                            if not data:
-                                if attempt < max_retries - 1:
-                                    time.sleep(min(2 ** attempt, 10))
-                                    continue
-                                break
-
-                            bulk_map = _extract_bulk_map(data)
-                            if bulk_map:
-                                with print_lock:
-                                    print(f"[DEBUG] 急速下载成功，节点: {base_url}, 模式: tab={mode.get('tab')}")
-                                return bulk_map
-
-                            text_from_json = _extract_text(data)
-                            if text_from_json and len(text_from_json) > 1000:
-                                with print_lock:
-                                    print(f"[DEBUG] 急速下载成功，节点: {base_url}, 模式: tab={mode.get('tab')}")
-                                return text_from_json
+                            if not resumed:
+                                offset = 0
+                            length = response.headers.get('Content-Length')
+                            length = int(length) if length and length.isdigit() else None
+                            if already_complete:
+                                total_bytes = offset
+                            elif length is not None:
+                                total_bytes = offset + length
+                            else:
+                                total_bytes = part_meta.get('total') if resumed else None
+                            if not resumed:
+                                accept_ranges = (response.headers.get('Accept-Ranges') or '').lower() == 'bytes'
+                                part_meta = {
+                                    'node': base_url,
+                                    'tab': mode['tab'],
+                                    'accept_ranges': accept_ranges,
+                                    'validator': response.headers.get('ETag') or response.headers.get('Last-Modified'),
+                                    'content_type': response.headers.get('Content-Type') or '',
+                                    'encoding': response.encoding,
+                                    'total': total_bytes,
+                                }
 
+                            reader = _BulkPayloadReader(part_meta.get('content_type'), part_meta.get('encoding'),
+                                                        chapter_transform)
+                            received = offset
+                            with open(part_path, 'ab' if resumed else 'wb') as spool:
+                                if not resumed:
+                                    _write_bulk_meta(part_path, part_meta)
+                                else:
+                                    # 已落盘的部分先交给解析器，再继续接收剩余数据
+                                    with open(part_path, 'rb') as existing:
+                                        for chunk in iter(lambda: existing.read(131072), b''):
+                                            reader.feed(chunk)
+                                if node_progress:
+                                    node_progress(received, total_bytes)
+                                if not already_complete:
+                                    for chunk in response.iter_content(chunk_size=131072):
+                                        if is_cancelled():
+                                            return None
+                                        if not chunk:
+                                            continue
+                                        if first_byte_at is None:
+                                            first_byte_at = time.monotonic()
+                                        spool.write(chunk)
+                                        received += len(chunk)
+                                        reader.feed(chunk)
+                                        if node_progress:
+                                            node_progress(received, total_bytes)
+
+                        if received < 1000:
+                            _discard_bulk_file(part_path)
                             break
 
-                        encoding = resp_encoding or 'utf-8'
-                        text = raw_content.decode(encoding, errors='replace')
-                        if len(text) > 1000:
+                        content, retryable = reader.finish(part_path)
+                        if content:
+                            if first_byte_at is not None:
+                                transfer_time = time.monotonic() - first_byte_at
+                                self.health.record_bulk(
+                                    base_url, first_byte_at - request_start,
+                                    (received - offset) / transfer_time if transfer_time > 0.05 else None,
+                                )
+                            _store_completed_bulk(book_id, part_path, part_meta)
                             with print_lock:
                                 print(f"[DEBUG] 急速下载成功，节点: {base_url}, 模式: tab={mode.get('tab')}")
-                            return text
+                            self.health.record(base_url, True)
+                            return content
 
+                        _discard_bulk_file(part_path)
+                        if retryable and attempt < max_retries - 1:
+                            time.sleep(min(2 ** attempt, 10))
+                            continue
                         break
 
                     except transient_errors as e:
+                        # 已接收的数据保留在落盘文件中，节点支持 Range 时下次重试从断点续传
                         if attempt < max_retries - 1:
                             time.sleep(min(2 ** attempt, 10))
                             continue
+                        self.health.record(base_url, False)
                         with print_lock:
                             print(
                                 f"[DEBUG] 节点 {base_url} 下载失败: {type(e).__name__}，"
@@ -819,6 +2636,23 @@ class APIManager:
                         with print_lock:
                             print(f"[DEBUG] 节点 {base_url} 异常: {type(e).__name__}")
                         break
+            return None
+
+
+        def _external_cancelled() -> bool:
+            return cancel_event is not None and cancel_event.is_set()
+
+        fan_out = max(1, int(CONFIG.get("full_download_concurrency", 2) or 1))
+        if fan_out == 1 or len(urls_to_try) == 1:
+            for base_url in urls_to_try:
+                result = _try_node(base_url, _external_cancelled, progress_callback)
+                if result or _external_cancelled():
+                    return result
+        else:
+            result = self._race_full_download_nodes(urls_to_try, fan_out, _try_node,
+                                                    _external_cancelled, progress_callback)
+            if result or _external_cancelled():
+                return result
 
         with print_lock:
             print(t("dl_full_content_error", "所有节点均失败"))
@@ -842,80 +2676,191 @@ def _extract_title_core(title: str) -> str:
     return s.strip()
 
 
+class _CoreTitleAutomaton:
+    """Aho-Corasick 多模式匹配：单次扫描文本，找出每个核心标题第一次出现的位置"""
+
+    def __init__(self, patterns):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[str]] = [[]]
+        for pattern in patterns:
+            state = 0
+            for ch in pattern:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append(pattern)
+        # 按层序构建失败指针，并把失败状态的输出合并进来
+        level = deque(self._goto[0].values())
+        while level:
+            state = level.popleft()
+            for ch, nxt in self._goto[state].items():
+                level.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def first_occurrences(self, text: str, total: int) -> Dict[str, int]:
+        """返回 {模式: 第一次出现的起始位置}，全部找到后提前结束"""
+        goto, fail, out = self._goto, self._fail, self._out
+        found: Dict[str, int] = {}
+        state = 0
+        for pos, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                for pattern in out[state]:
+                    if pattern not in found:
+                        found[pattern] = pos - len(pattern) + 1
+                if len(found) >= total:
+                    break
+        return found
+
+
+def _find_first_occurrences(text: str, patterns) -> Dict[str, int]:
+    """查找每个模式在文本中第一次出现的位置（找不到的不返回）
+
+    模式较少时逐个 str.find（C 实现，每个模式扫描一遍）更快，较多时用 Aho-Corasick 只扫描一遍。
+    """
+    patterns = set(patterns)
+    if len(patterns) < _AHO_CORASICK_MIN_PATTERNS:
+        found = {}
+        for pattern in patterns:
+            pos = text.find(pattern)
+            if pos >= 0:
+                found[pattern] = pos
+        return found
+    return _CoreTitleAutomaton(patterns).first_occurrences(text, len(patterns))
+
+
+# 实测 8M 字文本上约 600 个模式时两者耗时相当（纯 Python 自动机每字符开销较大）
+_AHO_CORASICK_MIN_PATTERNS = 512
+
+
+def _find_title_by_regex(title: str, text: str) -> Optional[tuple]:
+    """逐个标题正则查找（标题含换行、首尾空白等少见情况使用），返回标题行 (start, end) 或 None"""
+    # 1. 精确匹配
+    match = re.search(r'^[ \t]*' + re.escape(title) + r'[ \t]*$', text, re.MULTILINE)
+    if match:
+        return (match.start(), match.end())
+
+    # 2. 模糊匹配：提取标题核心部分
+    title_core = _extract_title_core(title)
+    if title_core and len(title_core) >= 2:
+        # 匹配包含核心标题的行
+        match = re.search(r'^[^\n]*' + re.escape(title_core) + r'[^\n]*$', text, re.MULTILINE)
+        if match:
+            return (match.start(), match.end())
+
+    return None
+
+
 def parse_novel_text_with_catalog(text: str, catalog: List[Dict]) -> List[Dict]:
     """使用目录接口的章节标题来分割整本小说内容
-    
+
+    单次扫描建立候选标题行索引：先按去掉首尾空格/制表符的整行做哈希查找（精确匹配），
+    未命中的标题再取核心部分，查找第一次出现的位置所在的行（模糊匹配），最后按偏移量切分正文。
+    结果与逐个标题用正则全文查找一致。
+
     Args:
         text: 整本小说的纯文本内容
         catalog: 目录接口返回的章节列表 [{'title': '...', 'id': '...', 'index': ...}, ...]
-    
+
     Returns:
         带内容的章节列表 [{'title': '...', 'id': '...', 'index': ..., 'content': '...'}, ...]
     """
     if not catalog:
         return []
-    
-    def escape_for_regex(s: str) -> str:
-        return re.escape(s)
-    
-    def find_title_in_text(title: str, search_text: str, start_offset: int = 0) -> Optional[tuple]:
-        """在文本中查找标题，返回 (match_start, match_end) 或 None"""
-        # 1. 精确匹配
-        pattern = re.compile(r'^[ \t]*' + escape_for_regex(title) + r'[ \t]*$', re.MULTILINE)
-        match = pattern.search(search_text)
-        if match:
-            return (start_offset + match.start(), start_offset + match.end())
-        
-        # 2. 模糊匹配：提取标题核心部分
-        title_core = _extract_title_core(title)
-        if title_core and len(title_core) >= 2:
-            # 匹配包含核心标题的行
-            pattern = re.compile(r'^[^\n]*' + escape_for_regex(title_core) + r'[^\n]*$', re.MULTILINE)
-            match = pattern.search(search_text)
-            if match:
-                return (start_offset + match.start(), start_offset + match.end())
-        
-        return None
-    
+
+    text_len = len(text)
+    # 标题不含换行且首尾没有空格/制表符时可以直接按整行查表，其余走正则
+    simple = [isinstance(ch['title'], str) and ch['title'] and '\n' not in ch['title']
+              and ch['title'] == ch['title'].strip(' \t') for ch in catalog]
+    max_title_len = max((len(ch['title']) for ch, ok in zip(catalog, simple) if ok), default=0)
+
+    # 1. 精确匹配：只索引长度不超过最长标题的行，每个内容只记第一次出现的行
+    line_index: Dict[str, Tuple[int, int]] = {}
+    if max_title_len:
+        pos = 0
+        while pos <= text_len:
+            end = text.find('\n', pos)
+            if end < 0:
+                end = text_len
+            if end - pos <= max_title_len or text[pos] in ' \t' or text[end - 1] in ' \t':
+                key = text[pos:end].strip(' \t')
+                if key and len(key) <= max_title_len and key not in line_index:
+                    line_index[key] = (pos, end)
+            pos = end + 1
+
+    found: List[Optional[tuple]] = [None] * len(catalog)
+    fuzzy: Dict[int, str] = {}
+    for i, ch in enumerate(catalog):
+        if not simple[i]:
+            found[i] = _find_title_by_regex(ch['title'], text)
+            continue
+        found[i] = line_index.get(ch['title'])
+        if found[i] is None:
+            title_core = _extract_title_core(ch['title'])
+            if title_core and len(title_core) >= 2:
+                fuzzy[i] = title_core
+
+    # 2. 模糊匹配：核心标题第一次出现的位置所在的行
+    if fuzzy:
+        occurrences = _find_first_occurrences(text, fuzzy.values())
+        for i, title_core in fuzzy.items():
+            pos = occurrences.get(title_core)
+            if pos is not None:
+                end = text.find('\n', pos + len(title_core))
+                found[i] = (text.rfind('\n', 0, pos) + 1, text_len if end < 0 else end)
+
     # 查找每个章节标题在文本中的位置
     chapter_positions = []
-    for ch in catalog:
-        title = ch['title']
-        result = find_title_in_text(title, text)
+    for ch, result in zip(catalog, found):
         if result:
             chapter_positions.append({
-                'title': title,
+                'title': ch['title'],
                 'id': ch.get('id', ''),
                 'index': ch['index'],
                 'line_start': result[0],  # 标题行开始位置
                 'start': result[1]        # 内容开始位置（标题行之后）
             })
-    
+
     if not chapter_positions:
         return []
-    
+
     # 按位置排序
     chapter_positions.sort(key=lambda x: x['line_start'])
-    
-    # 提取每章内容
+
+    # 按偏移量提取每章内容（先跳过首尾空白再切片，每章只复制一次）
     chapters = []
     for i, pos in enumerate(chapter_positions):
         if i + 1 < len(chapter_positions):
             end = chapter_positions[i + 1]['line_start']
         else:
-            end = len(text)
-        
-        content = text[pos['start']:end].strip()
+            end = text_len
+        start = pos['start']
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
         chapters.append({
             'title': pos['title'],
             'id': pos['id'],
             'index': pos['index'],
-            'content': content
+            'content': text[start:end] if start < end else ''
         })
-    
+
     # 按原始目录顺序重新排序
     chapters.sort(key=lambda x: x['index'])
-    
+
     return chapters
 
 
@@ -1021,11 +2966,36 @@ def generate_filename(book_name: str, author_name: str, extension: str) -> str:
         return f"{safe_book_name}.{ext}"
 
 
+# process_chapter_content 的预编译表：<br>/<p ...>/</p> 转为换行，其余标签删除（区分大小写，与逐步替换流程一致）
+_BLOCK_TAG_RE = re.compile(r'<(?:br\s*/?|p[^<>]*|/p)>')
+_INLINE_TAG_RE = re.compile(r'<[^<>]+>')
+# 不规则的 '<'：之后到 '>' 之前又出现 '<'、没有 '>' 闭合，或是空标签 <>
+_IRREGULAR_TAG_RE = re.compile(r'<(?:[^>]*<|[^>]*\Z|>)')
+_SPACE_RUN_RE = re.compile(r'[ \t]{2,}|\t')
+
+
 def process_chapter_content(content):
-    """处理章节内容"""
+    """处理章节内容
+
+    <br>/<p> 转为换行、删除其余标签、合并空格与制表符，每个非空行作为一个段落，段落之间空一行。
+    正文中的 '<' 都属于简单标签时，标签各用一个预编译正则扫描一遍，分行、去空白与拼接在 C 层完成；
+    否则（不成对的 '<'、标签跨越其他 '<' 等）按逐步替换的流程处理，两者结果一致。
+    """
     if not content:
         return ""
-    
+
+    if '<' in content:
+        if _IRREGULAR_TAG_RE.search(content):
+            return _process_chapter_content_stepwise(content)
+        content = _INLINE_TAG_RE.sub('', _BLOCK_TAG_RE.sub('\n', content))
+
+    if '\t' in content or '  ' in content:
+        content = _SPACE_RUN_RE.sub(' ', content)
+    return '\n\n'.join(filter(None, map(str.strip, content.split('\n'))))
+
+
+def _process_chapter_content_stepwise(content):
+    """逐步替换的章节处理流程（含不规则 '<' 时使用）"""
     # 将br标签和p标签替换为换行符
     content = re.sub(r'<br\s*/?>\s*', '\n', content)
     content = re.sub(r'<p[^>]*>\s*', '\n', content)
@@ -1075,18 +3045,268 @@ def _get_content_file_path(book_id: str) -> str:
     return os.path.join(status_dir, filename)
 
 
+# 整本下载落盘文件的保留时间（秒），超过后不再续传或复用
+_BULK_SPOOL_MAX_AGE = 24 * 3600
+
+
+def _get_bulk_part_path(book_id: str, base_url: str, tab: str) -> str:
+    """获取整本下载未完成文件路径（按书籍、节点与下载模式区分）"""
+    status_dir = _get_state_dir()
+    digest = hashlib.md5(f"{base_url}|{tab}".encode('utf-8')).hexdigest()[:10]
+    return os.path.join(status_dir, f".bulk_{book_id}_{digest}.part")
+
+
+def _get_bulk_done_path(book_id: str) -> str:
+    """获取已完成的整本下载文件路径"""
+    status_dir = _get_state_dir()
+    return os.path.join(status_dir, f".bulk_{book_id}.done")
+
+
+def _read_bulk_meta(path: str) -> dict:
+    try:
+        with open(path + '.json', 'r', encoding='utf-8') as f:
+            data = json.load(f)
+            return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+
+def _write_bulk_meta(path: str, meta: dict):
+    try:
+        with open(path + '.json', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+    except Exception:
+        pass
+
+
+def _discard_bulk_file(path: str):
+    for p in (path, path + '.json'):
+        try:
+            if os.path.exists(p):
+                os.remove(p)
+        except Exception:
+            pass
+
+
+def _bulk_resume_offset(part_path: str) -> int:
+    """可续传的字节偏移：节点声明支持 Range 且文件未过期时为已接收的字节数，否则为 0"""
+    try:
+        if not os.path.exists(part_path):
+            return 0
+        if time.time() - os.path.getmtime(part_path) > _BULK_SPOOL_MAX_AGE:
+            _discard_bulk_file(part_path)
+            return 0
+        if not _read_bulk_meta(part_path).get('accept_ranges'):
+            return 0
+        return os.path.getsize(part_path)
+    except Exception:
+        return 0
+
+
+def _content_range_start(content_range: Optional[str]) -> Optional[int]:
+    """解析 Content-Range 头（如 "bytes 100-199/200"）的起始偏移"""
+    match = re.match(r'\s*bytes\s+(\d+)-', content_range or '')
+    return int(match.group(1)) if match else None
+
+
+def _store_completed_bulk(book_id: str, part_path: str, meta: dict):
+    """把接收完整并校验通过的整本下载保存为该书的完成文件，供崩溃后重跑直接复用"""
+    done_path = _get_bulk_done_path(book_id)
+    try:
+        os.replace(part_path, done_path)
+        _write_bulk_meta(done_path, {**meta, 'completed_at': time.time()})
+        _discard_bulk_file(part_path)
+    except Exception:
+        pass
+
+
+def load_completed_bulk(book_id: str, chapter_transform=None) -> Optional[Union[str, Dict[str, str]]]:
+    """读取已完成的整本下载（未过期时），不存在或无法解析时返回 None"""
+    done_path = _get_bulk_done_path(book_id)
+    try:
+        if not os.path.exists(done_path):
+            return None
+        if time.time() - os.path.getmtime(done_path) > _BULK_SPOOL_MAX_AGE:
+            _discard_bulk_file(done_path)
+            return None
+        meta = _read_bulk_meta(done_path)
+        reader = _BulkPayloadReader(meta.get('content_type'), meta.get('encoding'), chapter_transform)
+        with open(done_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(131072), b''):
+                reader.feed(chunk)
+        content, _retryable = reader.finish(done_path)
+        if content is None:
+            _discard_bulk_file(done_path)
+        return content
+    except Exception:
+        return None
+
+
+def clear_bulk_spool(book_id: str):
+    """清除该书的整本下载落盘文件（包括未完成的续传文件）"""
+    status_dir = _get_state_dir()
+    prefix = f".bulk_{book_id}"
+    try:
+        for name in os.listdir(status_dir):
+            if name == f"{prefix}.done" or name == f"{prefix}.done.json" or name.startswith(f"{prefix}_"):
+                os.remove(os.path.join(status_dir, name))
+    except Exception:
+        pass
+
+
+def _get_journal_path(book_id: str) -> str:
+    """获取章节日志路径（追加写入的 JSONL，每行一章）"""
+    status_dir = _get_state_dir()
+    return os.path.join(status_dir, f".download_journal_{book_id}.jsonl")
+
+
+class ChapterJournal:
+    """按书籍的章节预写日志
+
+    每处理完一章立即追加一行 {"i": 序号, "id": 章节ID, "t": 标题, "c": 正文}，
+    启用压缩时正文以 zlib+base64 存入 "z"。写入只进缓冲区，由后台线程按
+    fsync_interval 批量刷盘，崩溃或被强制结束时最多丢失最后一个间隔内的章节。
+    结束时对重复记录做压实。读取见 load_journal。
+    """
+
+    def __init__(self, book_id: str, compress: Optional[bool] = None, fsync_interval: Optional[float] = None):
+        self.path = _get_journal_path(book_id)
+        self.compress = bool(CONFIG.get("journal_compress", False)) if compress is None else compress
+        interval = CONFIG.get("journal_fsync_interval", 1.0) if fsync_interval is None else fsync_interval
+        self.fsync_interval = max(0.05, float(interval or 1.0))
+        self._lock = threading.Lock()
+        self._file = open(self.path, 'ab')
+        self._dirty = False
+        self._records = 0
+        self._ids = set()
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+
+    def record(self, index: int, item_id: str, title: str, content: str):
+        """追加一章（线程安全）"""
+        entry = {"i": int(index), "id": str(item_id), "t": title}
+        if self.compress:
+            entry["z"] = base64.b64encode(zlib.compress(content.encode('utf-8'))).decode('ascii')
+        else:
+            entry["c"] = content
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode('utf-8')
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line)
+            self._dirty = True
+            self._records += 1
+            self._ids.add(str(item_id))
+
+    def _sync_locked(self):
+        if self._file is not None and self._dirty:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._dirty = False
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.fsync_interval):
+            try:
+                with self._lock:
+                    self._sync_locked()
+            except OSError:
+                pass
+
+    def close(self, compact: bool = True):
+        """刷盘并关闭；compact 为真且存在重复记录时重写为每章一条"""
+        self._closed.set()
+        with self._lock:
+            if self._file is None:
+                return
+            try:
+                self._sync_locked()
+            except OSError:
+                pass
+            self._file.close()
+            self._file = None
+            duplicated = self._records > len(self._ids)
+        if compact and duplicated:
+            compact_journal(self.path)
+
+
+_JOURNAL_ID_RE = re.compile(rb'"id": "(\d+)"')
+
+
+def _iter_journal(path: str):
+    """逐行读取章节日志，跳过损坏的行（如崩溃时写了一半的最后一行）"""
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        return
+    with f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                if "z" in entry:
+                    entry["c"] = zlib.decompress(base64.b64decode(entry.pop("z"))).decode('utf-8')
+                if isinstance(entry.get("c"), str) and entry.get("id"):
+                    yield entry
+            except (ValueError, zlib.error, UnicodeDecodeError):
+                continue
+
+
+def load_journal(book_id: str) -> Dict[str, Dict]:
+    """单次流式读取章节日志，返回 {item_id: {'index', 'title', 'content'}}，同一章以最后一条为准"""
+    records: Dict[str, Dict] = {}
+    for entry in _iter_journal(_get_journal_path(book_id)):
+        records[entry["id"]] = {'index': entry.get("i"), 'title': entry.get("t", ""), 'content': entry["c"]}
+    return records
+
+
+def compact_journal(path: str):
+    """压实章节日志：每章只保留最后一条记录，写入临时文件后原子替换
+
+    第一遍只记录每章最后一条记录的行号，第二遍按行号复制，不在内存中保留正文。
+    """
+    try:
+        last_line: Dict[str, int] = {}
+        with open(path, 'rb') as f:
+            for lineno, line in enumerate(f):
+                match = _JOURNAL_ID_RE.search(line)
+                if match and line.endswith(b"\n"):
+                    last_line[match.group(1).decode('ascii')] = lineno
+        keep = set(last_line.values())
+        tmp_path = path + '.tmp'
+        with open(path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            for lineno, line in enumerate(src):
+                if lineno in keep:
+                    dst.write(line)
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
 def load_status(book_id: str):
-    """加载下载状态（从临时目录读取）"""
+    """加载下载状态（从临时目录读取，包括章节日志中已记录的章节）"""
+    downloaded = set()
     status_file = _get_status_file_path(book_id)
     if os.path.exists(status_file):
         try:
             with open(status_file, 'r', encoding='utf-8') as f:
                 data = json.load(f)
                 if isinstance(data, list):
-                    return set(data)
+                    downloaded = set(data)
         except:
             pass
-    return set()
+    journal_path = _get_journal_path(book_id)
+    if os.path.exists(journal_path):
+        try:
+            with open(journal_path, 'rb') as f:
+                for line in f:
+                    match = _JOURNAL_ID_RE.search(line)
+                    if match and line.endswith(b"\n"):
+                        downloaded.add(match.group(1).decode('ascii'))
+        except OSError:
+            pass
+    return downloaded
 
 
 def load_saved_content(book_id: str) -> dict:
@@ -1098,6 +3318,8 @@ def load_saved_content(book_id: str) -> dict:
     Returns:
         dict: 已保存的章节内容 {index: {'title': ..., 'content': ...}}
     """
+    saved = {}
+    # 兼容旧版本一次性保存的内容文件
     content_file = _get_content_file_path(book_id)
     if os.path.exists(content_file):
         try:
@@ -1105,50 +3327,27 @@ def load_saved_content(book_id: str) -> dict:
                 data = json.load(f)
                 if isinstance(data, dict):
                     # 将字符串键转换为整数键
-                    return {int(k): v for k, v in data.items()}
+                    saved = {int(k): v for k, v in data.items()}
         except:
             pass
-    return {}
-
-
-def save_status(book_id: str, downloaded_ids):
-    """保存下载状态（保存到临时目录）"""
-    status_file = _get_status_file_path(book_id)
-    try:
-        with open(status_file, 'w', encoding='utf-8') as f:
-            json.dump(list(downloaded_ids), f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        with print_lock:
-            print(t("dl_save_status_fail", str(e)))
-
-
-def save_content(book_id: str, chapter_results: dict):
-    """保存已下载的章节内容
-    
-    Args:
-        book_id: 书籍ID
-        chapter_results: 章节内容 {index: {'title': ..., 'content': ...}}
-    """
-    content_file = _get_content_file_path(book_id)
-    try:
-        with open(content_file, 'w', encoding='utf-8') as f:
-            json.dump(chapter_results, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        with print_lock:
-            print(f"保存章节内容失败: {str(e)}")
+    for record in load_journal(book_id).values():
+        if record['index'] is not None:
+            saved[int(record['index'])] = {'title': record['title'], 'content': record['content']}
+    return saved
 
 
 def clear_status(book_id: str):
     """清除下载状态（下载完成后调用）"""
     status_file = _get_status_file_path(book_id)
     content_file = _get_content_file_path(book_id)
+    journal_file = _get_journal_path(book_id)
     try:
-        if os.path.exists(status_file):
-            os.remove(status_file)
-        if os.path.exists(content_file):
-            os.remove(content_file)
+        for path in (status_file, content_file, journal_file):
+            if os.path.exists(path):
+                os.remove(path)
     except:
         pass
+    clear_bulk_spool(book_id)
 
 
 def has_saved_state(book_id: str) -> bool:
@@ -1162,266 +3361,1593 @@ def has_saved_state(book_id: str) -> bool:
     """
     status_file = _get_status_file_path(book_id)
     content_file = _get_content_file_path(book_id)
-    return os.path.exists(status_file) or os.path.exists(content_file)
+    return (os.path.exists(status_file) or os.path.exists(content_file)
+            or os.path.exists(_get_journal_path(book_id)))
+
+
+# ===================== 临时状态目录管理 =====================
+
+_STATE_FILE_RE = re.compile(r'^\.(?:download_(?:status|content|journal)|bulk|active)_(\d+)')
+
 
+def _get_state_dir() -> str:
+    """临时状态目录（断点续传状态、章节日志、整本下载落盘文件）"""
+    status_dir = os.path.join(tempfile.gettempdir(), 'fanqie_novel_downloader')
+    os.makedirs(status_dir, exist_ok=True)
+    return status_dir
+
+
+def _pid_alive(pid: int) -> Optional[bool]:
+    """检查进程是否存活，无法判断时返回 None（Windows 上 os.kill 会结束进程，不能用来探测）"""
+    if os.name == 'nt':
+        return None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
 
-def analyze_download_completeness(chapter_results: dict, expected_chapters: list = None, log_func=None) -> dict:
+
+class StateStore:
+    """临时状态目录的容量管理
+
+    按书籍汇总状态文件的大小与最后修改时间，超出磁盘预算（state_budget_mb）时
+    按最久未修改的顺序淘汰整本书的状态，超过 state_max_age_days 的状态直接清除。
+    正在下载的书籍通过 active() 标记（同进程计数 + 带进程号的标记文件，
+    供其他进程识别），永远不会被淘汰；最近 ACTIVE_GRACE 秒内有写入的书也视为活跃。
     """
-    分析下载完整性
-    
+
+    ACTIVE_GRACE = 600
+    STALE_MARKER_AGE = 24 * 3600  # 无法判断进程是否存活时，标记文件的有效期
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or _get_state_dir()
+        self._lock = threading.Lock()
+        self._active: Dict[str, int] = {}
+
+    def _marker_path(self, book_id: str) -> str:
+        return os.path.join(self.directory, f".active_{book_id}.{os.getpid()}")
+
+    def acquire(self, book_id: str):
+        """标记书籍正在下载"""
+        book_id = str(book_id)
+        with self._lock:
+            self._active[book_id] = self._active.get(book_id, 0) + 1
+            if self._active[book_id] == 1:
+                try:
+                    with open(self._marker_path(book_id), 'w') as f:
+                        f.write(str(os.getpid()))
+                except OSError:
+                    pass
+
+    def release(self, book_id: str):
+        book_id = str(book_id)
+        with self._lock:
+            count = self._active.get(book_id, 0) - 1
+            if count > 0:
+                self._active[book_id] = count
+                return
+            self._active.pop(book_id, None)
+            try:
+                os.remove(self._marker_path(book_id))
+            except OSError:
+                pass
+
+    @contextmanager
+    def active(self, book_id: str):
+        """下载期间保护该书的状态不被淘汰"""
+        self.acquire(book_id)
+        try:
+            yield
+        finally:
+            self.release(book_id)
+
+    def _scan(self) -> Dict[str, Dict]:
+        """按书籍汇总状态文件 {book_id: {'bytes', 'files', 'last_modified', 'active'}}"""
+        books: Dict[str, Dict] = {}
+        now = time.time()
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            return books
+        for entry in entries:
+            match = _STATE_FILE_RE.match(entry.name)
+            if not match or not entry.is_file():
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            book = books.setdefault(match.group(1), {'bytes': 0, 'files': [], 'last_modified': 0.0, 'active': False})
+            if entry.name.startswith('.active_'):
+                # 其他进程的下载标记：进程仍在运行（或无法判断且标记未过期）时视为活跃
+                try:
+                    pid = int(entry.name.rsplit('.', 1)[1])
+                except ValueError:
+                    pid = 0
+                alive = _pid_alive(pid) if pid else False
+                if alive or (alive is None and now - stat.st_mtime < self.STALE_MARKER_AGE):
+                    book['active'] = True
+                else:
+                    book['files'].append(entry.path)
+                continue
+            book['bytes'] += stat.st_size
+            book['files'].append(entry.path)
+            book['last_modified'] = max(book['last_modified'], stat.st_mtime)
+        with self._lock:
+            active = set(self._active)
+        for book_id, book in books.items():
+            if book_id in active or now - book['last_modified'] < self.ACTIVE_GRACE:
+                book['active'] = True
+        return books
+
+    def usage(self) -> Dict:
+        """目录占用情况，书籍按最后修改时间倒序"""
+        books = self._scan()
+        return {
+            'directory': self.directory,
+            'total_bytes': sum(b['bytes'] for b in books.values()),
+            'budget_bytes': self.budget_bytes(),
+            'max_age_days': self.max_age() / 86400,
+            'books': sorted(
+                ({'book_id': book_id, 'bytes': b['bytes'], 'files': len(b['files']),
+                  'last_modified': b['last_modified'], 'active': b['active']}
+                 for book_id, b in books.items()),
+                key=lambda x: x['last_modified'], reverse=True),
+        }
+
+    @staticmethod
+    def budget_bytes() -> int:
+        return int(float(CONFIG.get("state_budget_mb", 1024) or 0) * 1024 * 1024)
+
+    @staticmethod
+    def max_age() -> float:
+        return float(CONFIG.get("state_max_age_days", 7) or 0) * 86400
+
+    def gc(self, budget_bytes: Optional[int] = None, max_age: Optional[float] = None) -> Dict:
+        """清理过期状态并把总大小压到预算以内，返回 {'removed': [book_id], 'freed_bytes', 'total_bytes'}"""
+        budget_bytes = self.budget_bytes() if budget_bytes is None else budget_bytes
+        max_age = self.max_age() if max_age is None else max_age
+        books = self._scan()
+        total = sum(b['bytes'] for b in books.values())
+        now = time.time()
+        removed, freed = [], 0
+        # 最久未修改的优先淘汰
+        for book_id, book in sorted(books.items(), key=lambda kv: kv[1]['last_modified']):
+            if book['active']:
+                continue
+            expired = max_age > 0 and now - book['last_modified'] > max_age
+            over_budget = budget_bytes > 0 and total > budget_bytes
+            if not expired and not over_budget:
+                continue
+            for path in book['files']:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            removed.append(book_id)
+            freed += book['bytes']
+            total -= book['bytes']
+        return {'removed': removed, 'freed_bytes': freed, 'total_bytes': total}
+
+
+_state_store: Optional[StateStore] = None
+_state_store_lock = threading.Lock()
+
+
+def get_state_store() -> StateStore:
+    """获取临时状态目录管理器单例"""
+    global _state_store
+    if _state_store is None:
+        with _state_store_lock:
+            if _state_store is None:
+                _state_store = StateStore()
+    return _state_store
+
+
+# ===================== 增量更新（下载清单） =====================
+
+def _get_manifest_path(book_id: str, file_format: str) -> str:
+    """获取下载清单路径（与章节缓存保存在同一持久目录，按书籍与格式区分）"""
+    manifest_dir = os.path.join(_get_persistent_dir(), 'fanqie_novel_downloader_manifests')
+    os.makedirs(manifest_dir, exist_ok=True)
+    return os.path.join(manifest_dir, f"{book_id}_{file_format}.json")
+
+
+def load_manifest(book_id: str, file_format: str) -> Optional[dict]:
+    """读取上次下载的清单，不存在时返回 None
+
+    清单结构: {'book_id', 'file_format', 'output_file', 'output_size',
+               'chapters': [[item_id, title], ...], 'updated'}
+    """
+    try:
+        with open(_get_manifest_path(book_id, file_format), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, dict) and isinstance(data.get('chapters'), list):
+            return data
+    except Exception:
+        pass
+    return None
+
+
+def save_manifest(book_id: str, file_format: str, output_file: str, chapters: List[Dict]):
+    """记录本次写入文件的章节（按文件中的顺序），供下次增量更新比对"""
+    manifest = {
+        'book_id': str(book_id),
+        'file_format': file_format,
+        'output_file': output_file,
+        'output_size': os.path.getsize(output_file) if os.path.exists(output_file) else 0,
+        'chapters': [[ch['id'], ch['title']] for ch in chapters],
+        'updated': time.time(),
+    }
+    path = _get_manifest_path(book_id, file_format)
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except Exception:
+        pass
+
+
+def _history_manifest(record: Optional[dict], file_format: str, chapters: List[Dict]) -> Optional[dict]:
+    """没有下载清单时，根据下载历史记录推断上次下载的内容
+
+    历史记录只保存了章节数，假定上次下载包含当前目录的前 chapter_count 章。
+    记录中的 file_exists 可能已过时，文件不存在时返回 None。
+    """
+    if not record or record.get('file_format') != file_format or not record.get('file_exists'):
+        return None
+    try:
+        count = int(record.get('chapter_count') or 0)
+    except (TypeError, ValueError):
+        return None
+    if count <= 0 or count > len(chapters):
+        return None
+    output_file = record.get('save_path', '')
+    try:
+        output_size = os.path.getsize(output_file)
+    except OSError:
+        return None
+    return {
+        'output_file': output_file,
+        'output_size': output_size,
+        'chapters': [[ch['id'], ch['title']] for ch in chapters[:count]],
+    }
+
+
+def plan_incremental_update(book_id: str, file_format: str, chapters: List[Dict],
+                            history_record: Optional[dict] = None) -> dict:
+    """比对当前目录与上次下载的内容，决定增量更新方式
+
+    Args:
+        history_record: 调用方提供的下载历史记录（如 Web 端的下载历史），没有下载清单时据此推断上次下载的内容
+
+    Returns:
+        {'mode': 'full' | 'up_to_date' | 'append' | 'rebuild',
+         'new': 新增章节, 'changed': 标题变化的章节, 'removed': 已删除的章节ID,
+         'previous': 上次写入的章节 [{'id', 'title'}], 'output_file': 上次的输出文件}
+        - full: 没有上次下载的记录，按完整下载处理
+        - up_to_date: 没有新增或变化的章节
+        - append: 新增章节都在末尾且文件未被改动，TXT 直接在文件末尾追加
+        - rebuild: 其余情况（EPUB、章节变化、文件被改动等），由章节缓存重建整个文件
+    """
+    manifest = load_manifest(book_id, file_format) or _history_manifest(history_record, file_format, chapters)
+    if not manifest:
+        return {'mode': 'full', 'new': list(chapters), 'changed': [], 'removed': [],
+                'previous': [], 'output_file': None}
+
+    previous = [{'id': str(item[0]), 'title': item[1]} for item in manifest['chapters']
+                if isinstance(item, (list, tuple)) and len(item) >= 2]
+    previous_titles = {ch['id']: ch['title'] for ch in previous}
+    current_ids = {ch['id'] for ch in chapters}
+    new = [ch for ch in chapters if ch['id'] not in previous_titles]
+    changed = [ch for ch in chapters if ch['id'] in previous_titles and previous_titles[ch['id']] != ch['title']]
+    removed = [ch['id'] for ch in previous if ch['id'] not in current_ids]
+
+    output_file = manifest.get('output_file') or ''
+    result = {'new': new, 'changed': changed, 'removed': removed,
+              'previous': previous, 'output_file': output_file}
+    if not os.path.exists(output_file):
+        result['mode'] = 'rebuild'
+    elif not new and not changed and not removed:
+        result['mode'] = 'up_to_date'
+    elif (file_format == 'txt' and not changed and not removed
+          and [ch['id'] for ch in chapters[:len(previous)]] == [ch['id'] for ch in previous]
+          and os.path.getsize(output_file) == manifest.get('output_size')):
+        result['mode'] = 'append'
+    else:
+        result['mode'] = 'rebuild'
+    return result
+
+
+def analyze_download_completeness(chapter_results: dict, expected_chapters: list = None, log_func=None,
+                                  validator: Optional['ChapterOrderValidator'] = None) -> dict:
+    """
+    分析下载完整性
+    
+    Args:
+        chapter_results: 已下载的章节结果 {index: {'title': ..., 'content': ...}}，或已下载章节索引的集合
+        expected_chapters: 期望的章节目录（Catalog 或 [{'id': ..., 'title': ..., 'index': ...}]）
+        log_func: 日志输出函数
+        validator: 复用已按期望章节建好的验证器，为空时按 expected_chapters 新建
+    
+    Returns:
+        分析结果字典:
+        - total_expected: 期望总章节数
+        - total_downloaded: 已下载章节数
+        - missing_indices: 缺失的章节索引列表
+        - order_correct: 顺序是否正确
+        - completeness_percent: 完整度百分比
+    """
+    def log(msg, progress=-1):
+        if log_func:
+            log_func(msg, progress)
+        else:
+            print(msg)
+    
+    result = {
+        'total_expected': 0,
+        'total_downloaded': len(chapter_results),
+        'missing_indices': [],
+        'order_correct': True,
+        'completeness_percent': 100.0
+    }
+    
+    if not chapter_results:
+        log(t("dl_analyze_no_chapters"))
+        result['completeness_percent'] = 0
+        return result
+    
+    # 缺失与间隙都来自一次线性扫描（见 ChapterOrderValidator.analyze）
+    if validator is None:
+        validator = ChapterOrderValidator(expected_chapters or [])
+    report = validator.analyze(chapter_results)
+    
+    # 如果有期望的章节列表，进行完整性比对
+    if expected_chapters:
+        missing_indices = report['expected_missing']
+        result['total_expected'] = report['expected_total']
+        result['missing_indices'] = missing_indices
+        
+        if missing_indices:
+            missing_count = len(missing_indices)
+            log(t("dl_analyze_summary", report['expected_total'], len(chapter_results), missing_count))
+            
+            # 显示部分缺失章节信息
+            if missing_count <= 10:
+                missing_titles = [f"{t('dl_chapter_title', index + 1)}: {validator.catalog.by_index(index).title}"
+                                  for index in missing_indices]
+                log(t("dl_analyze_missing", ', '.join(missing_titles[:5])))
+        else:
+            log(t("dl_analyze_pass", report['expected_total']))
+    else:
+        # 没有期望列表，使用已下载内容分析
+        result['total_expected'] = len(chapter_results)
+        
+        # 检查索引是否连续
+        missing_in_range = report['sequential']['missing_indices']
+        if missing_in_range:
+            result['missing_indices'] = missing_in_range
+            log(t("dl_analyze_gap", missing_in_range[:10]))
+    
+    # 验证章节顺序（已下载章节的索引应连续）
+    order_issues = report['validation']['out_of_order']
+    if order_issues:
+        result['order_correct'] = False
+        total_gaps = report['sequential']['missing_count']
+        log(t("dl_analyze_order_fail", len(order_issues), total_gaps))
+    else:
+        log(t("dl_analyze_order_pass"))
+    
+    # 计算完整度
+    if result['total_expected'] > 0:
+        result['completeness_percent'] = (result['total_downloaded'] / result['total_expected']) * 100
+    
+    return result
+
+
+def download_cover(cover_url, headers):
+    """下载封面图片"""
+    if not cover_url:
+        return None, None, None
+    
+    try:
+        response = requests.get(cover_url, headers=headers, timeout=15)
+        if response.status_code != 200:
+            return None, None, None
+        
+        content_type = response.headers.get('content-type', '')
+        content_bytes = response.content
+        
+        if len(content_bytes) < 1000:
+            return None, None, None
+        
+        if 'jpeg' in content_type or 'jpg' in content_type:
+            file_ext, mime_type = '.jpg', 'image/jpeg'
+        elif 'png' in content_type:
+            file_ext, mime_type = '.png', 'image/png'
+        elif 'webp' in content_type:
+            file_ext, mime_type = '.webp', 'image/webp'
+        else:
+            file_ext, mime_type = '.jpg', 'image/jpeg'
+        
+        return content_bytes, file_ext, mime_type
+        
+    except Exception as e:
+        with print_lock:
+            print(t("dl_cover_fail", str(e)))
+        return None, None, None
+
+
+class _OrderedChapterWriter:
+    """按章节顺序写出文件的基类
+
+    章节可以乱序到达：某章之前的所有章节都已写入时立即写出，否则暂存在重排缓冲区，
+    内存中只保留乱序窗口内的章节。子类实现 _write_chapter / _flush / _commit / _discard。
+    """
+
+    def __init__(self, path: str, indices=()):
+        """
+        Args:
+            path: 最终文件路径
+            indices: 本次需要写入的章节序号（决定写入顺序）
+        """
+        self.path = path
+        self.part_path = path + '.part'
+        self._order = sorted(set(indices))
+        self._expected = set(self._order)
+        self._pos = 0
+        self._pending: Dict[int, Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self._committed = False
+        self.written: List[int] = []
+
+    @property
+    def buffered(self) -> int:
+        """重排缓冲区中等待前序章节的章节数"""
+        return len(self._pending)
+
+    def _write_chapter(self, index: int, title: str, content: str):
+        raise NotImplementedError
+
+    def _flush(self):
+        pass
+
+    def _commit(self):
+        raise NotImplementedError
+
+    def _discard(self):
+        raise NotImplementedError
+
+    def _write(self, index: int, title: str, content: str):
+        self._write_chapter(index, title, content)
+        self.written.append(index)
+
+    def add(self, index: int, title: str, content: str):
+        """加入一章（线程安全），重复或不在本次范围内的章节会被忽略"""
+        with self._lock:
+            if self._closed or index not in self._expected or index in self._pending:
+                return
+            if self._pos >= len(self._order) or index < self._order[self._pos]:
+                return  # 已写入
+            self._pending[index] = (title, content)
+            wrote = False
+            while self._pos < len(self._order) and self._order[self._pos] in self._pending:
+                idx = self._order[self._pos]
+                self._write(idx, *self._pending.pop(idx))
+                self._pos += 1
+                wrote = True
+            if wrote:
+                self._flush()
+
+    def finish(self) -> str:
+        """写出缓冲区中剩余的章节（跳过缺失的章节）并生成目标文件"""
+        with self._lock:
+            for idx in sorted(self._pending):
+                self._write(idx, *self._pending[idx])
+            self._pending.clear()
+            self._pos = len(self._order)
+            self._closed = True
+            self._commit()
+            self._committed = True
+        return self.path
+
+    def abort(self):
+        """放弃写入：删除未完成的 .part"""
+        with self._lock:
+            if self._committed:
+                return
+            self._closed = True
+            self._committed = True
+            try:
+                self._discard()
+            except Exception:
+                pass
+            try:
+                os.remove(self.part_path)
+            except OSError:
+                pass
+
+
+class StreamingTxtWriter(_OrderedChapterWriter):
+    """边下载边按顺序写入 TXT
+
+    内容先写入 .part，完成后原子重命名为目标文件，下载过程中 .part 即可阅读；
+    追加模式（增量更新）完成后才把 .part 接到已有文件末尾，中途失败不会改动原文件。
+    """
+
+    def __init__(self, txt_path: str, name: str = '', author_name: str = '', description: str = '',
+                 indices=(), append: bool = False):
+        """
+        Args:
+            txt_path: 最终文件路径
+            indices: 本次需要写入的章节序号（决定写入顺序）
+            append: 追加到已有文件末尾（不写文件头）
+        """
+        super().__init__(txt_path, indices)
+        self.append = append
+        self._file = open(self.part_path, 'w', encoding='utf-8')
+        if not append:
+            self._file.write(f"{name}\n")
+            if author_name:
+                self._file.write(f"{t('label_author')}{author_name}\n")
+            if description:
+                self._file.write(f"\n{t('dl_intro_title')}:\n{description}\n")
+            self._file.write("\n" + "="*50 + "\n\n")
+            self._file.flush()
+
+    def _write_chapter(self, index: int, title: str, content: str):
+        self._file.write(f"\n{title}\n\n")
+        self._file.write(f"{content}\n\n")
+
+    def _flush(self):
+        self._file.flush()
+
+    def _commit(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        if self.append:
+            with open(self.part_path, 'rb') as src, open(self.path, 'ab') as dst:
+                shutil.copyfileobj(src, dst)
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.remove(self.part_path)
+        else:
+            os.replace(self.part_path, self.path)
+
+    def _discard(self):
+        self._file.close()
+
+
+_XHTML_HEAD = ("<?xml version='1.0' encoding='utf-8'?>\n<!DOCTYPE html>\n"
+               '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" '
+               'epub:prefix="z3998: http://www.daisy.org/z3998/2012/vocab/structure/#" '
+               'lang="zh-CN" xml:lang="zh-CN">\n')
+
+
+def _xhtml_page(title: str, body: str) -> str:
+    """生成 EPUB 内容页（XHTML）"""
+    return f"{_XHTML_HEAD}  <head>\n    <title>{_xml_escape(title)}</title>\n  </head>\n  <body>\n{body}  </body>\n</html>\n"
+
+
+_XML_INVALID_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _xml_escape(text, quote: bool = False) -> str:
+    """转义 XML 文本/属性值，并去掉 XML 1.0 不允许的控制字符"""
+    text = _XML_INVALID_RE.sub('', str(text or ''))
+    return html.escape(text, quote=quote)
+
+
+class StreamingEpubWriter(_OrderedChapterWriter):
+    """边下载边按顺序写入 EPUB 3
+
+    不经过 ebooklib：章节 XHTML 按顺序直接写入 zip（.part），OPF、NCX 与导航页在结束时
+    根据已写入章节的标题生成，完成后原子重命名。内存中只保留标题列表、乱序窗口和当前分组。
+    目录结构、文件名与 ebooklib 生成的一致（EPUB/chapter_N.xhtml 等）。
+    """
+
+    def __init__(self, epub_path: str, name: str, author_name: str = '', description: str = '',
+                 cover_url: str = '', indices=(), chapters_per_file: Optional[int] = None,
+                 compress_level: Optional[int] = None):
+        """
+        Args:
+            epub_path: 最终文件路径
+            indices: 本次需要写入的章节序号（决定写入顺序）
+            chapters_per_file: 每个 XHTML 文件包含的章节数，为空时读取配置 epub_chapters_per_file
+            compress_level: zip 压缩级别 0-9，为空时读取配置 epub_compress_level
+        """
+        super().__init__(epub_path, indices)
+        if chapters_per_file is None:
+            chapters_per_file = CONFIG.get("epub_chapters_per_file", 1)
+        if compress_level is None:
+            compress_level = CONFIG.get("epub_compress_level", 6)
+        self.chapters_per_file = max(1, int(chapters_per_file or 1))
+        self.compress_level = min(9, max(0, int(compress_level)))
+        self.name = name
+        self.author_name = author_name
+        self.description = description
+        self.cover_url = cover_url
+        self.identifier = f'fanqie_{int(time.time())}'
+        self._toc: List[Tuple[str, str]] = []  # (href, 标题)
+        self._group: List[str] = []
+        self._group_title = ''
+        self._files = 0
+
+        self._zip = zipfile.ZipFile(self.part_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=self.compress_level)
+        # mimetype 必须是第一个且不压缩的条目
+        self._zip.writestr(zipfile.ZipInfo('mimetype'), 'application/epub+zip', compress_type=zipfile.ZIP_STORED)
+        self._zip.writestr('META-INF/container.xml',
+                           '<?xml version="1.0" encoding="utf-8"?>\n'
+                           '<container xmlns="urn:oasis:names:tc:opendocument:xmlns:container" version="1.0">\n'
+                           '  <rootfiles>\n'
+                           '    <rootfile media-type="application/oebps-package+xml" full-path="EPUB/content.opf"/>\n'
+                           '  </rootfiles>\n'
+                           '</container>\n')
+        self._write_intro()
+
+    def _write_intro(self):
+        # 书籍信息页（简介页）
+        body = f"    <h1>{_xml_escape(self.name)}</h1>\n"
+        if self.author_name:
+            body += f"    <p><strong>作者：</strong> {_xml_escape(self.author_name)}</p>\n"
+        if self.description:
+            body += f"    <hr/>\n    <h3>{_xml_escape(t('dl_intro_title'))}</h3>\n"
+            for line in self.description.split('\n'):
+                if line.strip():
+                    body += f"    <p>{_xml_escape(line.strip())}</p>\n"
+        title = t('dl_book_detail_title')
+        self._zip.writestr('EPUB/intro.xhtml', _xhtml_page(title, body))
+        self._toc.append(('intro.xhtml', title))
+
+    def _write_chapter(self, index: int, title: str, content: str):
+        number = len(self._toc)  # 简介页占第 0 项，章节从 1 开始
+        title = title or f'第{number}章'
+        href = f'chapter_{self._files + 1}.xhtml'
+        if self.chapters_per_file > 1:
+            href += f'#c{number}'
+            heading = f'    <h1 id="c{number}">{_xml_escape(title)}</h1>\n'
+        else:
+            heading = f'    <h1>{_xml_escape(title)}</h1>\n'
+        # 将空行分隔的段落转换为HTML段落标签
+        paragraphs = content.split('\n\n') if content else []
+        html_paragraphs = ''.join(f'      <p>{_xml_escape(p.strip())}</p>\n' for p in paragraphs if p.strip())
+        if not self._group:
+            self._group_title = title
+        self._group.append(f'{heading}    <div>\n{html_paragraphs}    </div>\n')
+        self._toc.append((href, title))
+        if len(self._group) >= self.chapters_per_file:
+            self._flush_group()
+
+    def _flush_group(self):
+        if not self._group:
+            return
+        self._files += 1
+        self._zip.writestr(f'EPUB/chapter_{self._files}.xhtml', _xhtml_page(self._group_title, ''.join(self._group)))
+        self._group = []
+
+    def _write_cover(self) -> Optional[Tuple[str, str]]:
+        if not self.cover_url:
+            return None
+        try:
+            cover_content, file_ext, mime_type = download_cover(self.cover_url, get_headers())
+        except Exception as e:
+            with print_lock:
+                print(t("dl_cover_add_fail", str(e)))
+            return None
+        if not (cover_content and file_ext and mime_type):
+            return None
+        href = f'cover{file_ext}'
+        self._zip.writestr(f'EPUB/{href}', cover_content)
+        self._zip.writestr('EPUB/cover.xhtml', _xhtml_page('Cover', f'    <img src="{href}" alt="Cover"/>\n'))
+        return href, mime_type
+
+    def _write_package(self, cover: Optional[Tuple[str, str]]):
+        name = _xml_escape(self.name)
+        metadata = [
+            f'    <meta property="dcterms:modified">{time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}</meta>',
+            f'    <dc:identifier id="id">{self.identifier}</dc:identifier>',
+            f'    <dc:title>{name}</dc:title>',
+            '    <dc:language>zh-CN</dc:language>',
+        ]
+        if self.author_name:
+            metadata.append(f'    <dc:creator id="creator">{_xml_escape(self.author_name)}</dc:creator>')
+        if self.description:
+            metadata.append(f'    <dc:description>{_xml_escape(self.description)}</dc:description>')
+        manifest = []
+        if cover:
+            metadata.append('    <meta name="cover" content="cover-img"/>')
+            manifest.append(f'    <item href="{cover[0]}" id="cover-img" media-type="{cover[1]}" properties="cover-image"/>')
+            manifest.append('    <item href="cover.xhtml" id="cover" media-type="application/xhtml+xml"/>')
+        manifest.append('    <item href="intro.xhtml" id="chapter_0" media-type="application/xhtml+xml"/>')
+        manifest.extend(f'    <item href="chapter_{i}.xhtml" id="chapter_{i}" media-type="application/xhtml+xml"/>'
+                        for i in range(1, self._files + 1))
+        manifest.append('    <item href="toc.ncx" id="ncx" media-type="application/x-dtbncx+xml"/>')
+        manifest.append('    <item href="nav.xhtml" id="nav" media-type="application/xhtml+xml" properties="nav"/>')
+        spine = ['    <itemref idref="nav"/>']
+        if cover:
+            # 封面页放在阅读顺序最前，从 spine 起点打开的阅读器也会先显示封面
+            spine.insert(0, '    <itemref idref="cover"/>')
+        spine.extend(f'    <itemref idref="chapter_{i}"/>' for i in range(self._files + 1))
+        self._zip.writestr('EPUB/content.opf', (
+            "<?xml version='1.0' encoding='utf-8'?>\n"
+            '<package xmlns="http://www.idpf.org/2007/opf" unique-identifier="id" version="3.0" '
+            'prefix="rendition: http://www.idpf.org/vocab/rendition/#">\n'
+            '  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:opf="http://www.idpf.org/2007/opf">\n'
+            + '\n'.join(metadata) + '\n  </metadata>\n  <manifest>\n'
+            + '\n'.join(manifest) + '\n  </manifest>\n  <spine toc="ncx">\n'
+            + '\n'.join(spine) + '\n  </spine>\n</package>\n'))
+
+        nav_points = ''.join(
+            f'    <navPoint id="chapter_{i}">\n      <navLabel>\n        <text>{_xml_escape(title)}</text>\n'
+            f'      </navLabel>\n      <content src="{href}"/>\n    </navPoint>\n'
+            for i, (href, title) in enumerate(self._toc))
+        self._zip.writestr('EPUB/toc.ncx', (
+            "<?xml version='1.0' encoding='utf-8'?>\n"
+            '<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">\n  <head>\n'
+            f'    <meta content="{self.identifier}" name="dtb:uid"/>\n'
+            '    <meta content="0" name="dtb:depth"/>\n'
+            '    <meta content="0" name="dtb:totalPageCount"/>\n'
+            '    <meta content="0" name="dtb:maxPageNumber"/>\n'
+            f'  </head>\n  <docTitle>\n    <text>{name}</text>\n  </docTitle>\n'
+            f'  <navMap>\n{nav_points}  </navMap>\n</ncx>\n'))
+
+        nav_items = ''.join(f'          <li>\n            <a href="{href}">{_xml_escape(title)}</a>\n          </li>\n'
+                            for href, title in self._toc)
+        self._zip.writestr('EPUB/nav.xhtml', (
+            "<?xml version='1.0' encoding='utf-8'?>\n<!DOCTYPE html>\n"
+            '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" '
+            'lang="zh-CN" xml:lang="zh-CN">\n'
+            f'  <head>\n    <title>{name}</title>\n  </head>\n  <body>\n'
+            f'    <nav epub:type="toc" id="id" role="doc-toc">\n      <h2>{name}</h2>\n'
+            f'      <ol>\n{nav_items}      </ol>\n    </nav>\n  </body>\n</html>\n'))
+
+    def _commit(self):
+        self._flush_group()
+        self._write_package(self._write_cover())
+        self._zip.close()
+        os.replace(self.part_path, self.path)
+
+    def _discard(self):
+        self._zip.close()
+
+
+def create_epub(name, author_name, description, cover_url, chapters, save_path):
+    """创建EPUB文件"""
+    # 使用新的文件命名逻辑
+    filename = generate_filename(name, author_name, 'epub')
+    epub_path = os.path.join(save_path, filename)
+
+    writer = StreamingEpubWriter(epub_path, name, author_name, description, cover_url, range(len(chapters)))
+    for i, ch_data in enumerate(chapters):
+        writer.add(i, ch_data.get('title', f'第{i + 1}章'), ch_data.get('content', ''))
+    return writer.finish()
+
+
+def create_txt(name, author_name, description, chapters, save_path):
+    """创建TXT文件"""
+    # 使用新的文件命名逻辑
+    filename = generate_filename(name, author_name, 'txt')
+    txt_path = os.path.join(save_path, filename)
+
+    writer = StreamingTxtWriter(txt_path, name, author_name, description, range(len(chapters)))
+    for i, ch_data in enumerate(chapters):
+        writer.add(i, ch_data.get('title', ''), ch_data.get('content', ''))
+    return writer.finish()
+
+
+OUTPUT_FORMATS = ('txt', 'epub')
+
+
+def parse_formats(file_format) -> List[str]:
+    """解析输出格式：支持 'txt'、'txt,epub' 或列表，去重并保持顺序，忽略无效格式，默认 ['txt']"""
+    items = file_format.split(',') if isinstance(file_format, str) else list(file_format or [])
+    formats = []
+    for item in items:
+        fmt = str(item).strip().lower()
+        if fmt in OUTPUT_FORMATS and fmt not in formats:
+            formats.append(fmt)
+    return formats or ['txt']
+
+
+class ChapterWriterPool:
+    """把处理好的章节分发给多个写入器，一次下载同时生成多种格式
+
+    每个写入器由写入线程池中的一个线程独占消费自己的队列，格式之间并发写入，
+    XHTML 生成、压缩与写盘也不占用下载回调线程；队列有上限，写入跟不上时反压下载。
+    """
+
+    QUEUE_SIZE = 256
+    _FINISH = object()
+    _ABORT = object()
+
+    def __init__(self, writers: Dict[str, _OrderedChapterWriter]):
+        """
+        Args:
+            writers: {格式: 写入器}
+        """
+        self.writers = writers
+        self.outputs: Dict[str, str] = {}
+        self._errors: Dict[str, Exception] = {}
+        self._queues = {fmt: queue.Queue(maxsize=self.QUEUE_SIZE) for fmt in writers}
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(writers)))
+        self._futures = [self._executor.submit(self._consume, fmt) for fmt in writers]
+        self._closed = False
+
+    def _consume(self, fmt: str):
+        writer = self.writers[fmt]
+        q = self._queues[fmt]
+        while True:
+            item = q.get()
+            if item is self._FINISH or item is self._ABORT:
+                if item is self._ABORT or fmt in self._errors:
+                    writer.abort()
+                    return
+                try:
+                    self.outputs[fmt] = writer.finish()
+                except Exception as e:
+                    self._errors[fmt] = e
+                    writer.abort()
+                return
+            if fmt in self._errors:
+                continue  # 出错后继续取走队列中的章节，避免阻塞下载
+            try:
+                writer.add(*item)
+            except Exception as e:
+                self._errors[fmt] = e
+
+    def add(self, index: int, title: str, content: str):
+        """把一章分发给所有写入器"""
+        for q in self._queues.values():
+            q.put((index, title, content))
+
+    def _close(self, signal_item):
+        if self._closed:
+            return
+        self._closed = True
+        for q in self._queues.values():
+            q.put(signal_item)
+        wait(self._futures)
+        self._executor.shutdown(wait=False)
+
+    def finish(self) -> Dict[str, str]:
+        """等所有章节写入后并发生成各格式的最终文件，返回 {格式: 文件路径}"""
+        self._close(self._FINISH)
+        if self._errors:
+            fmt, error = next(iter(self._errors.items()))
+            raise RuntimeError(f"生成 {fmt.upper()} 文件失败: {error}") from error
+        return {fmt: self.outputs[fmt] for fmt in self.writers}
+
+    def abort(self):
+        """放弃写入，删除所有未完成的文件"""
+        self._close(self._ABORT)
+
+
+# ===================== 章节处理流水线 =====================
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+_process_pool_failed = False
+
+
+def _process_chapter_batch(raws: List[str]) -> List[str]:
+    """在进程池中批量处理章节正文（模块级函数，便于子进程按名称导入）"""
+    return [process_chapter_content(raw) for raw in raws]
+
+
+def _process_pool_workers() -> int:
+    """章节处理进程数：配置 process_pool_workers，0 表示使用全部 CPU 核心"""
+    workers = int(CONFIG.get("process_pool_workers", 0) or 0)
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+def get_process_pool() -> Optional[ProcessPoolExecutor]:
+    """获取章节处理进程池单例，单核或平台不支持多进程时返回 None
+
+    进程数见 _process_pool_workers。
+    """
+    global _process_pool, _process_pool_failed
+    if _process_pool is None and not _process_pool_failed:
+        with _process_pool_lock:
+            if _process_pool is None and not _process_pool_failed:
+                workers = _process_pool_workers()
+                if workers <= 1:
+                    _process_pool_failed = True
+                    return None
+                try:
+                    _process_pool = ProcessPoolExecutor(max_workers=workers)
+                    atexit.register(_process_pool.shutdown, wait=False, cancel_futures=True)
+                except (ImportError, OSError, NotImplementedError, ValueError) as e:
+                    # 部分平台（如 Android/Termux）缺少进程间信号量
+                    _process_pool_failed = True
+                    with print_lock:
+                        print(f"章节处理进程池不可用，将在线程内处理: {e}")
+    return _process_pool
+
+
+def _discard_process_pool(pool: ProcessPoolExecutor):
+    """丢弃已崩溃的进程池，下次调用 get_process_pool 时重新创建"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is pool:
+            _process_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+class ChapterPipeline:
+    """下载 → 正文处理 → 写入 的分阶段流水线
+
+    下载线程只把原始正文放入有界队列；分批线程把排队的章节按批交给进程池执行
+    process_chapter_content，多核并行且不占用下载线程的 GIL；交付线程按提交顺序
+    取回结果并调用 sink（写入器、章节日志与进度），写入器再按章节顺序落盘。
+    输入队列与在途批次都有上限，处理或写入跟不上时反压下载，内存占用保持平稳。
+    进程池不可用或中途崩溃时改为在交付线程内处理。
+    """
+
+    QUEUE_SIZE = 256
+    _END = object()
+
+    def __init__(self, sink, batch_size: Optional[int] = None, executor: Optional[ProcessPoolExecutor] = None,
+                 workers: Optional[int] = None):
+        """
+        Args:
+            sink: 默认的交付回调 sink(ch, content)，在交付线程中依次调用
+            batch_size: 每批交给进程池的章节数，为空时读取配置 process_batch_size
+            executor: 处理正文的进程池，为空时使用 get_process_pool()
+            workers: executor 的进程数，决定在途批次上限，为空时与 get_process_pool() 读取同一配置
+        """
+        self.sink = sink
+        self.batch_size = max(1, int(batch_size or CONFIG.get("process_batch_size", 64) or 64))
+        self._executor = executor if executor is not None else get_process_pool()
+        if self._executor is None:
+            workers = 1
+        elif not workers:
+            workers = _process_pool_workers()
+        self._in_flight = threading.Semaphore(max(2, workers * 2))
+        self._input = queue.Queue(maxsize=self.QUEUE_SIZE)
+        self._results = queue.Queue()
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._error: Optional[Exception] = None
+        self._aborted = False
+        self._closed = False
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._deliverer = threading.Thread(target=self._deliver, daemon=True)
+        self._dispatcher.start()
+        self._deliverer.start()
+
+    def submit(self, ch: Dict, raw: str, sink=None):
+        """提交一章原始正文，处理完成后以 sink(ch, content) 交付；队列满时阻塞调用方
+
+        队列满时会阻塞，不要在事件循环线程中直接调用（异步引擎的回调在默认线程池中执行）。
+        """
+        with self._cond:
+            self._pending += 1
+        self._input.put((ch, raw, sink or self.sink))
+
+    def _dispatch(self):
+        end = False
+        while not end:
+            item = self._input.get()
+            if item is self._END:
+                break
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._input.get_nowait()
+                except queue.Empty:
+                    break
+                if item is self._END:
+                    end = True
+                    break
+                batch.append(item)
+            self._in_flight.acquire()
+            future = None
+            executor = self._executor
+            if executor is not None and not self._aborted:
+                try:
+                    future = executor.submit(_process_chapter_batch, [raw for _, raw, _ in batch])
+                except (BrokenProcessPool, RuntimeError):
+                    self._executor = None
+                    _discard_process_pool(executor)
+            self._results.put((batch, future))
+        self._results.put(self._END)
+
+    def _deliver(self):
+        while True:
+            item = self._results.get()
+            if item is self._END:
+                return
+            batch, future = item
+            try:
+                if self._aborted or self._error is not None:
+                    if future is not None:
+                        future.cancel()
+                    continue
+                processed = None
+                if future is not None:
+                    try:
+                        processed = future.result()
+                    except BrokenProcessPool:
+                        executor, self._executor = self._executor, None
+                        if executor is not None:
+                            _discard_process_pool(executor)
+                if processed is None:
+                    processed = _process_chapter_batch([raw for _, raw, _ in batch])
+                for (ch, _, sink), content in zip(batch, processed):
+                    if self._aborted:
+                        break
+                    sink(ch, content)
+            except Exception as e:
+                self._error = e
+            finally:
+                self._in_flight.release()
+                with self._cond:
+                    self._pending -= len(batch)
+                    self._cond.notify_all()
+
+    def drain(self):
+        """等待已提交的章节全部交付；交付过程中出错时抛出异常"""
+        with self._cond:
+            while self._pending > 0:
+                self._cond.wait()
+        if self._error is not None:
+            raise self._error
+
+    def _stop(self):
+        if not self._closed:
+            self._closed = True
+            self._input.put(self._END)
+            self._dispatcher.join()
+            self._deliverer.join()
+
+    def close(self):
+        """交付剩余章节并结束流水线线程"""
+        self._stop()
+        self.drain()
+
+    def abort(self):
+        """放弃尚未交付的章节并结束流水线线程"""
+        self._aborted = True
+        self._stop()
+
+
+# ===================== 章节下载引擎 =====================
+
+DOWNLOAD_ENGINES = ('thread', 'async')
+
+
+def _resolve_download_engine(engine: Optional[str] = None) -> str:
+    """解析下载引擎：显式参数优先，其次读取配置 download_engine，默认线程池"""
+    value = str(engine or CONFIG.get("download_engine", "thread") or "thread").strip().lower()
+    return value if value in DOWNLOAD_ENGINES else 'thread'
+
+
+class MultiNodeScheduler:
+    """多节点章节调度器
+
+    按节点健康度登记表中的实测延迟、成功率，结合并发上限与在途请求数估算完成代价，
+    每章分配给代价最低的节点；熔断中的节点不参与分配，
+    失败时由调用方排除该节点后重新选择。
+    """
+
+    def __init__(self, api: 'APIManager', nodes: List[str]):
+        self.api = api
+        self.nodes = list(nodes)
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, int] = {node: 0 for node in self.nodes}
+        self._completed: Dict[str, int] = {node: 0 for node in self.nodes}
+
+    def _node_capacity(self, node: str) -> int:
+        concurrency = self.api.get_concurrency(node)
+        return concurrency.limit if concurrency else max(1, int(CONFIG.get("max_workers", 10) or 10))
+
+    def pick(self, exclude=()) -> Optional[str]:
+        """选择预计完成最快的节点并计入在途，所有节点都被排除或熔断时返回 None"""
+        health = self.api.health
+        with self._lock:
+            best, best_cost = None, None
+            for node in self.nodes:
+                if node in exclude or health.is_open(node):
+                    continue
+                # 未测量的节点给一个乐观初值，保证每个节点都能被探索到
+                latency = max(0.05, health.latency(node, default=0.3))
+                throughput = self._node_capacity(node) * max(health.success_rate(node), 0.05) / latency
+                cost = (self._in_flight[node] + 1) / throughput
+                if best_cost is None or cost < best_cost:
+                    best, best_cost = node, cost
+            if best is not None:
+                self._in_flight[best] += 1
+            return best
+
+    def report(self, node: str, ok: bool):
+        """回报一次请求结束（延迟与成功率已由 APIManager 记入健康度登记表）"""
+        with self._lock:
+            self._in_flight[node] = max(0, self._in_flight[node] - 1)
+            if ok:
+                self._completed[node] += 1
+
+    def summary(self) -> str:
+        """各节点完成章节数，用于日志"""
+        with self._lock:
+            return ', '.join(f"{node}: {self._completed[node]}" for node in self.nodes if self._completed[node])
+
+
+def _fetch_chapter_multi_node(api: 'APIManager', scheduler: MultiNodeScheduler, item_id: str) -> Optional[Dict]:
+    """多节点获取单章：按调度器选择节点，失败自动切换到其他节点"""
+    tried = set()
+    while True:
+        node = scheduler.pick(exclude=tried)
+        if node is None:
+            return None
+        data = None
+        try:
+            data = api.get_chapter_content_hedged(item_id, base_url=node)
+        finally:
+            scheduler.report(node, bool(data and data.get('content')))
+        if data and data.get('content'):
+            return data
+        tried.add(node)
+
+
+async def _fetch_chapter_multi_node_async(api: 'APIManager', scheduler: MultiNodeScheduler,
+                                          item_id: str) -> Optional[Dict]:
+    """多节点获取单章（异步版本）"""
+    tried = set()
+    while True:
+        node = scheduler.pick(exclude=tried)
+        if node is None:
+            return None
+        data = None
+        try:
+            data = await api.get_chapter_content_hedged_async(item_id, base_url=node)
+        finally:
+            scheduler.report(node, bool(data and data.get('content')))
+        if data and data.get('content'):
+            return data
+        tried.add(node)
+
+
+def _fetch_chapters_threaded(chapters: List[Dict], on_result, fetch_one, max_workers: int) -> None:
+    """线程池引擎：每章一个阻塞请求，完成后回调 on_result(ch, data)"""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        future_to_chapter = {
+            executor.submit(fetch_one, ch["id"]): ch
+            for ch in chapters
+        }
+
+        for future in as_completed(future_to_chapter):
+            ch = future_to_chapter[future]
+            try:
+                on_result(ch, future.result())
+            except Exception:
+                pass
+
+
+async def _fetch_chapters_async(api: 'APIManager', chapters: List[Dict], on_result, fetch_one_async) -> None:
+    """异步引擎：单个事件循环内以 async_batch_size 为滑动窗口保持请求在途
+
+    实际并发由 get_chapter_content_async 内部的信号量与令牌桶控制，
+    窗口只决定同时存在的协程数量，慢章节不会阻塞整批。
+    on_result 可能因下游反压而阻塞（如流水线输入队列已满），因此放到默认线程池中
+    依次执行：阻塞期间在途请求照常完成，只是暂不补充新请求。
+    """
+    loop = asyncio.get_running_loop()
+    window = max(1, int(CONFIG.get("async_batch_size", 50) or 50))
+    chapter_iter = iter(chapters)
+    pending: Dict[asyncio.Future, Dict] = {}
+
+    def _fill_window():
+        while len(pending) < window:
+            ch = next(chapter_iter, None)
+            if ch is None:
+                return
+            task = asyncio.ensure_future(fetch_one_async(ch["id"]))
+            pending[task] = ch
+
+    try:
+        _fill_window()
+        while pending:
+            done, _ = await asyncio.wait(list(pending.keys()), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                ch = pending.pop(task)
+                try:
+                    await loop.run_in_executor(None, on_result, ch, task.result())
+                except Exception:
+                    pass
+            _fill_window()
+    finally:
+        for task in pending:
+            task.cancel()
+        # 会话与信号量绑定在当前事件循环上，结束时关闭以便下次重建
+        await api.close_async()
+
+
+def fetch_chapters(api: 'APIManager', chapters: List[Dict], on_result, engine: Optional[str] = None,
+                   scheduler: Optional[MultiNodeScheduler] = None) -> None:
+    """按所选引擎并发下载章节，每完成一章调用 on_result(ch, data)
+
     Args:
-        chapter_results: 已下载的章节结果 {index: {'title': ..., 'content': ...}}
-        expected_chapters: 期望的章节列表 [{'id': ..., 'title': ..., 'index': ...}]
-        log_func: 日志输出函数
-    
-    Returns:
-        分析结果字典:
-        - total_expected: 期望总章节数
-        - total_downloaded: 已下载章节数
-        - missing_indices: 缺失的章节索引列表
-        - order_correct: 顺序是否正确
-        - completeness_percent: 完整度百分比
+        api: API管理器
+        chapters: 待下载章节列表 [{'id': ..., 'title': ..., 'index': ...}]
+        on_result: 结果回调，data 为接口返回的章节数据或 None
+        engine: 'thread' 或 'async'，为空时读取配置
+        scheduler: 多节点调度器，为空时只使用当前节点
     """
-    def log(msg, progress=-1):
-        if log_func:
-            log_func(msg, progress)
-        else:
-            print(msg)
-    
-    result = {
-        'total_expected': 0,
-        'total_downloaded': len(chapter_results),
-        'missing_indices': [],
-        'order_correct': True,
-        'completeness_percent': 100.0
-    }
-    
-    if not chapter_results:
-        log(t("dl_analyze_no_chapters"))
-        result['completeness_percent'] = 0
-        return result
-    
-    # 获取已下载的章节索引
-    downloaded_indices = set(chapter_results.keys())
-    
-    # 如果有期望的章节列表，进行完整性比对
-    if expected_chapters:
-        expected_indices = set(ch['index'] for ch in expected_chapters)
-        result['total_expected'] = len(expected_indices)
-        
-        # 查找缺失的章节
-        missing_indices = expected_indices - downloaded_indices
-        result['missing_indices'] = sorted(list(missing_indices))
-        
-        if missing_indices:
-            missing_count = len(missing_indices)
-            log(t("dl_analyze_summary", len(expected_indices), len(downloaded_indices), missing_count))
-            
-            # 显示部分缺失章节信息
-            if missing_count <= 10:
-                missing_titles = []
-                for ch in expected_chapters:
-                    if ch['index'] in missing_indices:
-                        missing_titles.append(f"{t('dl_chapter_title', ch['index']+1)}: {ch['title']}")
-                log(t("dl_analyze_missing", ', '.join(missing_titles[:5])))
+    if not chapters:
+        return
+
+    if _resolve_download_engine(engine) == 'async':
+        if scheduler:
+            async def fetch_one_async(item_id):
+                return await _fetch_chapter_multi_node_async(api, scheduler, item_id)
         else:
-            log(t("dl_analyze_pass", len(expected_indices)))
-    else:
-        # 没有期望列表，使用已下载内容分析
-        result['total_expected'] = len(chapter_results)
-        
-        # 检查索引是否连续
-        sorted_indices = sorted(downloaded_indices)
-        if sorted_indices:
-            min_idx, max_idx = sorted_indices[0], sorted_indices[-1]
-            expected_range = set(range(min_idx, max_idx + 1))
-            missing_in_range = expected_range - downloaded_indices
-            
-            if missing_in_range:
-                result['missing_indices'] = sorted(list(missing_in_range))
-                log(t("dl_analyze_gap", sorted(missing_in_range)[:10]))
-    
-    # 验证章节顺序（检查标题中的章节号是否递增）
-    sorted_results = sorted(chapter_results.items(), key=lambda x: x[0])
-    order_issues = []
-    
-    for i in range(1, len(sorted_results)):
-        prev_idx, prev_data = sorted_results[i-1]
-        curr_idx, curr_data = sorted_results[i]
-        
-        # 检查索引是否连续
-        if curr_idx != prev_idx + 1:
-            order_issues.append({
-                'type': 'gap',
-                'from_index': prev_idx,
-                'to_index': curr_idx,
-                'gap': curr_idx - prev_idx - 1
-            })
-    
-    if order_issues:
-        result['order_correct'] = False
-        total_gaps = sum(issue['gap'] for issue in order_issues)
-        log(t("dl_analyze_order_fail", len(order_issues), total_gaps))
+            fetch_one_async = api.get_chapter_content_hedged_async
+        asyncio.run(_fetch_chapters_async(api, chapters, on_result, fetch_one_async))
+        return
+
+    # 启用自适应并发时线程数取并发上限之和，实际在途请求数由各节点控制器限制
+    max_workers = api.chapter_worker_limit(scheduler.nodes if scheduler else [api.base_url])
+
+    if scheduler:
+        def fetch_one(item_id):
+            return _fetch_chapter_multi_node(api, scheduler, item_id)
     else:
-        log(t("dl_analyze_order_pass"))
-    
-    # 计算完整度
-    if result['total_expected'] > 0:
-        result['completeness_percent'] = (result['total_downloaded'] / result['total_expected']) * 100
-    
-    return result
+        fetch_one = api.get_chapter_content_hedged
+    _fetch_chapters_threaded(chapters, on_result, fetch_one, max_workers)
 
 
-def download_cover(cover_url, headers):
-    """下载封面图片"""
-    if not cover_url:
-        return None, None, None
-    
-    try:
-        response = requests.get(cover_url, headers=headers, timeout=15)
-        if response.status_code != 200:
-            return None, None, None
-        
-        content_type = response.headers.get('content-type', '')
-        content_bytes = response.content
-        
-        if len(content_bytes) < 1000:
-            return None, None, None
-        
-        if 'jpeg' in content_type or 'jpg' in content_type:
-            file_ext, mime_type = '.jpg', 'image/jpeg'
-        elif 'png' in content_type:
-            file_ext, mime_type = '.png', 'image/png'
-        elif 'webp' in content_type:
-            file_ext, mime_type = '.webp', 'image/webp'
-        else:
-            file_ext, mime_type = '.jpg', 'image/jpeg'
-        
-        return content_bytes, file_ext, mime_type
-        
-    except Exception as e:
-        with print_lock:
-            print(t("dl_cover_fail", str(e)))
-        return None, None, None
+def _resolve_multi_node(multi_node: Optional[bool] = None) -> bool:
+    """解析是否启用多节点分片下载：显式参数优先，其次读取配置 multi_node_download"""
+    if multi_node is None:
+        return bool(CONFIG.get("multi_node_download", False))
+    return bool(multi_node)
 
 
-def create_epub(name, author_name, description, cover_url, chapters, save_path):
-    """创建EPUB文件"""
-    book = epub.EpubBook()
-    book.set_identifier(f'fanqie_{int(time.time())}')
-    book.set_title(name)
-    book.set_language('zh-CN')
-    
-    if author_name:
-        book.add_author(author_name)
-    
-    if description:
-        book.add_metadata('DC', 'description', description)
-    
-    if cover_url:
+def _select_chapters(chapters: List[Dict], start_chapter=None, end_chapter=None, selected_chapters=None,
+                     log_message=None) -> List[Dict]:
+    """按章节范围与所选章节过滤目录，未指定时返回完整目录"""
+    total_chapters = len(chapters)
+    if start_chapter is not None or end_chapter is not None:
+        start_idx = (start_chapter - 1) if start_chapter else 0
+        end_idx = end_chapter if end_chapter else total_chapters
+        chapters = chapters[start_idx:end_idx]
+        if log_message:
+            log_message(t("dl_range_log", start_idx+1, end_idx))
+
+    if selected_chapters:
         try:
-            cover_content, file_ext, mime_type = download_cover(cover_url, get_headers())
-            if cover_content and file_ext and mime_type:
-                book.set_cover(f'cover{file_ext}', cover_content)
+            selected_indices = set(int(x) for x in selected_chapters)
+            chapters = [ch for ch in chapters if ch['index'] in selected_indices]
+            if log_message:
+                log_message(t("dl_selected_log", len(chapters)))
         except Exception as e:
-            with print_lock:
-                print(t("dl_cover_add_fail", str(e)))
-    
-    spine_items = ['nav']
-    toc_items = []
-    
-    # 创建书籍信息页 (简介页)
-    intro_html = f'<h1>{name}</h1>'
-    if author_name:
-        intro_html += f'<p><strong>作者：</strong> {author_name}</p>'
-    
-    if description:
-        intro_html += '<hr/>'
-        intro_html += f'<h3>{t("dl_intro_title")}</h3>'
-        # 处理简介的换行
-        desc_lines = description.split('\n')
-        for line in desc_lines:
-            if line.strip():
-                intro_html += f'<p>{line.strip()}</p>'
-                
-    intro_chapter = epub.EpubHtml(title=t('dl_book_detail_title'), file_name='intro.xhtml', lang='zh-CN')
-    intro_chapter.content = intro_html
-    book.add_item(intro_chapter)
-    
-    # 将简介页添加到 spine 和 toc
-    spine_items.append(intro_chapter)
-    toc_items.append(intro_chapter)
+            if log_message:
+                log_message(t("dl_filter_error", e))
+    return chapters
 
-    for idx, ch_data in enumerate(chapters):
-        chapter_file = f'chapter_{idx + 1}.xhtml'
-        title = ch_data.get('title', f'第{idx + 1}章')
-        content = ch_data.get('content', '')
-        
-        # 将换行符转换为HTML段落标签
-        paragraphs = content.split('\n\n') if content else []
-        html_paragraphs = ''.join(f'<p>{p.strip()}</p>' for p in paragraphs if p.strip())
-        
-        chapter = epub.EpubHtml(
-            title=title,
-            file_name=chapter_file,
-            lang='zh-CN'
+
+class DownloadPlanner:
+    """下载策略规划器
+
+    根据全书章节数、本次需要的章节数、节点整本下载支持情况以及实测延迟/吞吐，
+    估算三种策略的耗时并选择最快的一种：
+    - bulk: 整本下载后按目录截取所需章节
+    - chapter: 当前节点逐章下载
+    - multi_node: 所有可用节点分片逐章下载（仅在允许多节点时参与比较）
+    没有实测样本时使用保守的默认值。
+    """
+
+    BULK = 'bulk'
+    CHAPTER = 'chapter'
+    MULTI_NODE = 'multi_node'
+
+    DEFAULT_LATENCY = 0.3                  # 单章请求延迟（秒）
+    DEFAULT_BULK_TTFB = 3.0                # 整本下载首字节耗时（秒），服务端需要先组装整本
+    DEFAULT_BULK_THROUGHPUT = 1024 * 1024  # 整本下载吞吐（字节/秒）
+    AVG_CHAPTER_BYTES = 9000               # 单章平均字节数（约 3000 个汉字）
+    MIN_SAMPLES = 20                       # 节点实测样本数达到该值才采用实测延迟
+
+    _LABELS = {BULK: "整本下载后截取", CHAPTER: "逐章下载", MULTI_NODE: "多节点逐章下载"}
+
+    def __init__(self, api: 'APIManager', engine: Optional[str] = None):
+        self.api = api
+        self.engine = _resolve_download_engine(engine)
+
+    def _chapter_rate(self, node: str) -> float:
+        """节点逐章下载的预计速度（章/秒）"""
+        health = self.api.health
+        if health.is_open(node):
+            return 0.0
+        max_workers = max(1, int(CONFIG.get("max_workers", 10) or 10))
+        concurrency = self.api.get_concurrency(node)
+        workers = concurrency.limit if concurrency else max_workers
+        # 样本太少（如只有详情/目录请求）时不足以代表章节请求延迟，使用默认值
+        if health.sample_count(node) >= self.MIN_SAMPLES:
+            latency = max(0.05, health.latency(node, default=self.DEFAULT_LATENCY))
+        else:
+            latency = self.DEFAULT_LATENCY
+        rate = workers * max(health.success_rate(node), 0.05) / latency
+        if self.engine == 'async':
+            # 异步引擎受令牌桶限速，速率随并发上限等比例缩放（见 _async_slot）
+            rate = min(rate, CONFIG.get("api_rate_limit", 20) * workers / max_workers)
+        return rate
+
+    def estimate(self, book_id: str, total_chapters: int, target_count: int,
+                 allow_multi_node: bool = False) -> Dict[str, float]:
+        """估算各策略耗时（秒），不可用的策略不出现在结果中"""
+        estimates: Dict[str, float] = {}
+
+        if os.path.exists(_get_bulk_done_path(book_id)):
+            # 已有完整的整本下载文件，只需本地解析
+            estimates[self.BULK] = 0.5
+        else:
+            bulk_nodes = self.api.full_download_nodes(verbose=False)
+            if bulk_nodes:
+                ttfb, throughput = self.api.health.bulk_estimate(bulk_nodes[0])
+                ttfb = ttfb if ttfb is not None else self.DEFAULT_BULK_TTFB
+                throughput = throughput or self.DEFAULT_BULK_THROUGHPUT
+                estimates[self.BULK] = ttfb + total_chapters * self.AVG_CHAPTER_BYTES / throughput
+
+        rate = self._chapter_rate(self.api.base_url)
+        if rate > 0:
+            estimates[self.CHAPTER] = target_count / rate
+
+        if allow_multi_node:
+            nodes = self.api.get_chapter_nodes()
+            if len(nodes) > 1:
+                total_rate = sum(self._chapter_rate(node) for node in nodes)
+                if total_rate > 0:
+                    estimates[self.MULTI_NODE] = target_count / total_rate
+
+        return estimates
+
+    def plan(self, book_id: str, total_chapters: int, target_count: int,
+             allow_multi_node: bool = False) -> Dict:
+        """选择预计最快的策略
+
+        Returns:
+            {'strategy': 选中的策略, 'fallback': 整本下载失败时改用的逐章策略,
+             'estimates': {策略: 预计秒数}}
+        """
+        estimates = self.estimate(book_id, total_chapters, target_count, allow_multi_node)
+        per_chapter = {k: v for k, v in estimates.items() if k != self.BULK}
+        fallback = min(per_chapter, key=per_chapter.get) if per_chapter else self.CHAPTER
+        strategy = min(estimates, key=estimates.get) if estimates else self.CHAPTER
+        return {'strategy': strategy, 'fallback': fallback, 'estimates': estimates}
+
+    @classmethod
+    def describe(cls, plan: Dict) -> str:
+        """用于日志的计划说明"""
+        estimates = plan['estimates']
+        chosen = plan['strategy']
+        others = "，".join(
+            f"{cls._LABELS[k]} {v:.1f}s" for k, v in sorted(estimates.items(), key=lambda kv: kv[1]) if k != chosen
         )
-        chapter.content = f'<h1>{title}</h1><div>{html_paragraphs}</div>'
-        
-        book.add_item(chapter)
-        spine_items.append(chapter)
-        toc_items.append(chapter)
-    
-    book.toc = toc_items
-    book.spine = spine_items
-    
-    book.add_item(epub.EpubNcx())
-    book.add_item(epub.EpubNav())
-    
-    # 使用新的文件命名逻辑
-    filename = generate_filename(name, author_name, 'epub')
-    epub_path = os.path.join(save_path, filename)
-    epub.write_epub(epub_path, book)
-    
-    return epub_path
+        text = f"下载计划: {cls._LABELS[chosen]}"
+        if chosen in estimates:
+            text += f"（预计 {estimates[chosen]:.1f}s）"
+        if others:
+            text += f"；其他方案: {others}"
+        return text
+
+
+class FullContentRace:
+    """整本下载与逐章下载赛跑
+
+    整本下载在后台线程进行，同时以少量线程按顺序逐章下载。根据双方的实测速度
+    预测各自的完成时间，一方明显领先时取消另一方：
+    - 整本下载完成：停止逐章下载，已下载的章节与整本内容合并；
+    - 整本下载失败或预计明显更慢：放弃整本下载，由普通模式以全并发继续逐章下载。
+    这样整本下载很晚才失败时，总耗时接近两种方式中较快的一种，而不是两者之和。
+    """
 
+    def __init__(self, api: 'APIManager', book_id: str, chapters: List[Dict],
+                 skip_ids=(), workers: Optional[int] = None, margin: float = 0.5, min_samples: int = 3,
+                 chapter_transform=None, book_chapter_count: Optional[int] = None):
+        """
+        Args:
+            api: API管理器
+            book_id: 书籍ID
+            chapters: 本次需要的章节列表，逐章下载按此顺序进行
+            skip_ids: 已下载过的章节ID（断点续传），不参与逐章下载
+            workers: 赛跑期间逐章下载的线程数，为空时读取配置 race_chapter_workers
+            margin: 预测完成时间不超过对方的该比例时判定为明显领先
+            min_samples: 逐章下载至少完成的章节数，之后才开始预测
+            chapter_transform: 透传给 get_full_content 的逐章处理函数
+            book_chapter_count: 全书章节数（整本下载的数据量按全书估算），为空时取 len(chapters)
+        """
+        self.api = api
+        self.book_id = book_id
+        self.total = len(chapters)
+        self.book_chapter_count = book_chapter_count or len(chapters)
+        self.workers = max(1, int(workers or CONFIG.get("race_chapter_workers", 2) or 2))
+        self.margin = margin
+        self.min_samples = min_samples
+        self.chapter_transform = chapter_transform
+
+        skip_ids = set(skip_ids)
+        self._pending = deque(ch for ch in chapters if ch["id"] not in skip_ids)
+        self._to_fetch = len(self._pending)
+        self._lock = threading.Lock()
+        self._stop_chapters = threading.Event()
+        self._cancel_bulk = threading.Event()
+        self._bulk_done = threading.Event()
+        self._bulk_result = None
+        self._bulk_received = 0
+        self._bulk_total: Optional[int] = None
+        self._bulk_first_byte = 0.0
+        self._chapter_data: Dict[str, Dict] = {}
+        self._chapter_latency = 0.0
+        self._chapter_bytes = 0
+        self._chapter_done = 0
+        self._chapter_threads: List[threading.Thread] = []
+        self._started = 0.0
+
+    def _run_bulk(self):
+        try:
+            self._bulk_result = self.api.get_full_content(
+                self.book_id, cancel_event=self._cancel_bulk, progress_callback=self._on_bulk_progress,
+                chapter_transform=self.chapter_transform
+            )
+        except Exception:
+            self._bulk_result = None
+        finally:
+            self._bulk_done.set()
+
+    def _on_bulk_progress(self, received: int, total: Optional[int]):
+        with self._lock:
+            if received == 0 or received < self._bulk_received:
+                # 新的响应（换节点/模式/重试），重新计速
+                self._bulk_first_byte = 0.0
+            elif not self._bulk_first_byte:
+                self._bulk_first_byte = time.monotonic()
+            self._bulk_received = received
+            self._bulk_total = total
+
+    def _run_chapters(self):
+        while not self._stop_chapters.is_set():
+            with self._lock:
+                if not self._pending:
+                    return
+                ch = self._pending.popleft()
+            start = time.monotonic()
+            try:
+                data = self.api.get_chapter_content(ch["id"])
+            except Exception:
+                data = None
+            if data and data.get('content'):
+                with self._lock:
+                    self._chapter_data[ch["id"]] = data
+                    self._chapter_latency += time.monotonic() - start
+                    self._chapter_bytes += len(data['content'].encode('utf-8'))
+                    self._chapter_done += 1
+
+    def _full_concurrency(self) -> int:
+        """逐章下载胜出后普通模式可用的并发数"""
+        if self.api.concurrency:
+            return max(1, self.api.effective_concurrency())
+        return max(1, int(CONFIG.get("max_workers", 10) or 10))
+
+    def _decide(self) -> Optional[str]:
+        """返回 'bulk'、'chapters'，尚无法判定时返回 None"""
+        if self._bulk_done.is_set():
+            return 'bulk' if self._bulk_result else 'chapters'
+
+        with self._lock:
+            done = self._chapter_done
+            remaining = self._to_fetch - len(self._chapter_data)
+            if remaining <= 0:
+                return 'chapters'
+            if done < self.min_samples or self._stop_chapters.is_set():
+                return None
+            avg_latency = self._chapter_latency / done
+            avg_bytes = self._chapter_bytes / done
+            received, total, first_byte = self._bulk_received, self._bulk_total, self._bulk_first_byte
+
+        concurrency = self._full_concurrency()
+        chapter_eta = remaining * avg_latency / concurrency
+        now = time.monotonic()
+
+        if received and first_byte and now > first_byte:
+            # 总大小未知时用逐章下载得到的平均章节大小估算
+            expected = max(total or int(avg_bytes * self.book_chapter_count), received + 1)
+            bulk_eta = (expected - received) / (received / (now - first_byte))
+            if chapter_eta < bulk_eta * self.margin:
+                return 'chapters'
+            if bulk_eta < chapter_eta * self.margin:
+                # 整本下载明显领先：停止逐章下载，继续等待整本结果
+                self._stop_chapters.set()
+            return None
 
-def create_txt(name, author_name, description, chapters, save_path):
-    """创建TXT文件"""
-    # 使用新的文件命名逻辑
-    filename = generate_filename(name, author_name, 'txt')
-    txt_path = os.path.join(save_path, filename)
-    
-    with open(txt_path, 'w', encoding='utf-8') as f:
-        f.write(f"{name}\n")
-        if author_name:
-            f.write(f"{t('label_author')}{author_name}\n")
-        if description:
-            f.write(f"\n{t('dl_intro_title')}:\n{description}\n")
-        f.write("\n" + "="*50 + "\n\n")
-        
-        for ch_data in chapters:
-            title = ch_data.get('title', '')
-            content = ch_data.get('content', '')
-            f.write(f"\n{title}\n\n")
-            f.write(f"{content}\n\n")
-    
-    return txt_path
+        # 整本下载迟迟没有数据：若全并发逐章下载此时已经能够全部完成，则不再等待
+        if now - self._started > self._to_fetch * avg_latency / concurrency:
+            return 'chapters'
+        return None
+
+    def run(self, log_message=None) -> Tuple[Optional[Union[str, Dict[str, str]]], Dict[str, Dict]]:
+        """开始赛跑，返回 (整本内容或 None, 逐章下载得到的 {item_id: 章节数据})"""
+        self._started = time.monotonic()
+        threading.Thread(target=self._run_bulk, name="race-bulk", daemon=True).start()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run_chapters, name=f"race-chapter-{i}", daemon=True)
+            thread.start()
+            self._chapter_threads.append(thread)
+
+        winner = None
+        while winner is None:
+            self._bulk_done.wait(0.2)
+            winner = self._decide()
+
+        self._stop_chapters.set()
+        if winner == 'chapters':
+            self._cancel_bulk.set()
+        # 等待在途的逐章请求结束，已下载的章节全部保留
+        for thread in self._chapter_threads:
+            thread.join(timeout=CONFIG.get("request_timeout", 30))
+
+        with self._lock:
+            chapter_data = dict(self._chapter_data)
+        if log_message:
+            if winner == 'bulk':
+                log_message(f"整本下载胜出，合并赛跑期间逐章下载的 {len(chapter_data)} 章")
+            elif self._bulk_done.is_set():
+                log_message(f"整本下载失败，已逐章下载 {len(chapter_data)} 章，继续普通模式")
+            else:
+                log_message(f"逐章下载预计更快，取消整本下载（已逐章下载 {len(chapter_data)} 章）")
+        return (self._bulk_result if winner == 'bulk' else None), chapter_data
 
 
-def Run(book_id, save_path, file_format='txt', start_chapter=None, end_chapter=None, selected_chapters=None, gui_callback=None):
-    """运行下载"""
-    
+def _resolve_race_full_download(race: Optional[bool] = None) -> bool:
+    """解析是否让整本下载与逐章下载赛跑：显式参数优先，其次读取配置 race_full_download"""
+    if race is None:
+        return bool(CONFIG.get("race_full_download", True))
+    return bool(race)
+
+
+def Run(book_id, save_path, file_format='txt', start_chapter=None, end_chapter=None, selected_chapters=None, gui_callback=None,
+        engine=None, multi_node=None, update=False, history_record=None):
+    """运行下载
+
+    Args:
+        file_format: 输出格式 'txt' / 'epub'，多个格式用逗号分隔或传列表（如 'txt,epub'），
+                     一次下载同时生成，见 ChapterWriterPool
+        engine: 章节下载引擎 'thread'（线程池）或 'async'（异步事件循环），为空时读取配置 download_engine
+        multi_node: 是否把章节分片到所有可用节点并行下载，为空时读取配置 multi_node_download
+        update: 增量更新模式，只下载上次下载之后新增或变化的章节（见 plan_incremental_update），
+                忽略章节范围与所选章节
+        history_record: 本书的下载历史记录（由调用方提供），增量更新时没有下载清单则据此推断上次下载的内容
+    """
+
     api = get_api_manager()
     if api is None:
         return False
-    
+
     def log_message(message, progress=-1):
         if gui_callback and len(inspect.signature(gui_callback).parameters) > 1:
             gui_callback(progress, message)
         else:
             print(message)
     
+    # 下载期间保护本书的临时状态，并顺便把临时目录清理到预算以内
+    state_store = get_state_store()
+    state_store.acquire(book_id)
+    try:
+        state_store.gc()
+    except Exception:
+        pass
+
+    formats = parse_formats(file_format)
+    journal: Optional[ChapterJournal] = None
+    writer_pool: Optional[ChapterWriterPool] = None
+    pipeline: Optional[ChapterPipeline] = None
     try:
         log_message(t("dl_fetching_info"), 5)
         book_detail = api.get_book_detail(book_id)
@@ -1436,52 +4962,14 @@ def Run(book_id, save_path, file_format='txt', start_chapter=None, end_chapter=N
         
         log_message(t("dl_book_info_log", name, author_name), 10)
         
-        chapter_results = {}
+        # 已写入的章节索引（正文直接交给写入器，不在内存中保留）
+        chapter_results = set()
         use_full_download = False
         speed_mode_downloaded_ids = set()
         
-        # 先获取章节目录（优先使用 directory 接口，更快且标题与整本下载一致）
+        # 章节目录只解析一次，之后整个下载流程共用（见 Catalog）
         log_message("正在获取章节列表...", 15)
-        chapters = []
-        
-        # 优先尝试 directory 接口
-        directory_data = api.get_directory(book_id)
-        if directory_data:
-            for idx, ch in enumerate(directory_data):
-                item_id = ch.get("item_id")
-                title = ch.get("title", f"第{idx+1}章")
-                if item_id:
-                    chapters.append({"id": str(item_id), "title": title, "index": idx})
-        
-        # 降级到 book 接口
-        if not chapters:
-            chapters_data = api.get_chapter_list(book_id)
-            if chapters_data:
-                if isinstance(chapters_data, dict):
-                    all_item_ids = chapters_data.get("allItemIds", [])
-                    chapter_list = chapters_data.get("chapterListWithVolume", [])
-                    
-                    if chapter_list:
-                        idx = 0
-                        for volume in chapter_list:
-                            if isinstance(volume, list):
-                                for ch in volume:
-                                    if isinstance(ch, dict):
-                                        item_id = ch.get("itemId") or ch.get("item_id")
-                                        title = ch.get("title", f"第{idx+1}章")
-                                        if item_id:
-                                            chapters.append({"id": str(item_id), "title": title, "index": idx})
-                                            idx += 1
-                    else:
-                        for idx, item_id in enumerate(all_item_ids):
-                            chapters.append({"id": str(item_id), "title": f"第{idx+1}章", "index": idx})
-                elif isinstance(chapters_data, list):
-                    for idx, ch in enumerate(chapters_data):
-                        item_id = ch.get("item_id") or ch.get("chapter_id")
-                        title = ch.get("title", f"第{idx+1}章")
-                        if item_id:
-                            chapters.append({"id": str(item_id), "title": title, "index": idx})
-        
+        chapters = api.get_catalog(book_id)
         if not chapters:
             log_message(t("dl_fetch_list_fail"))
             return False
@@ -1489,85 +4977,163 @@ def Run(book_id, save_path, file_format='txt', start_chapter=None, end_chapter=N
         total_chapters = len(chapters)
         log_message(t("dl_found_chapters", total_chapters), 20)
         
-        # 尝试极速下载模式 (仅当没有指定范围且没有选择特定章节时)
-        if start_chapter is None and end_chapter is None and not selected_chapters:
+        # 按范围/所选章节确定本次需要的章节；整本下载后截取时仍需完整目录
+        all_chapters = chapters
+        update_plans = {}
+        if update:
+            # 每种格式各自有下载记录，分别判断追加/重建，只下载它们共同需要的章节
+            update_plans = {fmt: plan_incremental_update(book_id, fmt, all_chapters, history_record)
+                            for fmt in formats}
+            if all(plan['mode'] == 'up_to_date' for plan in update_plans.values()):
+                files = ', '.join(plan['output_file'] for plan in update_plans.values())
+                log_message(f"已是最新，共 {len(all_chapters)} 章，无需更新: {files}", 100)
+                return True
+            changed_ids = set()
+            needed_indices = set()
+            for fmt, plan in update_plans.items():
+                mode = plan['mode']
+                prefix = f"[{fmt.upper()}] " if len(formats) > 1 else ""
+                if mode == 'up_to_date':
+                    log_message(f"{prefix}已是最新: {plan['output_file']}", 20)
+                    continue
+                if mode == 'full':
+                    log_message(f"{prefix}没有找到上次下载的记录，将下载全书", 20)
+                else:
+                    log_message(f"{prefix}增量更新: 新增 {len(plan['new'])} 章，变化 {len(plan['changed'])} 章，"
+                                f"删除 {len(plan['removed'])} 章"
+                                f"（{'追加到原文件' if mode == 'append' else '由缓存重建文件'}）", 20)
+                changed_ids.update(ch['id'] for ch in plan['changed'])
+                needed = plan['new'] if mode == 'append' else all_chapters
+                needed_indices.update(ch['index'] for ch in needed)
+            # 标题变化的章节视为内容有更新，从缓存中移除以便重新下载
+            if changed_ids and api.chapter_cache is not None:
+                api.chapter_cache.discard(list(changed_ids))
+            chapters = all_chapters.select(needed_indices)
+        else:
+            chapters = Catalog.of(_select_chapters(all_chapters, start_chapter, end_chapter, selected_chapters,
+                                                   log_message))
+        if not chapters:
+            log_message(t("dl_no_chapters_found"))
+            return False
+        target_indices = set(chapters.indices)
+
+        # 边下载边按顺序写盘（每种格式一个写入器），chapter_results 只记录索引，内存中只保留乱序到达的章节
+        writers = {}
+        for fmt in formats:
+            plan = update_plans.get(fmt)
+            if plan and plan['mode'] == 'up_to_date':
+                continue
+            output_path = os.path.join(save_path, generate_filename(name, author_name, fmt))
+            if plan and plan['mode'] == 'append':
+                writers[fmt] = StreamingTxtWriter(plan['output_file'], indices={ch['index'] for ch in plan['new']},
+                                                  append=True)
+            elif fmt == 'epub':
+                writers[fmt] = StreamingEpubWriter(output_path, name, author_name, description, cover_url, target_indices)
+            else:
+                writers[fmt] = StreamingTxtWriter(output_path, name, author_name, description, target_indices)
+        writer_pool = ChapterWriterPool(writers)
+
+        def store_chapter(index, title, content):
+            writer_pool.add(index, title, content)
+            chapter_results.add(index)
+
+        # 原始正文经流水线在进程池中批量处理后，再由交付线程写入各写入器
+        pipeline = ChapterPipeline(lambda ch, content: store_chapter(ch['index'], ch['title'], content))
+
+        # 先从本地章节缓存取出下载过的章节，只为其余章节规划网络下载
+        if api.chapter_cache is not None:
+            cached = api.chapter_cache.get_many([ch['id'] for ch in chapters])
+            for ch in chapters:
+                content = cached.get(ch['id'])
+                if content:
+                    pipeline.submit(ch, content)
+                    speed_mode_downloaded_ids.add(ch['id'])
+            if speed_mode_downloaded_ids:
+                log_message(f"本地章节缓存命中 {len(speed_mode_downloaded_ids)}/{len(chapters)} 章", 21)
+        pending_chapters = [ch for ch in chapters if ch['id'] not in speed_mode_downloaded_ids]
+
+        # 规划下载策略：整本下载后截取 / 逐章下载 / 多节点逐章下载
+        if pending_chapters:
+            plan = DownloadPlanner(api, engine).plan(book_id, len(all_chapters), len(pending_chapters),
+                                             allow_multi_node=_resolve_multi_node(multi_node))
+            log_message(DownloadPlanner.describe(plan), 22)
+        else:
+            plan = {'strategy': DownloadPlanner.CHAPTER, 'fallback': DownloadPlanner.CHAPTER, 'estimates': {}}
+
+        if plan['strategy'] == DownloadPlanner.BULK:
             log_message(t("dl_try_speed_mode"), 25)
-            full_content = api.get_full_content(book_id)
+            if _resolve_race_full_download():
+                race = FullContentRace(api, book_id, pending_chapters, skip_ids=load_status(book_id),
+                                       book_chapter_count=len(all_chapters))
+                full_content, raced_chapters = race.run(log_message)
+                # 赛跑期间逐章下载的章节直接计入结果，整本内容只用于补齐其余章节
+                for ch in pending_chapters:
+                    data = raced_chapters.get(ch['id'])
+                    if data:
+                        pipeline.submit(ch, data.get('content', ''))
+                        speed_mode_downloaded_ids.add(ch['id'])
+            else:
+                full_content = api.get_full_content(book_id)
             if full_content:
                 log_message(t("dl_speed_mode_success"), 30)
-                # 批量模式：返回 {item_id: content}，可精准与目录对齐
+                # 批量模式：返回 {item_id: 原始正文}，可精准与目录对齐，正文交给流水线并行处理
                 if isinstance(full_content, dict):
                     with tqdm(total=len(chapters), desc=t("dl_processing_chapters"), disable=gui_callback is not None) as pbar:
-                        for ch in chapters:
-                            raw = full_content.get(ch['id'])
-                            if isinstance(raw, str) and raw.strip():
-                                processed = process_chapter_content(raw)
-                                chapter_results[ch['index']] = {
-                                    'title': ch['title'],
-                                    'content': processed
-                                }
+                        def store_bulk_chapter(ch, content):
+                            # 处理后为空的章节视为缺失，交给普通模式补下
+                            if content:
+                                store_chapter(ch['index'], ch['title'], content)
                                 speed_mode_downloaded_ids.add(ch['id'])
                             if pbar:
                                 pbar.update(1)
 
+                        for ch in chapters:
+                            raw = full_content.get(ch['id'])
+                            if ch['id'] not in speed_mode_downloaded_ids and isinstance(raw, str) and raw.strip():
+                                pipeline.submit(ch, raw, store_bulk_chapter)
+                            elif pbar:
+                                pbar.update(1)
+                        full_content = None
+                        pipeline.drain()
+
                     parsed_count = len(speed_mode_downloaded_ids)
                     log_message(t("dl_speed_mode_parsed", parsed_count), 50)
 
-                    if parsed_count == total_chapters:
+                    if parsed_count == len(chapters):
                         use_full_download = True
                         log_message(t("dl_process_complete"), 80)
                     else:
-                        log_message(f"急速模式批量内容不完整 ({parsed_count}/{total_chapters})，将缺失章节切换到普通模式下载")
+                        log_message(f"急速模式批量内容不完整 ({parsed_count}/{len(chapters)})，将缺失章节切换到普通模式下载")
                 else:
                     full_text = str(full_content)
-                    # 使用目录标题来分割内容（兼容旧节点/下载模式）
-                    chapters_parsed = parse_novel_text_with_catalog(full_text, chapters)
+                    # 使用完整目录标题来分割内容（兼容旧节点/下载模式），再截取本次需要的章节
+                    chapters_parsed = parse_novel_text_with_catalog(full_text, all_chapters)
+                    chapters_parsed = [ch for ch in (chapters_parsed or []) if ch['index'] in target_indices]
+                    pipeline.drain()
 
                     if chapters_parsed and len(chapters_parsed) >= len(chapters) * 0.8:
                         # 成功解析出至少80%的章节
                         log_message(t("dl_speed_mode_parsed", len(chapters_parsed)), 50)
                         with tqdm(total=len(chapters_parsed), desc=t("dl_processing_chapters"), disable=gui_callback is not None) as pbar:
                             for ch in chapters_parsed:
-                                processed = process_chapter_content(ch['content'])
-                                chapter_results[ch['index']] = {
-                                    'title': ch['title'],
-                                    'content': processed
-                                }
+                                if ch['index'] not in chapter_results:
+                                    pipeline.submit(ch, ch['content'])
                                 if pbar:
                                     pbar.update(1)
+                            pipeline.drain()
 
                         use_full_download = True
                         log_message(t("dl_process_complete"), 80)
                     else:
                         parsed_count = len(chapters_parsed) if chapters_parsed else 0
-                        log_message(f"急速模式解析不完整 ({parsed_count}/{total_chapters})，切换到普通模式")
+                        log_message(f"急速模式解析不完整 ({parsed_count}/{len(chapters)})，切换到普通模式")
             else:
                 log_message(t("dl_speed_mode_fail"))
 
         # 如果没有使用极速模式，则走普通模式
         if not use_full_download:
-            
-            if not chapters:
-                log_message(t("dl_no_chapters_found"))
-                return False
-            
-            total_chapters = len(chapters)
-            log_message(t("dl_found_chapters", total_chapters), 20)
-            
-            if start_chapter is not None or end_chapter is not None:
-                start_idx = (start_chapter - 1) if start_chapter else 0
-                end_idx = end_chapter if end_chapter else total_chapters
-                chapters = chapters[start_idx:end_idx]
-                log_message(t("dl_range_log", start_idx+1, end_idx))
-            
-            if selected_chapters:
-                try:
-                    selected_indices = set(int(x) for x in selected_chapters)
-                    chapters = [ch for ch in chapters if ch['index'] in selected_indices]
-                    log_message(t("dl_selected_log", len(chapters)))
-                except Exception as e:
-                    log_message(t("dl_filter_error", e))
-            
+            pipeline.drain()
+
             downloaded_ids = load_status(book_id)
             if speed_mode_downloaded_ids:
                 downloaded_ids.update(speed_mode_downloaded_ids)
@@ -1576,7 +5142,8 @@ def Run(book_id, save_path, file_format='txt', start_chapter=None, end_chapter=N
             saved_content = load_saved_content(book_id)
             if saved_content:
                 log_message(f"发现已保存的下载进度，已有 {len(saved_content)} 个章节", 22)
-                chapter_results.update(saved_content)
+                for index, data in saved_content.items():
+                    store_chapter(index, data['title'], data['content'])
             
             chapters_to_download = [ch for ch in chapters if ch["id"] not in downloaded_ids]
             
@@ -1587,49 +5154,70 @@ def Run(book_id, save_path, file_format='txt', start_chapter=None, end_chapter=N
             
             completed = 0
             total_tasks = len(chapters_to_download)
-            
+            engine = _resolve_download_engine(engine)
+            if chapters_to_download and engine == 'async':
+                log_message(f"使用异步下载引擎，窗口大小: {CONFIG.get('async_batch_size', 50)}")
+
+            # 整本下载未选中或失败时，按规划中较快的逐章策略下载
+            chapter_strategy = plan['fallback'] if plan['strategy'] == DownloadPlanner.BULK else plan['strategy']
+            scheduler = None
+            if chapters_to_download and chapter_strategy == DownloadPlanner.MULTI_NODE:
+                nodes = api.get_chapter_nodes()
+                if len(nodes) > 1:
+                    scheduler = MultiNodeScheduler(api, nodes)
+                    log_message(f"多节点分片下载，可用节点: {len(nodes)} 个")
+
+            # 每章处理完立即写入章节日志，中途崩溃或被结束时下次可从日志恢复
+            journal = ChapterJournal(book_id)
             with tqdm(total=total_tasks, desc=t("dl_progress_desc"), disable=gui_callback is not None) as pbar:
-                with ThreadPoolExecutor(max_workers=CONFIG.get("max_workers", 5)) as executor:
-                    future_to_chapter = {
-                        executor.submit(api.get_chapter_content, ch["id"]): ch
-                        for ch in chapters_to_download
-                    }
-                    
-                    for future in as_completed(future_to_chapter):
-                        ch = future_to_chapter[future]
-                        try:
-                            data = future.result()
-                            if data and data.get('content'):
-                                processed = process_chapter_content(data.get('content', ''))
-                                chapter_results[ch['index']] = {
-                                    'title': ch['title'],
-                                    'content': processed
-                                }
-                                downloaded_ids.add(ch['id'])
-                                completed += 1
-                                if pbar:
-                                    pbar.update(1)
-                                if gui_callback:
-                                    progress = int((completed / total_tasks) * 60) + 25
-                                    gui_callback(progress, t("dl_progress_log", completed, total_tasks))
-                        except Exception:
-                            pass
-            
-            # 保存下载状态和章节内容
-            save_status(book_id, downloaded_ids)
-            save_content(book_id, chapter_results)
+                def store_downloaded_chapter(ch, processed):
+                    nonlocal completed
+                    store_chapter(ch['index'], ch['title'], processed)
+                    journal.record(ch['index'], ch['id'], ch['title'], processed)
+                    completed += 1
+                    if pbar:
+                        pbar.update(1)
+                    if gui_callback:
+                        progress = int((completed / total_tasks) * 60) + 25
+                        progress_text = t("dl_progress_log", completed, total_tasks)
+                        if api.concurrency:
+                            progress_text += f" [并发 {api.effective_concurrency()}]"
+                        gui_callback(progress, progress_text)
+
+                # 下载回调只把原始正文交给流水线，正文处理、写盘与进度更新都不占用下载线程
+                def on_chapter_result(ch, data):
+                    if data and data.get('content'):
+                        downloaded_ids.add(ch['id'])
+                        pipeline.submit(ch, data['content'], store_downloaded_chapter)
+
+                fetch_chapters(api, chapters_to_download, on_chapter_result, engine, scheduler)
+                pipeline.drain()
+
+            if scheduler:
+                log_message(f"多节点分布: {scheduler.summary()}")
+            if api.hedging and chapters_to_download:
+                hedge_stats = api.hedging.stats()
+                log_message(f"对冲请求: 发出 {hedge_stats['hedged']} 次，胜出 {hedge_stats['hedge_wins']} 次，"
+                            f"阈值 {hedge_stats['threshold_ms']} ms")
         
+        pipeline.close()
+        pipeline = None
+
         # ==================== 下载完整性分析 ====================
         if gui_callback:
             gui_callback(85, t("dl_analyzing_completeness"))
         else:
             log_message(t("dl_analyzing_completeness"), 85)
         
+        # 完整性分析与之后的顺序验证共用同一个验证器（目录索引只构建一次）
+        order_validator = ChapterOrderValidator(chapters)
+        
         # 分析结果
         analysis_result = analyze_download_completeness(
             chapter_results, 
             chapters if not use_full_download else None,
-            log_message
+            log_message,
+            validator=order_validator
         )
         
         # 如果有缺失章节，尝试补充下载
@@ -1638,7 +5226,8 @@ def Run(book_id, save_path, file_format='txt', start_chapter=None, end_chapter=N
             log_message(t("dl_missing_retry", missing_count), 87)
             
             # 获取缺失章节的信息
-            missing_chapters = [ch for ch in chapters if ch['index'] in analysis_result['missing_indices']]
+            missing_set = set(analysis_result['missing_indices'])
+            missing_chapters = [ch for ch in chapters if ch['index'] in missing_set]
             
             # 补充下载缺失章节（最多重试3次）
             for retry in range(3):
@@ -1653,10 +5242,8 @@ def Run(book_id, save_path, file_format='txt', start_chapter=None, end_chapter=N
                         data = api.get_chapter_content(ch["id"])
                         if data and data.get('content'):
                             processed = process_chapter_content(data.get('content', ''))
-                            chapter_results[ch['index']] = {
-                                'title': ch['title'],
-                                'content': processed
-                            }
+                            store_chapter(ch['index'], ch['title'], processed)
+                            journal.record(ch['index'], ch['id'], ch['title'], processed)
                             downloaded_ids.add(ch['id'])
                         else:
                             still_missing.append(ch)
@@ -1669,9 +5256,6 @@ def Run(book_id, save_path, file_format='txt', start_chapter=None, end_chapter=N
                     log_message(t("dl_retry_success"), 90)
                     break
             
-            # 更新状态
-            save_status(book_id, downloaded_ids)
-            
             # 最终检查
             if missing_chapters:
                 missing_indices = [ch['index'] + 1 for ch in missing_chapters]
@@ -1681,12 +5265,8 @@ def Run(book_id, save_path, file_format='txt', start_chapter=None, end_chapter=N
         if gui_callback:
             gui_callback(92, t("dl_verifying_order"))
         
-        # 创建验证器实例
-        order_validator = ChapterOrderValidator(chapters)
-        
-        # 验证顺序
+        # 验证顺序（一次扫描同时得到顺序与连续性结果）
         validation_result = order_validator.validate_order(chapter_results)
-        sequential_result = order_validator.verify_sequential(chapter_results)
         
         if not validation_result['is_valid']:
             if validation_result['gaps']:
@@ -1697,9 +5277,10 @@ def Run(book_id, save_path, file_format='txt', start_chapter=None, end_chapter=N
         else:
             log_message("章节顺序验证通过", 93)
         
-        # 使用验证器排序章节
-        sorted_chapters = order_validator.sort_chapters(chapter_results)
-        
+        if journal is not None:
+            journal.close()
+            journal = None
+
         # 最终统计
         total_expected = len(chapters) if not use_full_download else len(chapter_results)
         total_downloaded = len(chapter_results)
@@ -1710,10 +5291,17 @@ def Run(book_id, save_path, file_format='txt', start_chapter=None, end_chapter=N
         if gui_callback:
             gui_callback(95, "正在生成文件...")
         
-        if file_format == 'epub':
-            output_file = create_epub(name, author_name, description, cover_url, sorted_chapters, save_path)
-        else:
-            output_file = create_txt(name, author_name, description, sorted_chapters, save_path)
+        # 章节已在下载过程中按顺序写入，这里写出剩余章节并生成最终文件
+        outputs = writer_pool.finish()
+        writer_pool = None
+        for fmt, path in outputs.items():
+            written = [all_chapters.by_index(index) for index in writers[fmt].written]
+            plan = update_plans.get(fmt)
+            if plan and plan['mode'] == 'append':
+                written = plan['previous'] + written
+            # 记录本次写入的章节，供之后增量更新
+            save_manifest(book_id, fmt, path, written)
+        output_file = ', '.join(outputs.values())
         
         # 下载完成后清除临时状态文件
         clear_status(book_id)
@@ -1729,73 +5317,142 @@ def Run(book_id, save_path, file_format='txt', start_chapter=None, end_chapter=N
     except Exception as e:
         log_message(f"下载失败: {str(e)}")
         return False
+    finally:
+        if pipeline is not None:
+            pipeline.abort()
+        if journal is not None:
+            journal.close()
+        if writer_pool is not None:
+            writer_pool.abort()
+        state_store.release(book_id)
 
 
 # ===================== 章节顺序验证器 =====================
 
+_TITLE_SPACE_RE = re.compile(r'[\s\u3000]+')
+
+
+def _bitmap_runs(bitmap, value: int, start: int, end: int) -> List[Tuple[int, int]]:
+    """返回 bitmap[start:end] 中取值为 value 的连续区间 [(起, 止), ...]，止为开区间"""
+    runs = []
+    other = value ^ 1
+    pos = bitmap.find(value, start, end)
+    while pos != -1:
+        stop = bitmap.find(other, pos, end)
+        if stop == -1:
+            stop = end
+        runs.append((pos, stop))
+        pos = bitmap.find(value, stop, end)
+    return runs
+
+
 class ChapterOrderValidator:
     """验证和修复章节顺序
     
     确保下载的章节按正确顺序排列，检测缺失和重复
     """
     
-    def __init__(self, expected_chapters: List[dict]):
+    def __init__(self, expected_chapters: Union[Catalog, List[dict]]):
         """
         Args:
-            expected_chapters: 期望的章节列表 [{'id': str, 'title': str, 'index': int}, ...]
+            expected_chapters: 期望的章节目录（Catalog 或 [{'id': str, 'title': str, 'index': int}, ...]），
+                               item_id 与索引的互查直接使用目录自带的映射
         """
         self.expected_chapters = expected_chapters
-        self.chapter_map = {str(ch.get('id', ch.get('item_id', ''))): ch.get('index', i) 
-                          for i, ch in enumerate(expected_chapters)}
-        self.index_to_chapter = {ch.get('index', i): ch for i, ch in enumerate(expected_chapters)}
+        self.catalog = Catalog.of(expected_chapters)
     
-    def validate_order(self, chapter_results: dict) -> dict:
+    def analyze(self, chapter_results: dict) -> dict:
         """
-        验证章节顺序
+        一次线性扫描生成全部校验报告
+        
+        用位图标记已下载与期望的章节索引，再按索引顺序扫描一遍，
+        同时得到期望缺失、范围内缺失与索引间隙，耗时与章节数成正比。
         
         Args:
-            chapter_results: 下载结果 {index: {'title': str, 'content': str}, ...}
+            chapter_results: 下载结果 {index: {'title': str, 'content': str}, ...}，或已下载章节索引的集合
         
         Returns:
             {
-                'is_valid': bool,
-                'gaps': List[int],      # 缺失的章节索引
-                'out_of_order': List[tuple],  # 顺序错误的章节对
-                'duplicates': List[int]  # 重复的章节索引
+                'validation': dict,            # 同 validate_order
+                'sequential': dict,            # 同 verify_sequential
+                'expected_total': int,         # 期望章节数（按索引去重）
+                'expected_missing': List[int]  # 期望章节中未下载的索引
             }
         """
-        result = {
-            'is_valid': True,
-            'gaps': [],
-            'out_of_order': [],
-            'duplicates': []
-        }
+        validation = {'is_valid': True, 'gaps': [], 'out_of_order': [], 'duplicates': []}
+        sequential = {'is_sequential': True, 'missing_count': 0, 'missing_indices': []}
+        expected_count = len(self.catalog)
+        expected_indices = self.catalog.indices
+        contiguous = isinstance(expected_indices, range)
+        report = {'validation': validation, 'sequential': sequential,
+                  'expected_total': expected_count if contiguous else len(set(expected_indices)),
+                  'expected_missing': []}
         
         if not chapter_results:
-            return result
+            report['expected_missing'] = sorted(set(expected_indices))
+            return report
         
-        # 获取所有索引并排序
-        indices = sorted(chapter_results.keys())
+        first, last = min(chapter_results), max(chapter_results)
+        if not expected_count:
+            expected_low = expected_high = 0
+        elif contiguous:
+            expected_low, expected_high = expected_indices[0], expected_indices[-1]
+        else:
+            expected_low, expected_high = min(expected_indices), max(expected_indices)
+        low = min(0, first, expected_low)
+        high = max(last, expected_count - 1, expected_high)
+        present = bytearray(high - low + 1)
+        wanted = bytearray(high - low + 1)
+        for index in chapter_results:
+            present[index - low] = 1
+        if contiguous:
+            wanted[expected_low - low:expected_high - low + 1] = b'\x01' * expected_count
+        else:
+            for index in expected_indices:
+                wanted[index - low] = 1
         
-        if not indices:
-            return result
+        # 已下载范围内：每段连续缺失对应一处不连续的相邻索引对
+        missing = []
+        out_of_order = []
+        for start, stop in _bitmap_runs(present, 0, first - low, last - low + 1):
+            missing.extend(range(start + low, stop + low))
+            out_of_order.append((start + low - 1, stop + low))
         
-        # 检查缺失的章节（在期望范围内）
-        expected_indices = set(range(len(self.expected_chapters)))
-        downloaded_indices = set(indices)
-        result['gaps'] = sorted(list(expected_indices - downloaded_indices))
+        # 期望范围 0..len(期望章节)-1 内的缺失
+        gaps = []
+        for start, stop in _bitmap_runs(present, 0, -low, expected_count - low):
+            gaps.extend(range(start + low, stop + low))
         
-        # 检查顺序是否正确（索引应该是连续递增的）
-        for i in range(1, len(indices)):
-            if indices[i] != indices[i-1] + 1:
-                # 发现不连续
-                result['out_of_order'].append((indices[i-1], indices[i]))
+        # 期望章节索引中的缺失：逐字节计算 wanted & ~present（取值只有 0/1，整数按位运算不会进位）
+        size = len(present)
+        absent = (int.from_bytes(wanted, 'little') & ~int.from_bytes(present, 'little')).to_bytes(size, 'little')
+        expected_missing = []
+        for start, stop in _bitmap_runs(absent, 1, 0, size):
+            expected_missing.extend(range(start + low, stop + low))
         
-        # 检查是否有效
-        if result['gaps'] or result['out_of_order'] or result['duplicates']:
-            result['is_valid'] = False
+        validation.update(is_valid=not (gaps or out_of_order), gaps=gaps, out_of_order=out_of_order)
+        sequential.update(is_sequential=not missing, missing_count=len(missing), missing_indices=missing)
+        report['expected_missing'] = expected_missing
+        return report
+    
+    def validate_order(self, chapter_results: dict) -> dict:
+        """
+        验证章节顺序
         
-        return result
+        Args:
+            chapter_results: 下载结果 {index: {'title': str, 'content': str}, ...}
+        
+        Returns:
+            {
+                'is_valid': bool,
+                'gaps': List[int],      # 缺失的章节索引
+                'out_of_order': List[tuple],  # 顺序错误的章节对
+                'duplicates': List[int]  # 重复的章节索引
+            }
+        """
+        if not chapter_results:
+            return {'is_valid': True, 'gaps': [], 'out_of_order': [], 'duplicates': []}
+        return self.analyze(chapter_results)['validation']
     
     def sort_chapters(self, chapter_results: dict) -> List[dict]:
         """
@@ -1875,21 +5532,7 @@ class ChapterOrderValidator:
                 'missing_indices': List[int]
             }
         """
-        if not chapter_results:
-            return {'is_sequential': True, 'missing_count': 0, 'missing_indices': []}
-        
-        indices = sorted(chapter_results.keys())
-        min_idx, max_idx = indices[0], indices[-1]
-        
-        expected_set = set(range(min_idx, max_idx + 1))
-        actual_set = set(indices)
-        missing = sorted(list(expected_set - actual_set))
-        
-        return {
-            'is_sequential': len(missing) == 0,
-            'missing_count': len(missing),
-            'missing_indices': missing
-        }
+        return self.analyze(chapter_results)['sequential']
     
     def map_text_parsed_content(self, parsed_chapters: List[dict], catalog: List[dict]) -> dict:
         """
@@ -1913,6 +5556,11 @@ class ChapterOrderValidator:
             normalized_title = ch.get('title', '').strip()
             title_to_index[normalized_title] = ch.get('index', 0)
         
+        # 去除全部空白后的标题 → (目录标题, 索引)，同名时保留目录中靠前的标题
+        compact_to_title = {}
+        for cat_title, idx in title_to_index.items():
+            compact_to_title.setdefault(_TITLE_SPACE_RE.sub('', cat_title), (cat_title, idx))
+        
         # 映射解析出的章节
         for parsed_ch in parsed_chapters:
             parsed_title = parsed_ch.get('title', '').strip()
@@ -1925,17 +5573,14 @@ class ChapterOrderValidator:
                     'content': parsed_ch.get('content', '')
                 }
             else:
-                # 尝试模糊匹配（去除标点符号和空格）
-                import re
-                clean_parsed = re.sub(r'[\s\u3000]+', '', parsed_title)
-                for cat_title, idx in title_to_index.items():
-                    clean_cat = re.sub(r'[\s\u3000]+', '', cat_title)
-                    if clean_parsed == clean_cat:
-                        result[idx] = {
-                            'title': cat_title,  # 使用目录中的标准标题
-                            'content': parsed_ch.get('content', '')
-                        }
-                        break
+                # 尝试模糊匹配（去除空白）
+                matched = compact_to_title.get(_TITLE_SPACE_RE.sub('', parsed_title))
+                if matched:
+                    cat_title, idx = matched
+                    result[idx] = {
+                        'title': cat_title,  # 使用目录中的标准标题
+                        'content': parsed_ch.get('content', '')
+                    }
         
         return result
     
@@ -1949,8 +5594,9 @@ class ChapterOrderValidator:
         Returns:
             摘要字符串
         """
-        validation = self.validate_order(chapter_results)
-        sequential = self.verify_sequential(chapter_results)
+        report = self.analyze(chapter_results)
+        validation = report['validation']
+        sequential = report['sequential']
         
         lines = []
         
@@ -1979,13 +5625,15 @@ class NovelDownloader:
         """取消下载"""
         self.is_cancelled = True
     
-    def run_download(self, book_id, save_path, file_format='txt', start_chapter=None, end_chapter=None, selected_chapters=None, gui_callback=None):
+    def run_download(self, book_id, save_path, file_format='txt', start_chapter=None, end_chapter=None, selected_chapters=None, gui_callback=None,
+                     engine=None, multi_node=None, update=False, history_record=None):
         """运行下载"""
         try:
             if gui_callback:
                 self.gui_verification_callback = gui_callback
-            
-            return Run(book_id, save_path, file_format, start_chapter, end_chapter, selected_chapters, gui_callback)
+
+            return Run(book_id, save_path, file_format, start_chapter, end_chapter, selected_chapters, gui_callback,
+                       engine=engine, multi_node=multi_node, update=update, history_record=history_record)
         except Exception as e:
             print(f"下载失败: {str(e)}")
             return False
@@ -2038,7 +5686,7 @@ class BatchDownloader:
         Args:
             book_ids: 书籍ID列表
             save_path: 保存路径
-            file_format: 文件格式 ('txt' 或 'epub')
+            file_format: 文件格式 ('txt'、'epub'，多个格式用逗号分隔，如 'txt,epub')
             progress_callback: 进度回调函数 (current, total, book_name, status, message)
             delay_between_books: 每本书之间的延迟（秒）
         
@@ -2172,7 +5820,7 @@ if __name__ == "__main__":
     mode = input("选择模式 (1/2, 默认: 1): ").strip() or "1"
     
     save_path = input("请输入保存路径(默认: ./novels): ").strip() or "./novels"
-    file_format = input("选择格式 (txt/epub, 默认: txt): ").strip() or "txt"
+    file_format = input("选择格式 (txt/epub/txt,epub, 默认: txt): ").strip() or "txt"
     os.makedirs(save_path, exist_ok=True)
     
     if mode == "2":
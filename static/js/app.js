@@ -1141,7 +1141,10 @@ class APIClient {
         
         // 更新状态文本
         const statusTextEl = document.getElementById('statusText');
-        const queueInfo = status.queue_total ? ` (${status.queue_current || 1}/${status.queue_total})` : '';
+        let queueInfo = status.queue_total ? ` (${status.queue_current || 1}/${status.queue_total})` : '';
+        if (status.is_downloading && status.concurrency_limit) {
+            queueInfo += ` · ${i18n.t('status_concurrency', status.concurrency_limit)}`;
+        }
         const statusKey = status.is_downloading ? 'downloading' : (progress === 100 ? 'completed' : 'ready');
         
         if (this.lastStatusSnapshot.statusKey !== statusKey || this.lastStatusSnapshot.queueInfo !== queueInfo) {
@@ -44,6 +44,7 @@ const translations = {
         "card_current_task": "当前任务",
         "status_ready": "准备就绪",
         "status_downloading": "下载中...",
+        "status_concurrency": "并发 {0}",
         "status_completed": "已完成",
         "book_no_task": "暂无任务",
         
@@ -242,6 +243,7 @@ const translations = {
         "card_current_task": "Current Task",
         "status_ready": "Ready",
         "status_downloading": "Downloading...",
+        "status_concurrency": "concurrency {0}",
         "status_completed": "Completed",
         "book_no_task": "No Task",
         
@@ -0,0 +1,110 @@
+"""BulkJsonStreamParser 的增量解析与 json.loads 一致性：在任意字节边界切块"""
+
+import json
+import random
+
+import pytest
+
+import novel_downloader as nd
+
+
+def _parse(chunks):
+    parser = nd.BulkJsonStreamParser()
+    members = []
+    for chunk in chunks:
+        members.extend(parser.feed(chunk))
+    members.extend(parser.close())
+    return parser, members
+
+
+def _expected(raw: bytes):
+    """json.loads 的结果拆成 (data 成员列表, 其他顶层成员)"""
+    payload = json.loads(raw)
+    data = payload.get('data')
+    if isinstance(data, dict):
+        top = {k: v for k, v in payload.items() if k != 'data'}
+        return list(data.items()), top
+    return [], payload
+
+
+def _split_at(raw: bytes, cuts):
+    bounds = [0] + sorted(cuts) + [len(raw)]
+    return [raw[a:b] for a, b in zip(bounds, bounds[1:])]
+
+
+SAMPLES = [
+    # 转义字符、转义的代理对（😀）、直接写出的多字节 UTF-8 与 4 字节字符
+    '{"code": 200, "data": {"1001": "第一章\\n\\t\\"引号\\" \\\\ 反斜杠 \\u00e9 \\ud83d\\ude00 😀 𠀀", '
+    '"10\\u00302": "键里有转义", "1003": ""}, "message": "ok"}',
+    # 其他顶层成员位于 data 之后、值为嵌套对象/数组/数字/布尔/null
+    '{"data":{"1":{"content":"正文","title":"标题 \\/ 斜杠"},"2":[1,2.5e3,-0.0,true,false,null]},"code":200,"extra":{"a":[]}}',
+    # 多余空白与换行
+    ' \r\n{ "code" : 200 ,\n "data" : { "7" : "a" , "8" : 12345678901234567890 } } \n',
+    # data 为空对象、data 不是对象
+    '{"code": 200, "data": {}}',
+    '{"code": 200, "data": "整本文本放在一个字符串里\\n第二行"}',
+]
+
+
+@pytest.mark.parametrize('text', SAMPLES)
+def test_every_single_split_matches_json_loads(text):
+    raw = text.encode('utf-8')
+    want_members, want_top = _expected(raw)
+    for cut in range(len(raw) + 1):
+        parser, members = _parse(_split_at(raw, [cut]))
+        assert not parser.failed, cut
+        assert parser.done, cut
+        assert members == want_members, cut
+        assert parser.top == want_top, cut
+
+
+@pytest.mark.parametrize('text', SAMPLES)
+def test_byte_at_a_time_matches_json_loads(text):
+    raw = text.encode('utf-8')
+    want_members, want_top = _expected(raw)
+    parser, members = _parse([raw[i:i + 1] for i in range(len(raw))])
+    assert (members, parser.top) == (want_members, want_top)
+
+
+def test_random_payloads_random_chunking():
+    rnd = random.Random(20240508)
+    alphabet = ['a', '字', '"', '\\', '\n', '\t', '/', '😀', '𠀀', ' ', '\x00', ' ', '{', '}', ':', ',']
+    for _ in range(300):
+        data = {str(rnd.randint(1, 10 ** 9)): ''.join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 40)))
+                for _ in range(rnd.randint(0, 12))}
+        payload = {'code': 200, 'data': data}
+        if rnd.random() < 0.3:
+            payload['message'] = rnd.choice(alphabet) * 3
+        raw = json.dumps(payload, ensure_ascii=rnd.random() < 0.5).encode('utf-8')
+        cuts = rnd.sample(range(len(raw) + 1), min(len(raw) + 1, rnd.randint(1, 20)))
+        parser, members = _parse(_split_at(raw, cuts))
+        assert (members, parser.top) == _expected(raw), (raw, cuts)
+
+
+def test_members_are_emitted_while_streaming():
+    # 整本约 2.4 MB、按 8 KB 切块：成员边接收边产出，缓冲区只保留未完成的部分
+    data = {str(1000 + i): f'第{i}章' + '正文\n' * 1000 for i in range(300)}
+    raw = json.dumps({'code': 200, 'data': data}, ensure_ascii=False).encode('utf-8')
+    parser = nd.BulkJsonStreamParser()
+    members, largest_buffer = [], 0
+    for start in range(0, len(raw), 8192):
+        members.extend(parser.feed(raw[start:start + 8192]))
+        largest_buffer = max(largest_buffer, len(parser._buf) - parser._pos)
+    emitted_before_close = len(members)
+    members.extend(parser.close())
+
+    assert members == list(data.items())
+    assert emitted_before_close >= len(data) - 20
+    assert largest_buffer < 256 * 1024
+
+
+@pytest.mark.parametrize('raw', [
+    b'{"code": 200, "data": {"1": "unterminated',
+    b'{"code": 200, "data": {"1": "a"}',
+    b'[{"1": "a"}]',
+    b'{"data": {"1": "a"}} trailing',
+    b'{"data": {"1" "a"}}',
+])
+def test_truncated_or_invalid_payload_fails(raw):
+    parser, _ = _parse(_split_at(raw, [len(raw) // 2]))
+    assert parser.failed
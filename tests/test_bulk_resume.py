@@ -0,0 +1,191 @@
+"""整本下载落盘、Range 续传与完成文件复用：用假会话模拟 200/206/416 与传输中断"""
+
+import json
+
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+import novel_downloader as nd
+
+NODE = 'http://node.test'
+BOOK_ID = '7000'
+
+
+def _payload(tag: str = '') -> bytes:
+    data = {str(1000 + i): f'<p>第{i + 1}章{tag}</p>' + '正文' * 100 for i in range(20)}
+    return json.dumps({'code': 200, 'data': data}, ensure_ascii=False).encode('utf-8')
+
+
+def _expected(payload: bytes, transform=None) -> dict:
+    data = json.loads(payload)['data']
+    return {k: transform(v) if transform else v for k, v in data.items()}
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=b'', headers=None, fail_after=None):
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.encoding = 'utf-8'
+        self._body = body
+        self._fail_after = fail_after
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_content(self, chunk_size=1):
+        limit = len(self._body) if self._fail_after is None else self._fail_after
+        for start in range(0, limit, 1000):
+            yield self._body[start:min(start + 1000, limit)]
+        if self._fail_after is not None:
+            raise requests.exceptions.ChunkedEncodingError('connection broken')
+
+
+class FakeServer:
+    """支持 Range / If-Range 的整本下载节点
+
+    interrupt: 依次对每个完整响应在多少字节后断开（None 表示不断开）
+    """
+
+    def __init__(self, payload, etag='"v1"', accept_ranges=True, interrupt=(), content_range_start=None):
+        self.payload = payload
+        self.etag = etag
+        self.accept_ranges = accept_ranges
+        self.interrupt = list(interrupt)
+        self.content_range_start = content_range_start
+        self.requests = []
+        self.sent = 0
+
+    def get(self, url, params=None, headers=None, timeout=None, stream=False):
+        headers = dict(headers or {})
+        self.requests.append(headers)
+        fail_after = self.interrupt.pop(0) if self.interrupt else None
+        base = {'Content-Type': 'application/json', 'ETag': self.etag}
+        if self.accept_ranges:
+            base['Accept-Ranges'] = 'bytes'
+
+        range_header = headers.get('Range')
+        if range_header and self.accept_ranges and headers.get('If-Range', self.etag) == self.etag:
+            offset = int(range_header[len('bytes='):-1])
+            if offset >= len(self.payload):
+                return FakeResponse(416, headers=base)
+            start = offset if self.content_range_start is None else self.content_range_start
+            body = self.payload[start:]
+            base['Content-Range'] = f'bytes {start}-{len(self.payload) - 1}/{len(self.payload)}'
+            base['Content-Length'] = str(len(body))
+            self.sent += len(body) if fail_after is None else fail_after
+            return FakeResponse(206, body, base, fail_after)
+
+        base['Content-Length'] = str(len(self.payload))
+        self.sent += len(self.payload) if fail_after is None else fail_after
+        return FakeResponse(200, self.payload, base, fail_after)
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    monkeypatch.setattr(nd, '_get_state_dir', lambda: str(tmp_path))
+    monkeypatch.setattr(nd, 'get_chapter_cache', lambda: None)
+    monkeypatch.setattr(nd.time, 'sleep', lambda _seconds: None)
+    monkeypatch.setitem(nd.CONFIG, 'max_retries', 3)
+    monkeypatch.setitem(nd.CONFIG, 'full_download_concurrency', 1)
+    manager = nd.APIManager()
+    manager.health = nd.NodeHealthRegistry()
+    monkeypatch.setattr(manager, 'full_download_nodes', lambda verbose=True: [NODE])
+    return manager
+
+
+def _use(api, server):
+    api._get_session = lambda: server
+    return server
+
+
+def test_interrupted_transfer_resumes_from_offset(api):
+    payload = _payload()
+    server = _use(api, FakeServer(payload, interrupt=[5000]))
+
+    assert api.get_full_content(BOOK_ID) == _expected(payload)
+    assert len(server.requests) == 2
+    assert 'Range' not in server.requests[0]
+    assert server.requests[1]['Range'] == 'bytes=5000-'
+    assert server.requests[1]['If-Range'] == '"v1"'
+    # 续传只请求剩余部分，整本只传输一次
+    assert server.sent == len(payload)
+
+
+def test_repeated_interruptions_resume_cumulatively(api):
+    payload = _payload()
+    server = _use(api, FakeServer(payload, interrupt=[5000, 5000]))
+
+    assert api.get_full_content(BOOK_ID) == _expected(payload)
+    assert [r.get('Range') for r in server.requests] == [None, 'bytes=5000-', 'bytes=10000-']
+    assert server.sent == len(payload)
+
+
+def _seed_spool(data: bytes, etag: str = '"v1"'):
+    """模拟上次中断留下的落盘文件与元数据"""
+    part_path = nd._get_bulk_part_path(BOOK_ID, NODE, '批量')
+    with open(part_path, 'wb') as f:
+        f.write(data)
+    nd._write_bulk_meta(part_path, {'node': NODE, 'tab': '批量', 'accept_ranges': True, 'validator': etag,
+                                    'content_type': 'application/json', 'encoding': 'utf-8', 'total': None})
+    return part_path
+
+
+def test_if_range_mismatch_restarts_from_scratch(api):
+    old, new = _payload(), _payload('（修订）')
+    _seed_spool(old[:5000])
+    # 内容已更新（ETag 变化）：If-Range 不匹配时节点返回完整的 200，应覆盖旧的落盘数据
+    server = _use(api, FakeServer(new, etag='"v2"'))
+
+    assert api.get_full_content(BOOK_ID) == _expected(new)
+    assert server.requests[0]['Range'] == 'bytes=5000-'
+    assert server.requests[0]['If-Range'] == '"v1"'
+    assert len(server.requests) == 1
+
+
+def test_mismatched_content_range_discards_spool(api):
+    payload = _payload()
+    _seed_spool(payload[:5000])
+    # 节点忽略了续传位置（Content-Range 从 0 开始），不能拼接到已有数据后面
+    server = _use(api, FakeServer(payload, content_range_start=0))
+
+    assert api.get_full_content(BOOK_ID) == _expected(payload)
+    assert server.requests[0]['Range'] == 'bytes=5000-'
+    assert 'Range' not in server.requests[1]
+
+
+def test_no_accept_ranges_restarts_without_range(api):
+    payload = _payload()
+    server = _use(api, FakeServer(payload, accept_ranges=False, interrupt=[5000]))
+
+    assert api.get_full_content(BOOK_ID) == _expected(payload)
+    assert [r.get('Range') for r in server.requests] == [None, None]
+
+
+def test_range_not_satisfiable_uses_spooled_payload(api):
+    payload = _payload()
+    # 最后一块已落盘但连接在结束前断开：续传位置等于总长度，节点返回 416
+    server = _use(api, FakeServer(payload, interrupt=[len(payload)]))
+
+    assert api.get_full_content(BOOK_ID) == _expected(payload)
+    assert server.requests[1]['Range'] == f'bytes={len(payload)}-'
+
+
+def test_completed_payload_is_reused_until_cleared(api):
+    payload = _payload()
+    _use(api, FakeServer(payload))
+    assert api.get_full_content(BOOK_ID) == _expected(payload)
+
+    # 完成文件按 book_id 保留：再次下载不发请求，chapter_transform 照常应用
+    server = _use(api, FakeServer(payload))
+    transform = nd.process_chapter_content
+    assert api.get_full_content(BOOK_ID, chapter_transform=transform) == _expected(payload, transform)
+    assert server.requests == []
+
+    nd.clear_bulk_spool(BOOK_ID)
+    assert nd.load_completed_bulk(BOOK_ID) is None
+    assert api.get_full_content(BOOK_ID) == _expected(payload)
+    assert len(server.requests) == 1
@@ -0,0 +1,98 @@
+"""ChapterCache：容量预算下按最近访问时间淘汰"""
+
+import random
+import string
+
+import pytest
+
+import novel_downloader as nd
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def tick(self):
+        self.now += 1
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(nd.time, 'time', clock)
+    return clock
+
+
+def _content(seed: int, size: int = 1000) -> str:
+    # 不可压缩的正文，使每条记录占用的大小可预期
+    rnd = random.Random(seed)
+    return ''.join(rnd.choice(string.ascii_letters) for _ in range(size))
+
+
+def _open(tmp_path, max_bytes):
+    return nd.ChapterCache(str(tmp_path / 'chapters.db'), max_bytes=max_bytes, compress_level=0)
+
+
+def test_eviction_removes_least_recently_accessed_first(tmp_path, clock):
+    cache = _open(tmp_path, max_bytes=10 * 1100)
+    for i in range(10):
+        clock.tick()
+        cache.put(str(i), _content(i))
+    assert cache.stats()['chapters'] == 10
+
+    # 读取会刷新访问时间：0 号虽然最早写入，但最近被访问过
+    clock.tick()
+    assert cache.get('0') == _content(0)
+    clock.tick()
+    cache.put('10', _content(10))
+
+    stats = cache.stats()
+    assert stats['bytes'] <= cache.max_bytes * cache.EVICT_TARGET
+    kept = set(cache.get_many([str(i) for i in range(11)]))
+    evicted = {str(i) for i in range(11)} - kept
+    # 淘汰从最久未访问的 1、2 号开始，最近访问与最新写入的条目保留
+    assert evicted
+    assert evicted == {str(i) for i in range(1, len(evicted) + 1)}
+    assert {'0', '10'} <= kept
+    cache.close()
+
+
+def test_total_size_survives_overwrite_and_reopen(tmp_path, clock):
+    cache = _open(tmp_path, max_bytes=0)  # 0 表示不限容量
+    for _ in range(3):
+        clock.tick()
+        cache.put('1', _content(1))
+    cache.put_many({str(i): _content(i) for i in range(2, 5)})
+    total = cache.stats()['bytes']
+    assert cache.stats()['chapters'] == 4
+    cache.close()
+
+    reopened = _open(tmp_path, max_bytes=0)
+    assert reopened.stats()['bytes'] == total
+    cache_rows = reopened._conn.execute("SELECT SUM(size) FROM chapters").fetchone()[0]
+    assert cache_rows == total
+    reopened.close()
+
+
+def test_budget_applies_to_batches(tmp_path, clock):
+    cache = _open(tmp_path, max_bytes=5 * 1100)
+    clock.tick()
+    cache.put_many({str(i): _content(i) for i in range(20)})
+
+    assert cache.stats()['bytes'] <= cache.max_bytes
+    assert cache.stats()['chapters'] <= 5
+    cache.close()
+
+
+def test_discard_and_missing_entries(tmp_path, clock):
+    cache = _open(tmp_path, max_bytes=0)
+    cache.put_many({'1': 'a', '2': 'b', '3': '   '})
+    assert cache.get_many(['1', '2', '3', '4']) == {'1': 'a', '2': 'b'}
+    cache.discard(['1'])
+    assert cache.get('1') is None
+    assert cache.get('2') == 'b'
+    cache.close()
@@ -0,0 +1,93 @@
+"""process_chapter_content 与原九遍正则实现的等价性检查与吞吐基准
+
+吞吐基准默认跳过；设置环境变量 FANQIE_BENCHMARK=1 后运行：
+
+    FANQIE_BENCHMARK=1 python -m pytest -q -s tests/test_chapter_content.py
+"""
+
+import os
+import random
+import re
+import time
+
+import pytest
+
+import novel_downloader as nd
+
+
+def _reference_process_chapter_content(content):
+    """原实现（冻结副本，作为对照）"""
+    if not content:
+        return ""
+    content = re.sub(r'<br\s*/?>\s*', '\n', content)
+    content = re.sub(r'<p[^>]*>\s*', '\n', content)
+    content = re.sub(r'</p>\s*', '\n', content)
+    content = re.sub(r'<[^>]+>', '', content)
+    content = re.sub(r'[ \t]+', ' ', content)
+    content = re.sub(r'\n[ \t]+', '\n', content)
+    content = re.sub(r'[ \t]+\n', '\n', content)
+    content = re.sub(r'\n{3,}', '\n\n', content)
+    paragraphs = [line.strip() for line in content.split('\n') if line.strip()]
+    return '\n\n'.join(paragraphs)
+
+
+_FRAGMENTS = ['<', '>', 'br', '<br', '<br/>', '<br />', '<BR>', '<p>', '<p class="x">', '</p>', '<pre>', '</b>',
+              '<b>', '<>', 'p', '/', ' ', '  ', '\t', '\n', '\r', '　', '\xa0', ' ', 'a', '字', '。',
+              '\n\n\n', ' \t ']
+
+_HANZI = '的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种，。！？“”'
+
+
+def _golden_corpus(seed=1):
+    """贴近接口返回的章节：<p idx> 段落、全角缩进、<br/>、偶尔的行内标签与多余空白，外加纯文本章节"""
+    rnd = random.Random(seed)
+
+    def para(i):
+        body = ''.join(rnd.choice(_HANZI) for _ in range(rnd.randint(40, 160)))
+        if rnd.random() < 0.1:
+            body = body[:20] + '<span class="em">' + body[20:30] + '</span>' + body[30:]
+        if rnd.random() < 0.1:
+            body += '  \t '
+        return f'<p idx="{i}">　　{body}</p>' + ('<br/>\n' if rnd.random() < 0.2 else '')
+
+    corpus = [''.join(para(i) for i in range(rnd.randint(30, 90))) for _ in range(400)]
+    corpus += ['\n'.join('　　' + ''.join(rnd.choice(_HANZI) for _ in range(100)) for _ in range(50))
+               for _ in range(100)]
+    return corpus
+
+
+def test_fragment_fuzz_matches_reference():
+    rnd = random.Random(20240522)
+    for _ in range(30000):
+        content = ''.join(rnd.choice(_FRAGMENTS) for _ in range(rnd.randint(0, 25)))
+        assert nd.process_chapter_content(content) == _reference_process_chapter_content(content), content
+
+
+def test_golden_corpus_matches_reference():
+    for content in _golden_corpus():
+        assert nd.process_chapter_content(content) == _reference_process_chapter_content(content)
+
+
+def test_empty_content():
+    assert nd.process_chapter_content('') == ''
+    assert nd.process_chapter_content(None) == ''
+
+
+@pytest.mark.skipif(os.environ.get("FANQIE_BENCHMARK") != "1", reason="设置 FANQIE_BENCHMARK=1 运行基准")
+def test_throughput_vs_reference():
+    corpus = _golden_corpus()
+    mb = sum(len(c.encode('utf-8')) for c in corpus) / 1e6
+
+    def throughput(fn):
+        best = float('inf')
+        for _ in range(5):
+            t0 = time.perf_counter()
+            for content in corpus:
+                fn(content)
+            best = min(best, time.perf_counter() - t0)
+        return mb / best
+
+    old = throughput(_reference_process_chapter_content)
+    new = throughput(nd.process_chapter_content)
+    print(f"\n{len(corpus)} 章 ({mb:.1f} MB)  原实现 {old:6.1f} MB/s  当前 {new:6.1f} MB/s")
+    assert new > old
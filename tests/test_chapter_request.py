@@ -0,0 +1,72 @@
+"""APIManager.get_chapter_content 的逐接口回退：用假会话模拟各类网络错误"""
+
+import pytest
+import requests
+
+import novel_downloader as nd
+
+NODE = 'http://node.test'
+OK_PAYLOAD = {'code': 200, 'data': {'content': '正文'}}
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+class FakeSession:
+    """按顺序返回预设响应或抛出预设异常，并记录请求的 URL"""
+
+    def __init__(self, results):
+        self.results = list(results)
+        self.urls = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+@pytest.fixture
+def api(monkeypatch):
+    monkeypatch.setitem(nd.CONFIG, 'chapter_cache_enabled', False)
+    monkeypatch.setitem(nd.CONFIG, 'adaptive_concurrency', False)
+    monkeypatch.setattr(nd, 'get_chapter_cache', lambda: None)
+    manager = nd.APIManager()
+    manager.health = nd.NodeHealthRegistry()
+    monkeypatch.setattr(nd.time, 'sleep', lambda _seconds: None)
+    return manager
+
+
+@pytest.mark.parametrize('error', [
+    requests.exceptions.ConnectionError('refused'),
+    requests.exceptions.ChunkedEncodingError('truncated'),
+    requests.exceptions.SSLError('handshake'),
+    requests.exceptions.ReadTimeout('slow'),
+])
+def test_request_error_falls_back_to_next_endpoint(api, error):
+    session = FakeSession([error, FakeResponse(200, OK_PAYLOAD)])
+    api._get_session = lambda: session
+    first = api._ranked_chapter_endpoints(NODE)[0]
+
+    assert api.get_chapter_content('1', NODE) == OK_PAYLOAD['data']
+    assert len(session.urls) == 2
+    # 出错的接口记为失败并进入冷却，不再排在首位
+    assert api.endpoint_selector.ranked(NODE)[0] != first
+
+
+def test_throttled_endpoint_backs_off_and_retries(api, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(nd.time, 'sleep', sleeps.append)
+    session = FakeSession([FakeResponse(429), FakeResponse(429), FakeResponse(200, OK_PAYLOAD)])
+    api._get_session = lambda: session
+
+    assert api.get_chapter_content('1', NODE) == OK_PAYLOAD['data']
+    assert sleeps == [1, 2]
+    assert len(set(session.urls)) == 1
@@ -0,0 +1,110 @@
+"""DownloadHistoryManager：旧版 JSON 迁移、分页与批量检查"""
+
+import json
+
+import pytest
+
+from web_app import DownloadHistoryManager
+
+
+def _record(i: int, save_path: str = '') -> dict:
+    return {
+        'book_id': str(i),
+        'book_name': f'书{i}',
+        'author': '作者',
+        'download_time': f'2024-01-01T00:{i // 60:02d}:{i % 60:02d}',
+        'save_path': save_path,
+        'file_format': 'txt',
+        'chapter_count': i,
+    }
+
+
+@pytest.fixture
+def open_manager(tmp_path):
+    managers = []
+
+    def _open():
+        manager = DownloadHistoryManager(str(tmp_path))
+        managers.append(manager)
+        return manager
+
+    yield _open
+    for manager in managers:
+        manager._conn.close()
+
+
+def _write_legacy(tmp_path, data):
+    path = tmp_path / DownloadHistoryManager.HISTORY_FILE
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding='utf-8')
+    return path
+
+
+def test_json_history_is_migrated_once(tmp_path, open_manager):
+    existing = tmp_path / 'book.txt'
+    existing.write_text('x', encoding='utf-8')
+    legacy = _write_legacy(tmp_path, {'records': {
+        '1': _record(1, str(existing)),
+        '2': _record(2, str(tmp_path / 'missing.txt')),
+    }})
+
+    manager = open_manager()
+    assert not legacy.exists()
+    assert (tmp_path / (DownloadHistoryManager.HISTORY_FILE + '.migrated')).exists()
+    records = {r['book_id']: r for r in manager.get_all_records()}
+    assert records['1']['book_name'] == '书1' and records['1']['file_exists'] is True
+    assert records['2']['chapter_count'] == 2 and records['2']['file_exists'] is False
+
+    # 迁移后删除的记录在重新打开时不会再被导入
+    assert manager.remove_record('1')
+    assert [r['book_id'] for r in open_manager().get_all_records()] == ['2']
+
+
+def test_legacy_format_without_records_wrapper(tmp_path, open_manager):
+    record = _record(3)
+    del record['book_id']
+    _write_legacy(tmp_path, {'3': record})
+
+    assert open_manager().check_exists('3')['book_name'] == '书3'
+
+
+def test_corrupted_json_is_backed_up(tmp_path, open_manager):
+    legacy = tmp_path / DownloadHistoryManager.HISTORY_FILE
+    legacy.write_text('{"records": ', encoding='utf-8')
+
+    assert open_manager().get_all_records() == []
+    assert not legacy.exists()
+    assert (tmp_path / (DownloadHistoryManager.HISTORY_FILE + '.bak')).exists()
+
+
+def test_pagination_totals_and_order(tmp_path, open_manager):
+    _write_legacy(tmp_path, {'records': {str(i): _record(i) for i in range(25)}})
+    manager = open_manager()
+
+    page, total = manager.get_records(offset=0, limit=10)
+    assert total == 25
+    assert [r['book_id'] for r in page] == [str(i) for i in range(24, 14, -1)]
+
+    page, total = manager.get_records(offset=20, limit=10)
+    assert total == 25
+    assert [r['book_id'] for r in page] == ['4', '3', '2', '1', '0']
+
+    page, total = manager.get_records(offset=30, limit=10)
+    assert (page, total) == ([], 25)
+    assert len(manager.get_records()[0]) == 25
+
+
+def test_check_batch_queries_in_chunks_of_500(tmp_path, open_manager):
+    _write_legacy(tmp_path, {'records': {str(i): _record(i) for i in range(0, 1200, 2)}})
+    manager = open_manager()
+    statements = []
+    manager._conn.set_trace_callback(statements.append)
+
+    ids = [str(i) for i in range(1203)]
+    result = manager.check_batch(ids)
+
+    assert list(result) == ids
+    assert all((result[str(i)] is not None) == (i % 2 == 0 and i < 1200) for i in range(1203))
+    selects = [s for s in statements if s.lstrip().upper().startswith('SELECT')]
+    assert len(selects) == 3
+    assert manager.check_batch([]) == {}
+    assert manager.check_exists(1198)['book_id'] == '1198'
@@ -0,0 +1,116 @@
+"""StreamingEpubWriter 与原 ebooklib 实现的构建耗时 / 峰值内存对比
+
+基准较慢，默认跳过；设置环境变量 FANQIE_BENCHMARK=1 后运行：
+
+    FANQIE_BENCHMARK=1 python -m pytest -q -s tests/test_epub_benchmark.py
+"""
+
+import os
+import time
+import tracemalloc
+import zipfile
+
+import pytest
+
+import novel_downloader as nd
+from locales import t
+
+pytestmark = pytest.mark.skipif(os.environ.get("FANQIE_BENCHMARK") != "1",
+                                reason="设置 FANQIE_BENCHMARK=1 运行基准")
+
+CHAPTER_COUNT = 5000
+
+
+def _make_chapters(count=CHAPTER_COUNT):
+    para = '这是一段用于测试的正文内容，' * 20
+    return [{'title': f'第{i + 1}章 测试章节', 'content': '\n\n'.join(f'{para}{j}' for j in range(10))}
+            for i in range(count)]
+
+
+def _create_epub_with_ebooklib(name, author_name, description, chapters, epub_path):
+    """原 create_epub 的 ebooklib 实现（去掉封面下载），作为对照"""
+    epub = pytest.importorskip("ebooklib.epub")
+    book = epub.EpubBook()
+    book.set_identifier(f'fanqie_{int(time.time())}')
+    book.set_title(name)
+    book.set_language('zh-CN')
+    if author_name:
+        book.add_author(author_name)
+    if description:
+        book.add_metadata('DC', 'description', description)
+
+    spine_items = ['nav']
+    toc_items = []
+
+    intro_html = f'<h1>{name}</h1>'
+    if author_name:
+        intro_html += f'<p><strong>作者：</strong> {author_name}</p>'
+    if description:
+        intro_html += '<hr/>'
+        intro_html += f'<h3>{t("dl_intro_title")}</h3>'
+        for line in description.split('\n'):
+            if line.strip():
+                intro_html += f'<p>{line.strip()}</p>'
+    intro_chapter = epub.EpubHtml(title=t('dl_book_detail_title'), file_name='intro.xhtml', lang='zh-CN')
+    intro_chapter.content = intro_html
+    book.add_item(intro_chapter)
+    spine_items.append(intro_chapter)
+    toc_items.append(intro_chapter)
+
+    for idx, ch_data in enumerate(chapters):
+        title = ch_data.get('title', f'第{idx + 1}章')
+        content = ch_data.get('content', '')
+        paragraphs = content.split('\n\n') if content else []
+        html_paragraphs = ''.join(f'<p>{p.strip()}</p>' for p in paragraphs if p.strip())
+        chapter = epub.EpubHtml(title=title, file_name=f'chapter_{idx + 1}.xhtml', lang='zh-CN')
+        chapter.content = f'<h1>{title}</h1><div>{html_paragraphs}</div>'
+        book.add_item(chapter)
+        spine_items.append(chapter)
+        toc_items.append(chapter)
+
+    book.toc = toc_items
+    book.spine = spine_items
+    book.add_item(epub.EpubNcx())
+    book.add_item(epub.EpubNav())
+    epub.write_epub(epub_path, book)
+    return epub_path
+
+
+def _create_epub_streaming(name, author_name, description, chapters, epub_path):
+    writer = nd.StreamingEpubWriter(epub_path, name, author_name, description, '', range(len(chapters)))
+    for i, ch in enumerate(chapters):
+        writer.add(i, ch['title'], ch['content'])
+    return writer.finish()
+
+
+def _measure(builder, chapters, epub_path):
+    """返回 (耗时秒, Python 分配峰值 MB)"""
+    tracemalloc.start()
+    try:
+        t0 = time.perf_counter()
+        builder('基准书', '作者', '简介', chapters, epub_path)
+        elapsed = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024
+
+
+def test_streaming_epub_vs_ebooklib(tmp_path):
+    pytest.importorskip("ebooklib")
+    chapters = _make_chapters()
+    results = {}
+    for label, builder in (('ebooklib', _create_epub_with_ebooklib), ('streaming', _create_epub_streaming)):
+        path = str(tmp_path / f'{label}.epub')
+        elapsed, peak = _measure(builder, chapters, path)
+        results[label] = (elapsed, peak)
+        with zipfile.ZipFile(path) as zf:
+            assert zf.testzip() is None
+            names = set(zf.namelist())
+        assert 'EPUB/chapter_1.xhtml' in names
+        assert f'EPUB/chapter_{CHAPTER_COUNT}.xhtml' in names
+        print(f"\n{label:10s} {CHAPTER_COUNT} 章  耗时 {elapsed:6.2f}s  峰值 {peak:7.1f} MB  "
+              f"大小 {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+
+    # 流式写入只保留标题列表与乱序窗口，峰值内存应明显低于整本书驻留内存的 ebooklib
+    assert results['streaming'][1] < results['ebooklib'][1] / 2
@@ -0,0 +1,55 @@
+"""StreamingEpubWriter 生成的 EPUB 结构"""
+
+import re
+import zipfile
+
+import pytest
+
+import novel_downloader as nd
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 2000
+
+
+def _build(tmp_path, cover_url='', chapters=3, **kwargs):
+    path = str(tmp_path / 'book.epub')
+    writer = nd.StreamingEpubWriter(path, '书名', '作者', '简介', cover_url, range(chapters), **kwargs)
+    # 乱序到达也按章节顺序写入
+    for i in reversed(range(chapters)):
+        writer.add(i, f'第{i + 1}章 标题', f'第一段 {i}\n\n第二段 <b>&</b>')
+    return writer.finish()
+
+
+def _spine(zf):
+    opf = zf.read('EPUB/content.opf').decode('utf-8')
+    return re.findall(r'<itemref idref="([^"]+)"', opf)
+
+
+@pytest.fixture
+def cover(monkeypatch):
+    monkeypatch.setattr(nd, 'download_cover', lambda url, headers: (PNG, '.png', 'image/png'))
+
+
+def test_container_layout_and_spine_order(tmp_path):
+    with zipfile.ZipFile(_build(tmp_path)) as zf:
+        first = zf.infolist()[0]
+        assert (first.filename, first.compress_type) == ('mimetype', zipfile.ZIP_STORED)
+        assert zf.read('mimetype') == b'application/epub+zip'
+        assert _spine(zf) == ['nav', 'chapter_0', 'chapter_1', 'chapter_2', 'chapter_3']
+        chapter = zf.read('EPUB/chapter_2.xhtml').decode('utf-8')
+        assert '第2章 标题' in chapter and '&lt;b&gt;&amp;&lt;/b&gt;' in chapter
+        assert 'cover.xhtml' not in zf.namelist()
+
+
+def test_cover_page_opens_first(tmp_path, cover):
+    with zipfile.ZipFile(_build(tmp_path, cover_url='http://cover.test/c.png')) as zf:
+        opf = zf.read('EPUB/content.opf').decode('utf-8')
+        assert zf.read('EPUB/cover.png') == PNG
+        assert 'properties="cover-image"' in opf
+        assert _spine(zf)[:2] == ['cover', 'nav']
+
+
+def test_grouped_chapters_share_files(tmp_path):
+    with zipfile.ZipFile(_build(tmp_path, chapters=5, chapters_per_file=2)) as zf:
+        assert _spine(zf) == ['nav', 'chapter_0', 'chapter_1', 'chapter_2', 'chapter_3']
+        nav = zf.read('EPUB/nav.xhtml').decode('utf-8')
+        assert 'href="chapter_2.xhtml#c4"' in nav
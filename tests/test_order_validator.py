@@ -0,0 +1,180 @@
+"""ChapterOrderValidator 一次线性扫描与原逐项集合运算实现的等价性检查
+
+随机生成目录（从 0 连续、带偏移、打乱抽样的不连续目录、含负索引）与下载结果
+（含负索引、超出目录范围的索引、空结果），逐项比对各报告与日志输出。
+"""
+
+import random
+import re
+from typing import List
+
+import pytest
+
+import novel_downloader as nd
+from locales import t
+
+
+# ---- 原实现（冻结副本，作为对照） ----
+
+class _ReferenceValidator:
+    def __init__(self, expected_chapters: List[dict]):
+        self.expected_chapters = expected_chapters
+
+    def validate_order(self, chapter_results: dict) -> dict:
+        result = {'is_valid': True, 'gaps': [], 'out_of_order': [], 'duplicates': []}
+        if not chapter_results:
+            return result
+        indices = sorted(chapter_results.keys())
+        expected_indices = set(range(len(self.expected_chapters)))
+        result['gaps'] = sorted(expected_indices - set(indices))
+        for i in range(1, len(indices)):
+            if indices[i] != indices[i - 1] + 1:
+                result['out_of_order'].append((indices[i - 1], indices[i]))
+        if result['gaps'] or result['out_of_order'] or result['duplicates']:
+            result['is_valid'] = False
+        return result
+
+    def verify_sequential(self, chapter_results: dict) -> dict:
+        if not chapter_results:
+            return {'is_sequential': True, 'missing_count': 0, 'missing_indices': []}
+        indices = sorted(chapter_results.keys())
+        missing = sorted(set(range(indices[0], indices[-1] + 1)) - set(indices))
+        return {'is_sequential': not missing, 'missing_count': len(missing), 'missing_indices': missing}
+
+    def map_text_parsed_content(self, parsed_chapters: List[dict], catalog: List[dict]) -> dict:
+        result = {}
+        title_to_index = {}
+        for ch in catalog:
+            title_to_index[ch.get('title', '').strip()] = ch.get('index', 0)
+        for parsed_ch in parsed_chapters:
+            parsed_title = parsed_ch.get('title', '').strip()
+            if parsed_title in title_to_index:
+                result[title_to_index[parsed_title]] = {'title': parsed_title,
+                                                        'content': parsed_ch.get('content', '')}
+            else:
+                clean_parsed = re.sub(r'[\s　]+', '', parsed_title)
+                for cat_title, idx in title_to_index.items():
+                    if clean_parsed == re.sub(r'[\s　]+', '', cat_title):
+                        result[idx] = {'title': cat_title, 'content': parsed_ch.get('content', '')}
+                        break
+        return result
+
+    def get_validation_summary(self, chapter_results: dict) -> str:
+        validation = self.validate_order(chapter_results)
+        sequential = self.verify_sequential(chapter_results)
+        lines = []
+        if validation['is_valid'] and sequential['is_sequential']:
+            lines.append("✓ 章节顺序验证通过")
+        else:
+            if validation['gaps']:
+                lines.append(f"⚠ 缺失章节: {len(validation['gaps'])} 个")
+            if validation['out_of_order']:
+                lines.append(f"⚠ 顺序异常: {len(validation['out_of_order'])} 处")
+            if sequential['missing_indices']:
+                lines.append(f"⚠ 索引不连续: 缺失 {sequential['missing_count']} 个")
+        return '\n'.join(lines) if lines else "章节顺序正常"
+
+
+def _reference_analyze(chapter_results: dict, expected_chapters: list, log) -> dict:
+    result = {'total_expected': 0, 'total_downloaded': len(chapter_results), 'missing_indices': [],
+              'order_correct': True, 'completeness_percent': 100.0}
+    if not chapter_results:
+        log(t("dl_analyze_no_chapters"))
+        result['completeness_percent'] = 0
+        return result
+    downloaded_indices = set(chapter_results.keys())
+    if expected_chapters:
+        expected_indices = set(ch['index'] for ch in expected_chapters)
+        result['total_expected'] = len(expected_indices)
+        missing_indices = expected_indices - downloaded_indices
+        result['missing_indices'] = sorted(missing_indices)
+        if missing_indices:
+            log(t("dl_analyze_summary", len(expected_indices), len(downloaded_indices), len(missing_indices)))
+            if len(missing_indices) <= 10:
+                missing_titles = [f"{t('dl_chapter_title', ch['index'] + 1)}: {ch['title']}"
+                                  for ch in expected_chapters if ch['index'] in missing_indices]
+                log(t("dl_analyze_missing", ', '.join(missing_titles[:5])))
+        else:
+            log(t("dl_analyze_pass", len(expected_indices)))
+    else:
+        result['total_expected'] = len(chapter_results)
+        sorted_indices = sorted(downloaded_indices)
+        missing_in_range = set(range(sorted_indices[0], sorted_indices[-1] + 1)) - downloaded_indices
+        if missing_in_range:
+            result['missing_indices'] = sorted(missing_in_range)
+            log(t("dl_analyze_gap", sorted(missing_in_range)[:10]))
+    sorted_indices = sorted(chapter_results)
+    order_issues = [(a, b) for a, b in zip(sorted_indices, sorted_indices[1:]) if b != a + 1]
+    if order_issues:
+        result['order_correct'] = False
+        log(t("dl_analyze_order_fail", len(order_issues), sum(b - a - 1 for a, b in order_issues)))
+    else:
+        log(t("dl_analyze_order_pass"))
+    if result['total_expected'] > 0:
+        result['completeness_percent'] = (result['total_downloaded'] / result['total_expected']) * 100
+    return result
+
+
+# ---- 随机语料 ----
+
+def _random_case(rnd: random.Random):
+    n = rnd.randint(0, 60)
+    base = rnd.choice([0, 0, 0, 5, -3])
+    expected = [{'id': str(i), 'title': rnd.choice([f'第{i}章 a', f' 第 {i} 章', 'x y', 'xy']), 'index': base + i}
+                for i in range(n)]
+    if rnd.random() < 0.3:
+        # 不连续目录：打乱后抽取一半
+        expected = rnd.sample(expected, len(expected) // 2)
+    low, high = min(0, base) - 3, max(0, base) + n + 5
+    if rnd.random() < 0.9:
+        picked = rnd.sample(range(low, high), rnd.randint(0, high - low))
+        results = {i: {'title': 't', 'content': 'c'} for i in picked}
+    else:
+        results = {}
+    return expected, results
+
+
+@pytest.fixture(scope='module')
+def cases():
+    rnd = random.Random(20240524)
+    return [_random_case(rnd) for _ in range(3000)]
+
+
+def test_reports_match_reference(cases):
+    for expected, results in cases:
+        validator = nd.ChapterOrderValidator(expected)
+        reference = _ReferenceValidator(expected)
+        assert validator.validate_order(results) == reference.validate_order(results), (expected, results)
+        assert validator.verify_sequential(results) == reference.verify_sequential(results), (expected, results)
+        assert validator.get_validation_summary(results) == reference.get_validation_summary(results)
+
+
+def test_completeness_matches_reference(cases):
+    for expected, results in cases:
+        for catalog in (expected, None):
+            got_logs, want_logs = [], []
+            got = nd.analyze_download_completeness(results, catalog, lambda m, p=-1: got_logs.append(m))
+            want = _reference_analyze(results, catalog, want_logs.append)
+            assert got == want, (catalog, results)
+            # 缺失章节的标题按目录顺序列出，目录本身按索引排序时日志应逐字一致
+            indices = [ch['index'] for ch in catalog or []]
+            if indices == sorted(indices):
+                assert got_logs == want_logs
+
+
+def test_set_of_indices_matches_dict(cases):
+    # Run 只传已下载索引的集合，结果应与传入完整结果字典一致
+    for expected, results in cases[:500]:
+        validator = nd.ChapterOrderValidator(expected)
+        assert validator.analyze(set(results)) == validator.analyze(results)
+
+
+def test_text_parsed_mapping_matches_reference():
+    rnd = random.Random(11)
+    for _ in range(500):
+        expected, _ = _random_case(rnd)
+        parsed = [{'title': rnd.choice([c['title'], c['title'].replace(' ', ''), ' z ', 'x  y', 'x　y']),
+                   'content': str(i)} for i, c in enumerate(expected)]
+        validator = nd.ChapterOrderValidator(expected)
+        assert validator.map_text_parsed_content(parsed, expected) == \
+            _ReferenceValidator(expected).map_text_parsed_content(parsed, expected)
@@ -0,0 +1,104 @@
+"""StateStore.gc：按最久未修改淘汰整本书的状态，正在下载的书永不淘汰"""
+
+import os
+import time
+
+import pytest
+
+import novel_downloader as nd
+
+HOUR = 3600
+
+
+def _write(directory, name: str, size: int, age: float):
+    path = os.path.join(directory, name)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+@pytest.fixture
+def store(tmp_path):
+    return nd.StateStore(str(tmp_path))
+
+
+def _books(tmp_path, ages):
+    """每本书一个 1000 字节的章节日志和一个 500 字节的续传文件"""
+    for book_id, age in ages.items():
+        _write(tmp_path, f'.download_journal_{book_id}.jsonl', 1000, age)
+        _write(tmp_path, f'.bulk_{book_id}_abc.part', 500, age + 10)
+
+
+def _present(tmp_path):
+    return set(os.listdir(tmp_path))
+
+
+def test_over_budget_evicts_oldest_books_first(tmp_path, store):
+    _books(tmp_path, {'1': 5 * HOUR, '2': 4 * HOUR, '3': 3 * HOUR, '4': 2 * HOUR})
+
+    result = store.gc(budget_bytes=3200, max_age=0)
+
+    assert result['removed'] == ['1', '2']
+    assert result['freed_bytes'] == 3000
+    assert result['total_bytes'] == 3000
+    assert not any(name.endswith(('_1.jsonl', '_2.jsonl')) for name in _present(tmp_path))
+    assert '.download_journal_3.jsonl' in _present(tmp_path)
+
+
+def test_active_download_is_never_evicted(tmp_path, store):
+    _books(tmp_path, {'1': 5 * HOUR, '2': 4 * HOUR, '3': 3 * HOUR})
+
+    with store.active('1'):
+        assert any(name.startswith('.active_1.') for name in _present(tmp_path))
+        result = store.gc(budget_bytes=1, max_age=1)
+
+    assert result['removed'] == ['2', '3']
+    assert '.download_journal_1.jsonl' in _present(tmp_path)
+    assert not any(name.startswith('.active_1.') for name in _present(tmp_path))
+
+
+def test_marker_from_live_process_protects_book(tmp_path, store, monkeypatch):
+    _books(tmp_path, {'1': 5 * HOUR, '2': 4 * HOUR})
+    _write(tmp_path, '.active_1.424242', 6, 5 * HOUR)
+    _write(tmp_path, '.active_2.535353', 6, 5 * HOUR)
+    monkeypatch.setattr(nd, '_pid_alive', lambda pid: pid == 424242)
+
+    result = store.gc(budget_bytes=1, max_age=0)
+
+    # 活着的进程仍在下载 1 号书；2 号书的标记属于已退出的进程，随书一起清除
+    assert result['removed'] == ['2']
+    assert {'.active_1.424242', '.download_journal_1.jsonl'} <= _present(tmp_path)
+    assert '.active_2.535353' not in _present(tmp_path)
+
+
+def test_unknown_process_marker_expires(tmp_path, store, monkeypatch):
+    _books(tmp_path, {'1': 2 * 24 * HOUR, '2': 2 * 24 * HOUR})
+    _write(tmp_path, '.active_1.11', 6, 2 * HOUR)
+    _write(tmp_path, '.active_2.22', 6, 2 * 24 * HOUR)
+    monkeypatch.setattr(nd, '_pid_alive', lambda pid: None)
+
+    result = store.gc(budget_bytes=0, max_age=24 * HOUR)
+
+    assert result['removed'] == ['2']
+
+
+def test_recent_writes_count_as_active(tmp_path, store):
+    _books(tmp_path, {'1': 5 * HOUR, '2': 60})
+
+    result = store.gc(budget_bytes=1, max_age=1)
+
+    assert result['removed'] == ['1']
+    assert '.download_journal_2.jsonl' in _present(tmp_path)
+
+
+def test_expired_books_removed_even_under_budget(tmp_path, store):
+    _books(tmp_path, {'1': 10 * 24 * HOUR, '2': 3 * HOUR})
+    _write(tmp_path, 'unrelated.txt', 10, 10 * 24 * HOUR)
+
+    result = store.gc(budget_bytes=10 ** 9, max_age=7 * 24 * HOUR)
+
+    assert result['removed'] == ['1']
+    assert 'unrelated.txt' in _present(tmp_path)
+    assert store.usage()['books'][0]['book_id'] == '2'
@@ -0,0 +1,137 @@
+"""parse_novel_text_with_catalog 与原逐标题正则实现的等价性检查
+
+随机生成目录与整本文本（含精确标题行、只含核心标题的行、重复/空标题、\r 与全角空白），
+分别走 str.find 路径与 Aho-Corasick 路径，结果必须与原实现逐项一致。
+"""
+
+import random
+import re
+from typing import Dict, List, Optional
+
+import pytest
+
+import novel_downloader as nd
+
+
+# ---- 原实现（冻结副本，作为对照） ----
+
+def _reference_extract_title_core(title: str) -> str:
+    s = re.sub(r'^(第[0-9一二三四五六七八九十百千]+章[、,，\s]*)', '', title)
+    s = re.sub(r'^(\d+[、,，.\s]+)', '', s)
+    return s.strip()
+
+
+def _reference_parse(text: str, catalog: List[Dict]) -> List[Dict]:
+    if not catalog:
+        return []
+
+    def find_title_in_text(title: str, search_text: str) -> Optional[tuple]:
+        pattern = re.compile(r'^[ \t]*' + re.escape(title) + r'[ \t]*$', re.MULTILINE)
+        match = pattern.search(search_text)
+        if match:
+            return (match.start(), match.end())
+        title_core = _reference_extract_title_core(title)
+        if title_core and len(title_core) >= 2:
+            pattern = re.compile(r'^[^\n]*' + re.escape(title_core) + r'[^\n]*$', re.MULTILINE)
+            match = pattern.search(search_text)
+            if match:
+                return (match.start(), match.end())
+        return None
+
+    chapter_positions = []
+    for ch in catalog:
+        result = find_title_in_text(ch['title'], text)
+        if result:
+            chapter_positions.append({
+                'title': ch['title'],
+                'id': ch.get('id', ''),
+                'index': ch['index'],
+                'line_start': result[0],
+                'start': result[1],
+            })
+    if not chapter_positions:
+        return []
+
+    chapter_positions.sort(key=lambda x: x['line_start'])
+    chapters = []
+    for i, pos in enumerate(chapter_positions):
+        end = chapter_positions[i + 1]['line_start'] if i + 1 < len(chapter_positions) else len(text)
+        chapters.append({
+            'title': pos['title'],
+            'id': pos['id'],
+            'index': pos['index'],
+            'content': text[pos['start']:end].strip(),
+        })
+    chapters.sort(key=lambda x: x['index'])
+    return chapters
+
+
+# ---- 随机语料 ----
+
+_ALPHABET = ['第', '章', '1', '2', '一', ' ', '\t', '\n', '\n', '\n', '\r', '、', 'a', 'b', '.', '*', '(', '，', '　']
+
+
+def _random_case(rnd: random.Random):
+    def rs(n):
+        return ''.join(rnd.choice(_ALPHABET) for _ in range(n))
+
+    def rtitle():
+        k = rnd.random()
+        if k < 0.4:
+            return f"第{rnd.randint(1, 30)}章{rnd.choice(['', ' ', '、', '，'])}{rs(rnd.randint(0, 4)).replace(chr(10), '')}"
+        if k < 0.55:
+            return f"{rnd.randint(1, 30)}{rnd.choice(['、', '.', ' ', ','])}{rs(rnd.randint(0, 4))}"
+        if k < 0.6:
+            return ''
+        return rs(rnd.randint(1, 6))
+
+    titles = [rtitle() for _ in range(rnd.randint(1, 12))]
+    parts = []
+    for _ in range(rnd.randint(0, 14)):
+        if rnd.random() < 0.5:
+            title = rnd.choice(titles)
+            if rnd.random() >= 0.8:
+                title = _reference_extract_title_core(title) + rs(2)
+            parts.append(rnd.choice(['', ' ', '\t']) + title + rnd.choice(['', ' ', '\t', '\r']))
+        else:
+            parts.append(rs(rnd.randint(0, 20)))
+    text = rnd.choice(['', '\n']) + '\n'.join(parts) + rnd.choice(['', '\n'])
+    catalog = [{'title': title, 'id': str(i), 'index': i} for i, title in enumerate(titles)]
+    return text, catalog
+
+
+@pytest.fixture(params=[0, 10 ** 6], ids=['aho-corasick', 'str-find'])
+def search_path(request, monkeypatch):
+    """阈值为 0 时总是构建 Aho-Corasick 自动机，极大时总是逐标题 str.find"""
+    monkeypatch.setattr(nd, '_AHO_CORASICK_MIN_PATTERNS', request.param)
+    return request.param
+
+
+def test_random_corpus_matches_reference(search_path):
+    rnd = random.Random(20240521)
+    for _ in range(3000):
+        text, catalog = _random_case(rnd)
+        assert nd.parse_novel_text_with_catalog(text, catalog) == _reference_parse(text, catalog), (text, catalog)
+
+
+def test_large_catalog_matches_reference():
+    # 默认阈值下走 Aho-Corasick 路径：上千章，部分标题只在正文中以核心标题出现，部分缺失
+    rnd = random.Random(7)
+    catalog, lines = [], []
+    for i in range(1200):
+        title = f'第{i + 1}章 {"".join(rnd.choice("山河日月风云雪") for _ in range(3))}{i}'
+        catalog.append({'title': title, 'id': str(i), 'index': i})
+        r = rnd.random()
+        if r < 0.8:
+            lines.append(title)
+        elif r < 0.9:
+            lines.append(f'  {_reference_extract_title_core(title)}（修订）')
+        lines.extend('　　正文内容' * rnd.randint(1, 5) for _ in range(rnd.randint(1, 4)))
+    text = '\n'.join(lines)
+    assert len(catalog) >= nd._AHO_CORASICK_MIN_PATTERNS
+    assert nd.parse_novel_text_with_catalog(text, catalog) == _reference_parse(text, catalog)
+
+
+def test_empty_inputs():
+    assert nd.parse_novel_text_with_catalog('任意文本', []) == []
+    assert nd.parse_novel_text_with_catalog('', [{'title': '第1章', 'id': '1', 'index': 0}]) == []
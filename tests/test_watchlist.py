@@ -0,0 +1,25 @@
+"""WatchlistManager：书单修改的持久化"""
+
+from web_app import WatchlistManager
+
+
+def test_mutations_survive_reopen(tmp_path):
+    watchlist = WatchlistManager(str(tmp_path))
+    watchlist.add('1001')
+    watchlist.add('1002', book_name='旧书名')
+    watchlist.record_check('1002', serial_count=10, last_item_id='9')
+    watchlist.remove('1002')
+    # 批量添加时只有书籍ID，书名与作者由后台补充；这是最后一次修改，必须自行落盘
+    watchlist.set_info('1001', '书名', '作者')
+
+    reopened = WatchlistManager(str(tmp_path))
+    entry = reopened.get('1001')
+    assert (entry['book_name'], entry['author']) == ('书名', '作者')
+    assert reopened.get('1002') is None
+
+
+def test_set_info_ignores_unknown_book(tmp_path):
+    watchlist = WatchlistManager(str(tmp_path))
+    watchlist.set_info('404', '书名')
+    assert watchlist.get('404') is None
+    assert WatchlistManager(str(tmp_path)).get_all() == []
@@ -11,7 +11,10 @@ import queue
 import tempfile
 import subprocess
 import re
+import random
+import sqlite3
 import requests
+from typing import Optional, Tuple
 from locales import t
 from flask import Flask, render_template, request, jsonify, send_from_directory
 from flask_cors import CORS
@@ -79,6 +82,15 @@ def update_probed_cache(probed_results: list):
                 'error': result.get('error')
             }
 
+    # 探测结果作为节点健康度的初值（已有真实请求样本的节点不受影响）
+    try:
+        from novel_downloader import get_node_health_registry
+        registry = get_node_health_registry()
+        for base_url, info in PROBED_NODES_CACHE.items():
+            registry.seed(base_url, info.get('latency_ms'), info.get('available', False))
+    except Exception:
+        pass
+
 # 配置文件路径 - 保存到系统临时目录（跨平台兼容）
 TEMP_DIR = tempfile.gettempdir()
 CONFIG_FILE = os.path.join(TEMP_DIR, 'fanqie_novel_downloader_config.json')
@@ -405,10 +417,17 @@ class ChapterRangeParser:
 class DownloadHistoryManager:
     """管理下载历史记录
     
-    记录已下载的书籍信息，支持重复下载检测
+    记录已下载的书籍信息，支持重复下载检测。
+    记录保存在 SQLite 中（按 book_id 主键、download_time 索引），增删只改动单条记录；
+    旧版 JSON 历史文件在首次打开时自动迁移。文件是否存在的检查结果会缓存，
+    由后台线程定期刷新，列表与批量检查不再逐条访问磁盘。
     """
     
-    HISTORY_FILE = 'fanqie_download_history.json'
+    HISTORY_FILE = 'fanqie_download_history.json'  # 旧版 JSON 历史（仅用于迁移）
+    HISTORY_DB = 'fanqie_download_history.db'
+    EXISTS_REFRESH_INTERVAL = 60  # 文件存在性缓存的后台刷新间隔（秒）
+    
+    _COLUMNS = ('book_id', 'book_name', 'author', 'download_time', 'save_path', 'file_format', 'chapter_count')
     
     def __init__(self, history_dir: str = None):
         """
@@ -423,38 +442,93 @@ class DownloadHistoryManager:
             self.history_dir = os.path.expanduser('~')
         
         self.history_file = os.path.join(self.history_dir, self.HISTORY_FILE)
-        self.history = self._load_history()
-    
-    def _load_history(self) -> dict:
-        """从文件加载历史记录"""
-        if os.path.exists(self.history_file):
+        self.db_file = os.path.join(self.history_dir, self.HISTORY_DB)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_file, timeout=10, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            "book_id TEXT PRIMARY KEY, book_name TEXT, author TEXT, download_time TEXT, "
+            "save_path TEXT, file_format TEXT, chapter_count INTEGER)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_records_download_time ON records(download_time)")
+        self._conn.commit()
+        # 文件存在性缓存 {save_path: bool}
+        self._exists_cache = {}
+        self._exists_lock = threading.Lock()
+        self._refresher = None
+        self._migrate_json()
+    
+    def _migrate_json(self):
+        """把旧版 JSON 历史导入数据库，成功后重命名为 .migrated，不会重复导入"""
+        if not os.path.exists(self.history_file):
+            return
+        try:
+            with open(self.history_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, IOError):
+            # 文件损坏，备份后跳过
             try:
-                with open(self.history_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    # 验证格式
-                    if isinstance(data, dict) and 'records' in data:
-                        return data
-                    # 兼容旧格式
-                    return {'version': 1, 'records': data if isinstance(data, dict) else {}}
-            except (json.JSONDecodeError, IOError) as e:
-                # 文件损坏，备份并创建新的
-                backup_file = self.history_file + '.bak'
-                try:
-                    if os.path.exists(self.history_file):
-                        os.rename(self.history_file, backup_file)
-                except:
-                    pass
-                return {'version': 1, 'records': {}}
-        return {'version': 1, 'records': {}}
-    
-    def _save_history(self) -> bool:
-        """保存历史记录到文件"""
+                os.rename(self.history_file, self.history_file + '.bak')
+            except OSError:
+                pass
+            return
+        # 兼容旧格式（没有 records 外层）
+        records = data.get('records', data) if isinstance(data, dict) else {}
+        rows = []
+        for book_id, record in (records.items() if isinstance(records, dict) else []):
+            if isinstance(record, dict):
+                record = dict(record, book_id=str(record.get('book_id') or book_id))
+                rows.append(tuple(record.get(col) for col in self._COLUMNS))
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR IGNORE INTO records ({', '.join(self._COLUMNS)}) VALUES ({', '.join('?' * len(self._COLUMNS))})",
+                rows
+            )
+            self._conn.commit()
         try:
-            with open(self.history_file, 'w', encoding='utf-8') as f:
-                json.dump(self.history, f, ensure_ascii=False, indent=2)
-            return True
-        except IOError:
+            os.replace(self.history_file, self.history_file + '.migrated')
+        except OSError:
+            pass
+    
+    def _file_exists(self, path: str) -> bool:
+        """带缓存的文件存在性检查，首次查询时同步检查，之后由后台线程刷新"""
+        if not path:
             return False
+        with self._exists_lock:
+            cached = self._exists_cache.get(path)
+        if cached is None:
+            cached = os.path.exists(path)
+            with self._exists_lock:
+                self._exists_cache[path] = cached
+            self._start_refresher()
+        return cached
+    
+    def _start_refresher(self):
+        if self._refresher is None:
+            with self._exists_lock:
+                if self._refresher is None:
+                    self._refresher = threading.Thread(target=self._refresh_loop, daemon=True)
+                    self._refresher.start()
+    
+    def _refresh_loop(self):
+        """后台定期刷新文件存在性缓存"""
+        while True:
+            time.sleep(self.EXISTS_REFRESH_INTERVAL)
+            with self._exists_lock:
+                paths = list(self._exists_cache)
+            for path in paths:
+                exists = os.path.exists(path)
+                with self._exists_lock:
+                    if path in self._exists_cache:
+                        self._exists_cache[path] = exists
+    
+    def _to_record(self, row) -> dict:
+        record = {col: row[col] for col in self._COLUMNS}
+        record['chapter_count'] = record['chapter_count'] or 0
+        record['file_exists'] = self._file_exists(record.get('save_path') or '')
+        return record
     
     def add_record(self, book_id: str, book_name: str, author: str,
                    save_path: str, file_format: str, chapter_count: int = 0) -> bool:
@@ -474,18 +548,18 @@ class DownloadHistoryManager:
         """
         from datetime import datetime
         
-        record = {
-            'book_id': str(book_id),
-            'book_name': book_name,
-            'author': author,
-            'download_time': datetime.now().isoformat(),
-            'save_path': save_path,
-            'file_format': file_format,
-            'chapter_count': chapter_count
-        }
-        
-        self.history['records'][str(book_id)] = record
-        return self._save_history()
+        try:
+            with self._lock:
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO records ({', '.join(self._COLUMNS)}) VALUES ({', '.join('?' * len(self._COLUMNS))})",
+                    (str(book_id), book_name, author, datetime.now().isoformat(), save_path, file_format, chapter_count)
+                )
+                self._conn.commit()
+        except sqlite3.Error:
+            return False
+        with self._exists_lock:
+            self._exists_cache[save_path] = os.path.exists(save_path)
+        return True
     
     def check_exists(self, book_id: str) -> dict:
         """
@@ -497,20 +571,11 @@ class DownloadHistoryManager:
         Returns:
             如果存在返回记录详情，否则返回 None
         """
-        book_id = str(book_id)
-        record = self.history['records'].get(book_id)
-        
-        if record:
-            # 检查文件是否仍然存在
-            record = record.copy()
-            record['file_exists'] = os.path.exists(record.get('save_path', ''))
-            return record
-        
-        return None
+        return self.check_batch([book_id]).get(str(book_id))
     
     def check_batch(self, book_ids: list) -> dict:
         """
-        批量检查书籍是否已下载
+        批量检查书籍是否已下载（按 500 个一批查询）
         
         Args:
             book_ids: 书籍ID列表
@@ -518,22 +583,36 @@ class DownloadHistoryManager:
         Returns:
             {book_id: record_or_none, ...}
         """
-        result = {}
-        for book_id in book_ids:
-            result[str(book_id)] = self.check_exists(book_id)
+        ids = [str(book_id) for book_id in book_ids]
+        result = {book_id: None for book_id in ids}
+        with self._lock:
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT * FROM records WHERE book_id IN ({', '.join('?' * len(batch))})", batch
+                ).fetchall()
+                for row in rows:
+                    result[row['book_id']] = self._to_record(row)
         return result
     
+    def get_records(self, offset: int = 0, limit: int = None) -> tuple:
+        """
+        分页获取下载记录（按下载时间倒序）
+        
+        Returns:
+            (记录列表, 总数)
+        """
+        with self._lock:
+            total = self._conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+            rows = self._conn.execute(
+                "SELECT * FROM records ORDER BY download_time DESC LIMIT ? OFFSET ?",
+                (-1 if limit is None else int(limit), max(0, int(offset or 0)))
+            ).fetchall()
+            return [self._to_record(row) for row in rows], total
+    
     def get_all_records(self) -> list:
         """获取所有下载记录"""
-        records = []
-        for book_id, record in self.history['records'].items():
-            record_copy = record.copy()
-            record_copy['file_exists'] = os.path.exists(record.get('save_path', ''))
-            records.append(record_copy)
-        
-        # 按下载时间倒序排列
-        records.sort(key=lambda x: x.get('download_time', ''), reverse=True)
-        return records
+        return self.get_records()[0]
     
     def remove_record(self, book_id: str) -> bool:
         """
@@ -545,16 +624,17 @@ class DownloadHistoryManager:
         Returns:
             是否删除成功
         """
-        book_id = str(book_id)
-        if book_id in self.history['records']:
-            del self.history['records'][book_id]
-            return self._save_history()
-        return False
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM records WHERE book_id = ?", (str(book_id),))
+            self._conn.commit()
+            return cursor.rowcount > 0
     
     def clear_all(self) -> bool:
         """清空所有历史记录"""
-        self.history['records'] = {}
-        return self._save_history()
+        with self._lock:
+            self._conn.execute("DELETE FROM records")
+            self._conn.commit()
+        return True
 
 
 # 全局下载历史管理器实例
@@ -568,6 +648,358 @@ def get_download_history_manager() -> DownloadHistoryManager:
     return _download_history_manager
 
 
+class WatchlistManager:
+    """管理追更书单
+
+    与下载历史保存在同一目录，记录每本书上次检查到的章节数与最后一章 ID，
+    以及下次检查时间。检查调度由 WatchlistPoller 负责。
+    """
+
+    WATCHLIST_FILE = 'fanqie_watchlist.json'
+
+    def __init__(self, watchlist_dir: str = None):
+        """
+        Args:
+            watchlist_dir: 书单文件存储目录，默认与下载历史相同（用户目录）
+        """
+        self.watchlist_dir = watchlist_dir or os.path.expanduser('~')
+        self.watchlist_file = os.path.join(self.watchlist_dir, self.WATCHLIST_FILE)
+        self._lock = threading.RLock()
+        self.books = self._load()
+
+    def _load(self) -> dict:
+        """从文件加载书单"""
+        try:
+            if os.path.exists(self.watchlist_file):
+                with open(self.watchlist_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if isinstance(data, dict) and isinstance(data.get('books'), dict):
+                    return data['books']
+        except (json.JSONDecodeError, IOError):
+            pass
+        return {}
+
+    def _save(self) -> bool:
+        """保存书单（先写临时文件再替换，避免写入中断损坏书单）"""
+        tmp_file = self.watchlist_file + '.tmp'
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({'version': 1, 'books': self.books}, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_file, self.watchlist_file)
+            return True
+        except IOError:
+            return False
+
+    @staticmethod
+    def _interval() -> float:
+        """单本书的检查间隔（秒）"""
+        minutes = float((CONFIG or {}).get('watchlist_interval_minutes', 60) or 60)
+        return max(60.0, minutes * 60)
+
+    def add(self, book_id: str, book_name: str = '', author: str = '', file_format: str = 'txt',
+            save_path: str = '', auto_download: bool = True, chapter_count: int = 0) -> dict:
+        """
+        添加或更新追更书籍
+
+        Args:
+            chapter_count: 已知的章节数（如下载历史中的记录），为 0 时以首次检查结果为基准
+        """
+        book_id = str(book_id)
+        with self._lock:
+            entry = self.books.get(book_id) or {
+                'book_id': book_id,
+                'serial_count': int(chapter_count or 0) or None,
+                'last_item_id': None,
+                'last_checked': None,
+                'last_changed': None,
+                'errors': 0,
+                'pending': False,
+                # 新加入的书在一个检查间隔内随机分散，避免批量添加后集中请求
+                'next_check': time.time() + random.uniform(0, min(self._interval(), 300)),
+            }
+            entry.update({
+                'book_name': book_name or entry.get('book_name', ''),
+                'author': author or entry.get('author', ''),
+                'file_format': file_format or entry.get('file_format', 'txt'),
+                'save_path': save_path or entry.get('save_path', ''),
+                'auto_download': bool(auto_download),
+            })
+            self.books[book_id] = entry
+            self._save()
+            return dict(entry)
+
+    def remove(self, book_id: str) -> bool:
+        """移除追更书籍"""
+        with self._lock:
+            if self.books.pop(str(book_id), None) is None:
+                return False
+            return self._save()
+
+    def get_all(self) -> list:
+        """获取所有追更书籍（按下次检查时间排序）"""
+        with self._lock:
+            books = [dict(entry) for entry in self.books.values()]
+        books.sort(key=lambda x: x.get('next_check') or 0)
+        return books
+
+    def get(self, book_id: str) -> Optional[dict]:
+        with self._lock:
+            entry = self.books.get(str(book_id))
+            return dict(entry) if entry else None
+
+    def next_due(self, now: float = None) -> Tuple[Optional[dict], Optional[float]]:
+        """返回 (最早到期的书籍, 下一次到期时间)，没有到期的书籍时前者为 None"""
+        now = now or time.time()
+        with self._lock:
+            if not self.books:
+                return None, None
+            entry = min(self.books.values(), key=lambda x: x.get('next_check') or 0)
+            next_check = entry.get('next_check') or 0
+            return (dict(entry) if next_check <= now else None), next_check
+
+    def schedule_now(self, book_id: str = None):
+        """立即检查指定书籍（为空时检查全部），仍按请求预算逐本进行"""
+        now = time.time()
+        with self._lock:
+            for entry in self.books.values():
+                if book_id is None or entry['book_id'] == str(book_id):
+                    entry['next_check'] = now
+            self._save()
+
+    def record_check(self, book_id: str, serial_count: Optional[int] = None,
+                     last_item_id: Optional[str] = None, ok: bool = True) -> bool:
+        """
+        记录一次检查结果并安排下次检查
+
+        Returns:
+            是否检测到新章节（首次检查只建立基准，不视为更新）
+        """
+        now = time.time()
+        interval = self._interval()
+        with self._lock:
+            entry = self.books.get(str(book_id))
+            if entry is None:
+                return False
+            entry['last_checked'] = now
+            if not ok:
+                # 失败时指数退避，但不超过正常检查间隔
+                entry['errors'] = int(entry.get('errors') or 0) + 1
+                entry['next_check'] = now + min(interval, 60 * 2 ** min(entry['errors'], 10)) * random.uniform(0.8, 1.2)
+                self._save()
+                return False
+
+            entry['errors'] = 0
+            entry['next_check'] = now + interval * random.uniform(0.8, 1.2)
+            previous_count = entry.get('serial_count')
+            previous_last = entry.get('last_item_id')
+            changed = False
+            if serial_count is not None:
+                changed = previous_count is not None and serial_count > previous_count
+                entry['serial_count'] = serial_count
+            if last_item_id is not None:
+                changed = changed or (previous_last is not None and last_item_id != previous_last)
+                entry['last_item_id'] = last_item_id
+            if changed:
+                entry['last_changed'] = now
+                entry['pending'] = True
+            self._save()
+            return changed
+
+    def set_info(self, book_id: str, book_name: str, author: str = ''):
+        """补充书名与作者（批量添加时只有书籍ID）"""
+        with self._lock:
+            entry = self.books.get(str(book_id))
+            if entry is not None:
+                entry['book_name'] = book_name
+                entry['author'] = author or entry.get('author', '')
+                self._save()
+
+    def mark_downloaded(self, book_id: str, success: bool):
+        """下载队列处理完追更任务后调用，成功时清除待更新标记"""
+        with self._lock:
+            entry = self.books.get(str(book_id))
+            if entry is not None and success:
+                entry['pending'] = False
+                self._save()
+
+
+class WatchlistPoller:
+    """追更书单后台轮询器
+
+    在全局请求预算（watchlist_requests_per_minute）与单节点速率
+    （watchlist_node_requests_per_minute）内逐本检查，请求间隔带随机抖动，
+    500 本书的检查会分散在若干分钟内完成，而不是瞬间集中请求触发 429。
+    优先用书籍详情的 serial_count 判断更新，详情中没有章节数时再请求目录。
+    """
+
+    IDLE_SLEEP = 30.0
+
+    def __init__(self, manager: WatchlistManager, on_update):
+        """
+        Args:
+            manager: 追更书单
+            on_update: 检测到更新且允许自动下载时的回调 on_update(entry)
+        """
+        self.manager = manager
+        self.on_update = on_update
+        self._queued = set()
+        self._queued_lock = threading.Lock()
+        self._node_next: dict = {}
+        self._node_gap: dict = {}
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        """书单变化或手动检查时提前唤醒"""
+        self._wake.set()
+
+    def task_done(self, book_id: str):
+        with self._queued_lock:
+            self._queued.discard(str(book_id))
+
+    @staticmethod
+    def _budget_gap() -> float:
+        rate = float((CONFIG or {}).get('watchlist_requests_per_minute', 30) or 30)
+        return 60.0 / max(rate, 0.1)
+
+    @staticmethod
+    def _node_base_gap() -> float:
+        rate = float((CONFIG or {}).get('watchlist_node_requests_per_minute', 12) or 12)
+        return 60.0 / max(rate, 0.1)
+
+    def _sleep(self, seconds: float):
+        self._wake.wait(max(0.0, seconds))
+        self._wake.clear()
+
+    def _pick_node(self) -> Tuple[Optional[str], float]:
+        """选择最早可用的健康节点，返回 (节点, 需等待的秒数)"""
+        nodes = api_manager.get_chapter_nodes()
+        # is_open 不占用半开试探名额；allow() 会为每个半开节点占用名额，而这里最终只请求其中一个
+        nodes = [n for n in nodes if not api_manager.health.is_open(n)] or nodes
+        if not nodes:
+            return None, self.IDLE_SLEEP
+        now = time.monotonic()
+        node = min(nodes, key=lambda n: self._node_next.get(n, 0))
+        return node, max(0.0, self._node_next.get(node, 0) - now)
+
+    def _spend(self, node: str, ok: bool):
+        """消耗节点配额；失败时该节点间隔翻倍（最长 10 分钟），成功后逐步恢复"""
+        base = self._node_base_gap()
+        gap = self._node_gap.get(node, base)
+        gap = min(gap * 2, 600.0) if not ok else max(base, gap / 2)
+        self._node_gap[node] = gap
+        self._node_next[node] = time.monotonic() + gap * random.uniform(0.8, 1.2)
+
+    def check(self, entry: dict, node: Optional[str] = None) -> bool:
+        """检查单本书，返回是否检测到更新"""
+        book_id = entry['book_id']
+        detail = api_manager.get_book_detail(book_id, base_url=node)
+        ok = bool(detail) and not (isinstance(detail, dict) and detail.get('_error'))
+        if node:
+            self._spend(node, ok)
+        if not ok:
+            self.manager.record_check(book_id, ok=False)
+            return False
+
+        serial_count = None
+        try:
+            serial_count = int(detail.get('serial_count')) if detail.get('serial_count') is not None else None
+        except (TypeError, ValueError):
+            serial_count = None
+        last_item_id = None
+        if serial_count is None:
+            # 详情中没有章节数时再请求一次目录，同样计入节点配额
+            directory = api_manager.get_directory(book_id, base_url=node)
+            if node:
+                self._spend(node, bool(directory))
+            if not directory:
+                self.manager.record_check(book_id, ok=False)
+                return False
+            serial_count = len(directory)
+            last_item_id = str(directory[-1].get('item_id') or '') or None
+
+        if not entry.get('book_name') and detail.get('book_name'):
+            self.manager.set_info(book_id, detail.get('book_name', ''), detail.get('author', ''))
+        return self.manager.record_check(book_id, serial_count, last_item_id)
+
+    def _run(self):
+        while True:
+            try:
+                if not (CONFIG or {}).get('watchlist_enabled', True) or api_manager is None:
+                    self._sleep(self.IDLE_SLEEP)
+                    continue
+                entry, next_check = self.manager.next_due()
+                if entry is None:
+                    wait = self.IDLE_SLEEP if next_check is None else min(self.IDLE_SLEEP, next_check - time.time())
+                    self._sleep(wait)
+                    continue
+                node, wait = self._pick_node()
+                if node is None or wait > 0:
+                    self._sleep(wait)
+                    continue
+
+                changed = self.check(entry, node)
+                entry = self.manager.get(entry['book_id'])
+                if entry and (changed or entry.get('pending')) and entry.get('auto_download', True):
+                    with self._queued_lock:
+                        queued = entry['book_id'] in self._queued
+                        self._queued.add(entry['book_id'])
+                    if not queued:
+                        self.on_update(entry)
+
+                # 全局预算：请求之间保持带抖动的间隔
+                self._sleep(self._budget_gap() * random.uniform(0.5, 1.5))
+            except Exception as e:
+                print(f"追更检查异常: {e}")
+                self._sleep(self.IDLE_SLEEP)
+
+
+_watchlist_manager = None
+_watchlist_poller = None
+
+
+def get_watchlist_manager() -> WatchlistManager:
+    """获取追更书单单例"""
+    global _watchlist_manager
+    if _watchlist_manager is None:
+        _watchlist_manager = WatchlistManager(get_download_history_manager().history_dir)
+    return _watchlist_manager
+
+
+def _enqueue_watchlist_update(entry: dict):
+    """把检测到更新的书籍作为增量更新任务加入下载队列"""
+    task = {
+        'book_id': entry['book_id'],
+        'save_path': entry.get('save_path') or get_default_download_path(),
+        'file_format': entry.get('file_format') or 'txt',
+        'start_chapter': None,
+        'end_chapter': None,
+        'selected_chapters': None,
+        'update': True,
+        'watchlist': True
+    }
+    with status_lock:
+        # 队列进行中时计入队列总数，保持进度显示一致
+        if int(current_download_status.get('queue_total', 0) or 0) > 0:
+            current_download_status['queue_total'] += 1
+    download_queue.put(task)
+    print(f"追更: 《{entry.get('book_name') or entry['book_id']}》有新章节，已加入下载队列")
+
+
+def get_watchlist_poller() -> WatchlistPoller:
+    """获取追更轮询器单例（首次调用时启动后台线程）"""
+    global _watchlist_poller
+    if _watchlist_poller is None:
+        _watchlist_poller = WatchlistPoller(get_watchlist_manager(), _enqueue_watchlist_update)
+        _watchlist_poller.start()
+    return _watchlist_poller
+
+
 # 全局变量
 download_queue = queue.Queue()
 current_download_status = {
@@ -580,6 +1012,7 @@ current_download_status = {
     'queue_total': 0,
     'queue_done': 0,
     'queue_current': 0,
+    'concurrency_limit': 0,  # 自适应并发控制器当前的有效并发数
     'messages': []  # 消息队列，存储所有待传递的消息
 }
 status_lock = threading.Lock()
@@ -1263,6 +1696,8 @@ def init_modules(skip_api_select=False):
         api = NovelDownloader()
         api_manager = get_api_manager()
         downloader_instance = api
+        # 模块就绪后启动追更轮询
+        get_watchlist_poller()
         return True
     except Exception as e:
         print(t("msg_module_fail", e))
@@ -1455,6 +1890,7 @@ def download_worker():
             start_chapter = task.get('start_chapter', None)
             end_chapter = task.get('end_chapter', None)
             selected_chapters = task.get('selected_chapters', None)
+            update_mode = bool(task.get('update', False))
 
             # 如果是队列任务，更新当前序号
             queue_current = 0
@@ -1474,10 +1910,13 @@ def download_worker():
             try:
                 # 设置进度回调
                 def progress_callback(progress, message):
+                    extra = {}
+                    if getattr(api_manager, 'concurrency', None):
+                        extra['concurrency_limit'] = api_manager.effective_concurrency()
                     if progress >= 0:
-                        update_status(progress=progress, message=message)
+                        update_status(progress=progress, message=message, **extra)
                     else:
-                        update_status(message=message)
+                        update_status(message=message, **extra)
                 
                 # 强制刷新 API 实例，防止线程间 Session 污染
                 if hasattr(api_manager, '_tls'):
@@ -1510,9 +1949,18 @@ def download_worker():
                 book_name = book_detail.get('book_name', book_id)
                 update_status(book_name=book_name, message=t('web_preparing_download', book_name))
                 
+                # 增量更新时附上下载历史，没有下载清单的旧下载据此推断上次下载的内容
+                history_record = None
+                if update_mode:
+                    try:
+                        history_record = get_download_history_manager().check_exists(book_id)
+                    except Exception:
+                        history_record = None
+
                 # 执行下载
                 update_status(message=t('web_starting_engine'))
-                success = api.run_download(book_id, save_path, file_format, start_chapter, end_chapter, selected_chapters, progress_callback)
+                success = api.run_download(book_id, save_path, file_format, start_chapter, end_chapter, selected_chapters, progress_callback,
+                                           update=update_mode, history_record=history_record)
 
                 # 更新队列进度
                 has_more = False
@@ -1526,15 +1974,22 @@ def download_worker():
                         current_download_status['queue_done'] = queue_done
                         has_more = queue_done < queue_total
 
+                # 追更书籍：成功后清除待更新标记，失败时保留，由轮询器下次重新入队
+                if task.get('watchlist'):
+                    get_watchlist_poller().task_done(book_id)
+                if get_watchlist_manager().get(book_id):
+                    get_watchlist_manager().mark_downloaded(book_id, success)
+
                 if success:
                     # 记录下载历史
                     try:
                         history_manager = get_download_history_manager()
                         # 构建保存路径
-                        from novel_downloader import sanitize_filename, generate_filename
+                        from novel_downloader import sanitize_filename, generate_filename, parse_formats
                         safe_book_name = sanitize_filename(book_name)
                         author_name = book_detail.get('author', '')
-                        output_filename = generate_filename(safe_book_name, author_name, file_format)
+                        # 同时生成多种格式时记录第一种格式的文件
+                        output_filename = generate_filename(safe_book_name, author_name, parse_formats(file_format)[0])
                         full_save_path = os.path.join(save_path, output_filename)
                         
                         history_manager.add_record(
@@ -1734,6 +2189,21 @@ def api_api_sources_select():
 
     return jsonify({'success': True, 'mode': 'manual', 'current': base_url, 'probe': probe})
 
+
+@app.route('/api/node-health', methods=['GET'])
+def api_node_health():
+    """获取各节点运行时健康度（延迟、成功率、限流比例与熔断状态）"""
+    try:
+        from novel_downloader import get_node_health_registry
+        endpoints = api_manager.endpoint_selector.snapshot() if api_manager is not None else {}
+        return jsonify({
+            'success': True,
+            'nodes': get_node_health_registry().snapshot(),
+            'endpoints': endpoints
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
 @app.route('/api/search', methods=['POST'])
 def api_search():
     """搜索书籍"""
@@ -1942,12 +2412,21 @@ def api_download_history_check():
 def api_download_history_list():
     """获取下载历史列表"""
     history_manager = get_download_history_manager()
-    records = history_manager.get_all_records()
+    # 支持分页：?offset=0&limit=50，不传 limit 时返回全部
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = request.args.get('limit')
+        limit = max(1, int(limit)) if limit not in (None, '') else None
+    except ValueError:
+        return jsonify({'success': False, 'message': 'offset/limit 必须是整数'}), 400
+    records, total = history_manager.get_records(offset, limit)
     
     return jsonify({
         'success': True,
         'records': records,
-        'total': len(records)
+        'total': total,
+        'offset': offset,
+        'limit': limit
     })
 
 
@@ -1989,6 +2468,75 @@ def api_download_history_remove():
     return jsonify({'success': success})
 
 
+@app.route('/api/watchlist/list', methods=['GET'])
+def api_watchlist_list():
+    """获取追更书单"""
+    books = get_watchlist_manager().get_all()
+    return jsonify({
+        'success': True,
+        'books': books,
+        'total': len(books),
+        'pending': sum(1 for b in books if b.get('pending'))
+    })
+
+
+@app.route('/api/watchlist/add', methods=['POST'])
+def api_watchlist_add():
+    """添加追更书籍（支持 book_id 或 book_ids 批量添加）"""
+    data = request.get_json() or {}
+    book_ids = data.get('book_ids') or ([data['book_id']] if data.get('book_id') else [])
+    if not book_ids:
+        return jsonify({'success': False, 'message': '请提供 book_id 或 book_ids'}), 400
+
+    from novel_downloader import parse_formats
+
+    file_format = ','.join(parse_formats(data.get('file_format', 'txt')))
+    save_path = str(data.get('save_path') or get_default_download_path()).strip()
+
+    manager = get_watchlist_manager()
+    history_manager = get_download_history_manager()
+    added = []
+    for book_id in book_ids:
+        book_id = str(book_id).strip()
+        if not book_id.isdigit():
+            continue
+        # 已下载过的书以下载历史中的章节数为基准，首次检查即可发现新章节
+        record = history_manager.check_exists(book_id) or {}
+        added.append(manager.add(
+            book_id,
+            book_name=data.get('book_name', '') if len(book_ids) == 1 else '',
+            author=data.get('author', '') if len(book_ids) == 1 else '',
+            file_format=file_format,
+            save_path=save_path,
+            auto_download=data.get('auto_download', True),
+            chapter_count=record.get('chapter_count', 0) if record.get('file_format') == file_format else 0
+        ))
+    if not added:
+        return jsonify({'success': False, 'message': t('web_no_valid_ids')}), 400
+
+    get_watchlist_poller().wake()
+    return jsonify({'success': True, 'books': added})
+
+
+@app.route('/api/watchlist/remove', methods=['POST'])
+def api_watchlist_remove():
+    """移除追更书籍"""
+    data = request.get_json() or {}
+    book_id = data.get('book_id')
+    if not book_id:
+        return jsonify({'success': False, 'message': '请提供 book_id'}), 400
+    return jsonify({'success': get_watchlist_manager().remove(book_id)})
+
+
+@app.route('/api/watchlist/check', methods=['POST'])
+def api_watchlist_check():
+    """立即检查更新（不指定 book_id 时检查全部，仍受请求预算限制）"""
+    data = request.get_json() or {}
+    get_watchlist_manager().schedule_now(data.get('book_id'))
+    get_watchlist_poller().wake()
+    return jsonify({'success': True})
+
+
 @app.route('/api/book-info', methods=['POST'])
 def api_book_info():
     """获取书籍详情和章节列表"""
@@ -2036,31 +2584,9 @@ def api_book_info():
         if not chapters_data:
             return jsonify({'success': False, 'message': t('web_chapter_list_fail')}), 400
         
-        chapters = []
-        if isinstance(chapters_data, dict):
-            all_item_ids = chapters_data.get("allItemIds", [])
-            chapter_list = chapters_data.get("chapterListWithVolume", [])
-            
-            if chapter_list:
-                idx = 0
-                for volume in chapter_list:
-                    if isinstance(volume, list):
-                        for ch in volume:
-                            if isinstance(ch, dict):
-                                item_id = ch.get("itemId") or ch.get("item_id")
-                                title = ch.get("title", t("dl_chapter_title", idx+1))
-                                if item_id:
-                                    chapters.append({"id": str(item_id), "title": title, "index": idx})
-                                    idx += 1
-            else:
-                for idx, item_id in enumerate(all_item_ids):
-                    chapters.append({"id": str(item_id), "title": t("dl_chapter_title", idx+1), "index": idx})
-        elif isinstance(chapters_data, list):
-            for idx, ch in enumerate(chapters_data):
-                item_id = ch.get("item_id") or ch.get("chapter_id")
-                title = ch.get("title", t("dl_chapter_title", idx+1))
-                if item_id:
-                    chapters.append({"id": str(item_id), "title": title, "index": idx})
+        from novel_downloader import Catalog
+        catalog = Catalog.parse(chapters_data, default_title=lambda number: t("dl_chapter_title", number))
+        chapters = catalog.to_list()
         
         print(f"[DEBUG] Found {len(chapters)} chapters")
 
@@ -2089,12 +2615,16 @@ def api_download():
     if get_status()['is_downloading']:
         return jsonify({'success': False, 'message': t('web_download_exists')}), 400
     
+    from novel_downloader import parse_formats
+
     book_id = data.get('book_id', '').strip()
     save_path = data.get('save_path', get_default_download_path()).strip()
-    file_format = data.get('file_format', 'txt')
+    # 支持 'txt,epub' 或 ['txt', 'epub']，一次下载同时生成多种格式
+    file_format = ','.join(parse_formats(data.get('file_format', 'txt')))
     start_chapter = data.get('start_chapter')
     end_chapter = data.get('end_chapter')
     selected_chapters = data.get('selected_chapters')
+    update_mode = bool(data.get('update', False))
     
     if not book_id:
         return jsonify({'success': False, 'message': t('web_book_id_empty')}), 400
@@ -2124,7 +2654,8 @@ def api_download():
         'file_format': file_format,
         'start_chapter': start_chapter,
         'end_chapter': end_chapter,
-        'selected_chapters': selected_chapters
+        'selected_chapters': selected_chapters,
+        'update': update_mode
     }
     download_queue.put(task)
     update_status(is_downloading=True, progress=0, message=t('web_task_added'))
@@ -2140,16 +2671,17 @@ def api_queue_start():
     if get_status()['is_downloading']:
         return jsonify({'success': False, 'message': t('web_download_exists')}), 400
 
+    from novel_downloader import parse_formats
+
     tasks = data.get('tasks', [])
     save_path = str(data.get('save_path', get_default_download_path())).strip()
-    file_format = str(data.get('file_format', 'txt')).strip().lower()
+    # 支持 'txt,epub' 或 ['txt', 'epub']，一次下载同时生成多种格式
+    file_format = ','.join(parse_formats(data.get('file_format', 'txt')))
+    update_mode = bool(data.get('update', False))
 
     if not tasks or not isinstance(tasks, list):
         return jsonify({'success': False, 'message': t('web_provide_ids')}), 400
 
-    if file_format not in ['txt', 'epub']:
-        file_format = 'txt'
-
     # 确保路径存在
     try:
         os.makedirs(save_path, exist_ok=True)
@@ -2216,7 +2748,8 @@ def api_queue_start():
             'file_format': file_format,
             'start_chapter': start_chapter,
             'end_chapter': end_chapter,
-            'selected_chapters': selected_chapters
+            'selected_chapters': selected_chapters,
+            'update': bool(task.get('update', update_mode))
         })
 
     if not cleaned_tasks:
@@ -2370,6 +2903,29 @@ def api_download_resume_check():
         }), 500
 
 
+@app.route('/api/state-store', methods=['GET'])
+def api_state_store():
+    """临时状态目录占用情况（按书籍汇总）"""
+    try:
+        from novel_downloader import get_state_store
+        return jsonify({'success': True, 'data': get_state_store().usage()})
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'读取临时状态失败: {str(e)}'}), 500
+
+
+@app.route('/api/state-store/gc', methods=['POST'])
+def api_state_store_gc():
+    """清理临时状态目录（正在下载的书籍不会被清理），可用 budget_mb 临时指定预算"""
+    data = request.get_json() or {}
+    try:
+        from novel_downloader import get_state_store
+        budget_mb = data.get('budget_mb')
+        budget_bytes = int(float(budget_mb) * 1024 * 1024) if budget_mb is not None else None
+        return jsonify({'success': True, 'data': get_state_store().gc(budget_bytes=budget_bytes)})
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'清理临时状态失败: {str(e)}'}), 500
+
+
 @app.route('/api/cancel', methods=['POST'])
 def api_cancel():
     """取消下载"""